@@ -11,6 +11,11 @@ from datetime import datetime, timedelta
 from sqlalchemy import func, desc
 import json
 
+from amadeus import ResponseError
+
+import perf_metrics
+from flight_providers import build_provider
+from offer_cache import search_coalescer
 from models import (
     db, User, Booking, Payment, RefundRequest, FlightAPIProvider,
     SystemSettings, APILog, Search, BudgetBuyRequest, UserCardInformation
@@ -136,9 +141,11 @@ def get_metrics():
             Payment.status == 'completed'
         ).scalar() or 0
         
-        # Today's bookings
+        # Today's bookings (range on created_at so ix_booking_created_at is used)
+        day_start = datetime.combine(today, datetime.min.time())
         today_bookings = Booking.query.filter(
-            func.date(Booking.created_at) == today
+            Booking.created_at >= day_start,
+            Booking.created_at < day_start + timedelta(days=1)
         ).count()
         
         # Pending bookings
@@ -148,8 +155,10 @@ def get_metrics():
         daily_bookings = []
         for i in range(7):
             date = today - timedelta(days=6-i)
+            start = datetime.combine(date, datetime.min.time())
             count = Booking.query.filter(
-                func.date(Booking.created_at) == date
+                Booking.created_at >= start,
+                Booking.created_at < start + timedelta(days=1)
             ).count()
             daily_bookings.append({
                 'date': date.strftime('%Y-%m-%d'),
@@ -186,6 +195,18 @@ def get_metrics():
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/api/performance')
+@admin_required
+def get_performance_metrics():
+    """Get in-process performance metrics (upstream latency, counters)"""
+    try:
+        metrics = perf_metrics.snapshot()
+        metrics['search_coalescing'] = search_coalescer.stats()
+        return jsonify(metrics)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @admin_bp.route('/api/bookings')
 @admin_required
 def get_bookings():
@@ -620,10 +641,28 @@ def test_flight_api_connection(provider_id):
         if not provider:
             return jsonify({'error': 'Provider not found'}), 404
         
-        # Mock test - in production, make actual API call
-        # For demonstration, simulate a successful test
-        import random
-        test_success = random.choice([True, True, True, False])  # 75% success rate
+        adapter = build_provider(provider.name, provider.api_key, provider.api_secret)
+        if adapter is None:
+            return jsonify({
+                'success': False,
+                'message': f'No adapter for provider "{provider.name}"'
+            }), 400
+        
+        # One small real search through the provider's adapter
+        test_date = (datetime.utcnow() + timedelta(days=30)).strftime('%Y-%m-%d')
+        try:
+            offers = adapter.search_offers(
+                originLocationCode='JFK',
+                destinationLocationCode='LAX',
+                departureDate=test_date,
+                adults=1,
+                max=1
+            )
+            test_success = True
+        except ResponseError as e:
+            offers = []
+            test_success = False
+            test_error = str(e)
         
         provider.last_test_at = datetime.utcnow()
         provider.last_test_status = 'success' if test_success else 'failed'
@@ -631,29 +670,30 @@ def test_flight_api_connection(provider_id):
         
         if test_success:
             # Return sample flight data
-            sample_data = {
-                'flights': [
-                    {
-                        'origin': 'JFK',
-                        'destination': 'LAX',
-                        'departure': '2025-12-01T08:00:00',
-                        'arrival': '2025-12-01T11:30:00',
-                        'price': 299.99,
-                        'currency': 'USD'
-                    }
-                ]
-            }
+            sample_flights = []
+            for offer in offers[:1]:
+                segments = offer.get('itineraries', [{}])[0].get('segments', [])
+                if not segments:
+                    continue
+                sample_flights.append({
+                    'origin': segments[0].get('departure', {}).get('iataCode'),
+                    'destination': segments[-1].get('arrival', {}).get('iataCode'),
+                    'departure': segments[0].get('departure', {}).get('at'),
+                    'arrival': segments[-1].get('arrival', {}).get('at'),
+                    'price': float(offer.get('price', {}).get('total', 0)),
+                    'currency': offer.get('price', {}).get('currency', 'USD')
+                })
             return jsonify({
                 'success': True,
                 'message': 'Connection test successful',
-                'sample_data': sample_data
+                'sample_data': {'flights': sample_flights}
             })
         else:
             return jsonify({
                 'success': False,
-                'message': 'Connection test failed - Invalid credentials'
+                'message': f'Connection test failed - {test_error}'
             }), 400
-    
+            
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
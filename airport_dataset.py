@@ -0,0 +1,67 @@
+"""
+Client Airport Dataset
+======================
+Compact, versioned copy of AIRPORTS for the browser. Pages no longer inline
+the whole airport map as JSON; static/js/airports.js downloads this dataset
+once, the browser keeps it for a year, and autocomplete runs locally with no
+server round-trips.
+
+Payload: {"version", "fields": ["iata", "city", "name", "country"], "rows": [...]}
+with rows ordered from the airport data alone: international airports first
+(airport_index.base_weight), then by code. Search popularity is deliberately
+left out, since it differs between processes and changes over time; only
+/api/airports/search ranks by it. Both the JSON body and a gzip copy are
+built once per process; `version` is a hash of the rows, so every worker
+serves the same URL for the same airport data, a new dataset means a new
+URL, and cached copies never go stale.
+
+Served by app.py:
+- /api/airports/dataset                   redirects to the current version
+- /api/airports/dataset/<version>.json    immutable, strong ETag, gzip when accepted
+- /api/airports/dataset/usage (POST)      local lookups reported by the client
+
+Metrics (perf_metrics):
+- airports.dataset_bytes / airports.dataset_gzip_bytes   gauges, payload sizes
+- airports.dataset_served / .dataset_not_modified        counters
+- airports.client_sessions / .client_local_lookups       counters, i.e. the
+  /api/airports/search requests the browser did not have to make
+"""
+
+import gzip
+import hashlib
+import json
+
+from airport_index import base_weight
+
+FIELDS = ["iata", "city", "name", "country"]
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class AirportDataset:
+    """Serialized and pre-compressed airport rows with a content version."""
+
+    def __init__(self, airports):
+        """
+        Args:
+            airports: dict IATA -> {'city', 'name', 'country'} (the AIRPORTS shape)
+        """
+        rows = []
+        for iata, info in airports.items():
+            airport = {field: (info.get(field) or '').strip() for field in FIELDS[1:]}
+            rows.append([iata] + [airport[field] for field in FIELDS[1:]])
+        rows.sort(key=lambda row: (-base_weight(row[2]), row[0]))
+        rows_json = json.dumps(rows, separators=(",", ":"), ensure_ascii=False)
+        self.version = hashlib.sha256(rows_json.encode("utf-8")).hexdigest()[:12]
+        self.count = len(rows)
+        self.body = (
+            f'{{"version":"{self.version}","fields":{json.dumps(FIELDS)},"rows":{rows_json}}}'
+        ).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+
+    def etag(self, gzipped):
+        return f'"{self.version}-gz"' if gzipped else f'"{self.version}"'
+
+    def representation(self, accept_encoding):
+        """(body, etag, gzipped) for a request's Accept-Encoding header."""
+        gzipped = "gzip" in (accept_encoding or "").lower()
+        return (self.gzip_body if gzipped else self.body), self.etag(gzipped), gzipped
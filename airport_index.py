@@ -0,0 +1,162 @@
+"""
+Airport Autocomplete Index
+==========================
+In-memory index over AIRPORTS for /api/airports/search, built once when the
+reference data loads. Per-keystroke cost depends on how many distinct words
+match the query, not on the number of airports.
+
+Matches are returned in three tiers:
+1. exact IATA code ("lax")
+2. prefix matches on any word of the code, city or name ("los an", "heath");
+   every query word must prefix some word of the airport
+3. substring fallback for queries of 3+ characters ("ngele"), found through
+   a trigram index over the word vocabulary
+
+Within a tier airports are ranked by weight: past search frequency (origin and
+destination counts from the Search table) plus a small boost for international
+airports.
+
+Structure: every distinct word maps to its airports as a list of ranks
+(positions in weight order, ascending). The vocabulary is kept sorted, so the
+words starting with a prefix are one bisect range (the subtree of a prefix
+trie). Their rank lists are merged lazily and the merge stops after `limit`
+hits, so a popular 2-letter prefix costs no more than a rare one.
+"""
+
+import heapq
+import math
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def tokenize(text):
+    """Lowercased words of `text`."""
+    return _WORD_RE.findall((text or "").lower())
+
+
+def base_weight(name):
+    """Rank weight from the airport data alone: a small boost for international airports."""
+    name = (name or '').lower()
+    return 0.5 if 'international' in name or 'intl' in name else 0.0
+
+
+def build_display(iata_code, name, city_name, country=""):
+    city_part = city_name or iata_code
+    name_part = name or ""
+    country_part = f", {country}" if country else ""
+    # Example: "Lagos, Nigeria - Murtala Muhammed Intl (LOS)"
+    return f"{city_part}{country_part} - {name_part} ({iata_code})".strip()
+
+
+class AirportIndex:
+    """Ranked exact / prefix / substring lookup over an AIRPORTS dict."""
+
+    def __init__(self, airports, popularity=None):
+        """
+        Args:
+            airports: dict IATA -> {'city', 'name', 'country'} (the AIRPORTS shape)
+            popularity: optional dict IATA -> number of past searches
+        """
+        popularity = popularity or {}
+        suggestions = {}
+        words = {}
+        weight = {}
+        for iata, info in airports.items():
+            city = (info.get('city') or '').strip()
+            name = (info.get('name') or '').strip()
+            country = (info.get('country') or '').strip()
+            suggestions[iata] = {
+                'iata': iata,
+                'name': name,
+                'city': city,
+                'country': country,
+                'display': build_display(iata, name, city, country),
+            }
+            words[iata] = set(tokenize(f"{iata} {city} {name}"))
+            weight[iata] = math.log1p(popularity.get(iata, 0)) + base_weight(name)
+
+        # Rank order: heaviest first, then alphabetical by code
+        order = sorted(suggestions, key=lambda code: (-weight[code], code))
+        self._suggestions = [suggestions[code] for code in order]   # by rank
+        self._words = [words[code] for code in order]               # by rank
+        self._rank_of = {code: rank for rank, code in enumerate(order)}
+
+        postings = defaultdict(list)
+        for rank, airport_words in enumerate(self._words):
+            for word in airport_words:
+                postings[word].append(rank)      # ascending, since ranks are visited in order
+        self._postings = dict(postings)
+        self._vocabulary = sorted(postings)
+
+        trigrams = defaultdict(list)
+        for word in self._vocabulary:
+            for gram in {word[i:i + 3] for i in range(len(word) - 2)}:
+                trigrams[gram].append(word)
+        self._trigrams = dict(trigrams)
+
+    def __len__(self):
+        return len(self._suggestions)
+
+    def ranked(self):
+        """All suggestion dicts, best ranked first."""
+        return list(self._suggestions)
+
+    def _prefix_words(self, prefix):
+        start = bisect_left(self._vocabulary, prefix)
+        end = bisect_left(self._vocabulary, prefix + "￿", start)
+        return self._vocabulary[start:end]
+
+    def _substring_words(self, fragment):
+        grams = [self._trigrams.get(fragment[i:i + 3]) for i in range(len(fragment) - 2)]
+        if not all(grams):
+            return []
+        grams.sort(key=len)
+        candidates = set(grams[0]).intersection(*grams[1:]) if len(grams) > 1 else grams[0]
+        return [word for word in candidates if fragment in word]
+
+    def _ranked(self, matching_words):
+        """Ranks of airports having any of `matching_words`, best first (lazy, may repeat)."""
+        return heapq.merge(*(self._postings[word] for word in matching_words))
+
+    def search(self, keyword, limit=20):
+        """Ranked suggestions for `keyword` (list of response dicts, at most `limit`)."""
+        query_words = tokenize(keyword)
+        if not query_words:
+            return []
+        results = []
+        picked = set()
+
+        def add(rank):
+            if rank not in picked:
+                picked.add(rank)
+                results.append(self._suggestions[rank])
+            return len(results) >= limit
+
+        def has_all_prefixes(rank):
+            airport_words = self._words[rank]
+            return all(any(w.startswith(q) for w in airport_words) for q in query_words)
+
+        # 1) Exact IATA code
+        rank = self._rank_of.get(keyword.strip().upper())
+        if rank is not None and add(rank):
+            return results
+
+        # 2) Word prefixes: candidates from the most selective query word
+        driver = max(query_words, key=len)
+        for rank in self._ranked(self._prefix_words(driver)):
+            if rank not in picked and has_all_prefixes(rank) and add(rank):
+                return results
+
+        # 3) Substring inside a word (other query words still have to prefix-match)
+        if len(driver) >= 3:
+            others = [q for q in query_words if q != driver]
+            for rank in self._ranked(self._substring_words(driver)):
+                if rank in picked:
+                    continue
+                airport_words = self._words[rank]
+                if all(any(w.startswith(q) for w in airport_words) for q in others) and add(rank):
+                    break
+        return results
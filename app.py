@@ -11,18 +11,32 @@ Features:
 - Booking confirmation and email notifications
 - Responsive web interface
 
+Startup (APP_INIT_MODE):
+- lazy (default): importing this module only configures the app. The Amadeus
+  client and Stripe are created on first use and reference data loads before
+  the first request. Before first database use, missing tables and nullable
+  columns are added (ensure_schema(), so an older database keeps working);
+  indexes and seed work run only via `flask init-db` (or when starting the
+  dev server with `python app.py`).
+- eager: the previous behaviour; everything above happens at import time.
+
 Author: Group 5
 Date: 2025
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.security import generate_password_hash
 from werkzeug.security import check_password_hash
 from amadeus import Client, ResponseError
 from dotenv import load_dotenv
-import os, json
+import click
+import os, json, secrets, threading
 from datetime import datetime, timedelta
-import stripe
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, TimeoutError as FuturesTimeout
 from models import (
     db,
     User,
@@ -36,8 +50,33 @@ from models import (
     Booking,
     Payment,
     seed_airlines_airports,
+    sync_reference_data,
+    format_sync_report,
+    add_missing_columns,
+    create_missing_indexes,
 )
 from mongo_client import get_reviews_collection
+import perf_metrics
+from offer_cache import search_flight_offers, search_coalescer
+from fare_calendar import request_calendar
+from offer_filter import booking_details, cheapest_offer, request_filter, request_search_params
+from flight_providers import provider_from_env
+from offer_model import Bags, Fare, Offer, OfferMerger, Segment, merge_offers, parse_moment
+from offer_store import get_result_set, store_result_set, extend_result_set, resolve_offer, remember_offer
+from write_behind import WriteBehindQueue
+from lazy_init import LazyObject
+from airport_index import AirportIndex
+from location_lookup import lookup_locations
+from airport_dataset import AirportDataset, CACHE_CONTROL as AIRPORT_DATASET_CACHE_CONTROL
+from reference_snapshot import (
+    SNAPSHOT_PATH as REFERENCE_SNAPSHOT_PATH,
+    build_snapshot as build_reference_snapshot,
+    load_snapshot as load_reference_snapshot,
+    parse_reference_json,
+)
+from db_profiles import get_profile as get_db_profile, database_uri, engine_options, attach as attach_db_profile
+from price_history import observations_from_offers, insert_observations, maintain as maintain_price_history
+from check_scheduler import departed, schedule_next_check
 
 # =========================
 # Country Code Mapping
@@ -85,56 +124,84 @@ COUNTRY_NAMES = {
 # =========================
 load_dotenv()
 
+APP_INIT_MODE = os.getenv('APP_INIT_MODE', 'lazy').strip().lower()
+
 # =========================
 # Initialize Amadeus Client
 # =========================
 # Amadeus API client for flight search and booking
-# Credentials loaded from .env file for security
-amadeus = Client(
-    client_id=os.getenv('AMADEUS_CLIENT_ID'),
-    client_secret=os.getenv('AMADEUS_CLIENT_SECRET')
-)
+# Credentials loaded from .env file for security; the client is built on first use
+def _create_amadeus_client():
+    return Client(
+        client_id=os.getenv('AMADEUS_CLIENT_ID'),
+        client_secret=os.getenv('AMADEUS_CLIENT_SECRET')
+    )
+
+amadeus = LazyObject(_create_amadeus_client, 'amadeus')
+
+# Shopping and booking calls (search, pricing, seat maps, orders) go through a
+# FlightProvider; FLIGHT_PROVIDER=synthetic swaps in the local load-test stand-in.
+flight_provider = provider_from_env(amadeus)
 
 # =========================
 # Initialize Stripe
 # =========================
-# Stripe payment processing API
+# Stripe payment processing API (the SDK is imported on first use)
 # Using test keys for development environment
-stripe.api_key = os.getenv('STRIPE_SECRET_KEY', 'sk_test_51QNxkeFDZv0v2V0H6yLVExample')  # Use test key for development
+def _load_stripe():
+    import stripe as stripe_sdk
+    stripe_sdk.api_key = os.getenv('STRIPE_SECRET_KEY', 'sk_test_51QNxkeFDZv0v2V0H6yLVExample')  # Use test key for development
+    return stripe_sdk
+
+stripe = LazyObject(_load_stripe, 'stripe')
+
+# =========================
+# Upstream Search Settings
+# =========================
+# Cabin-class searches run concurrently on a bounded worker pool.
+# SEARCH_DEADLINE_SECONDS caps the total wait for one build_flights() call;
+# cabins that have not answered by then are skipped for that request.
+SEARCH_WORKERS = int(os.getenv('SEARCH_WORKERS', 8))
+SEARCH_DEADLINE_SECONDS = float(os.getenv('SEARCH_DEADLINE_SECONDS', 12))
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix='cabin-search')
+# Separate pool for whole-leg searches (round-trip return leg) so they never wait on cabin slots
+leg_executor = ThreadPoolExecutor(max_workers=max(2, SEARCH_WORKERS // 2), thread_name_prefix='leg-search')
 
 # =========================
 # Initialize Flask App
 # =========================
+class OfferJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes normalized offers via to_dict() (tojson, jsonify)."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, (Offer, Segment, Fare, Bags)):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+
 app = Flask(__name__)
+app.json = OfferJSONProvider(app)
 app.jinja_env.globals['timedelta'] = timedelta  # Make timedelta available in Jinja templates for date calculations
 app.config['STRIPE_PUBLISHABLE_KEY'] = os.getenv('STRIPE_PUBLISHABLE_KEY', 'pk_test_51QNxkeFDZv0v2V0H6yLVExample')
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')  # Required for session management
 
-# --- Database configuration (SQLite in instance folder) ---
+# --- Database configuration (engine profile from DB_PROFILE; SQLite in instance folder by default) ---
 try:
     os.makedirs(app.instance_path, exist_ok=True)
 except Exception:
     pass
 db_path = os.path.join(app.instance_path, 'flight.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+DB_PROFILE, _ = get_db_profile()
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(DB_PROFILE, db_path)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(DB_PROFILE)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
-# Enable SQLite foreign keys
-try:
-    from sqlalchemy import event
-    from sqlalchemy.engine import Engine
-
-    @event.listens_for(Engine, "connect")
-    def _set_sqlite_pragma(dbapi_connection, connection_record):  # pragma: no cover
-        try:
-            cursor = dbapi_connection.cursor()
-            cursor.execute("PRAGMA foreign_keys=ON")
-            cursor.close()
-        except Exception:
-            pass
-except Exception:
-    pass
+# SQLite PRAGMAs for the profile (foreign keys, journal mode, mmap, busy timeout...)
+with app.app_context():
+    attach_db_profile(db.engine, DB_PROFILE)
+print(f"🗄️ Database profile: {DB_PROFILE}")
 
 # =========================
 # Register Admin Blueprint
@@ -143,63 +210,147 @@ from admin_routes import admin_bp
 app.register_blueprint(admin_bp)
 
 # =========================
-# Load Airlines Data
-# =========================
-# Load airline information from JSON file (airline names, codes, logos)
-try:
-    with open(os.path.join("json-files", "airlines.json"), "r", encoding="utf-8") as f:
-        AIRLINES = {item["id"]: item for item in json.load(f)}
-except Exception as e:
-    print("❌ Could not load airlines.json:", e)
-    AIRLINES = {}
+# Reference Data (airlines, airports)
+# =========================
+# AIRLINES: airline information (airline names, codes, logos)
+# AIRPORTS: airport information keyed by IATA (ICAO entries without IATA are skipped)
+# Both dicts are filled in place by load_reference_data(): at import in eager
+# mode, otherwise before the first request that needs them. They come from the
+# prebuilt snapshot (reference_snapshot.py) when it is current, else from JSON.
+REFERENCE_JSON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'json-files')
+AIRLINES = {}
+AIRPORTS = {}
+airport_index = AirportIndex({})  # autocomplete index over AIRPORTS (airport_index.py)
+airport_dataset = AirportDataset({})  # browser copy of AIRPORTS (airport_dataset.py)
+_reference_lock = threading.Lock()
+_reference_loaded = False
+
+
+def load_reference_data():
+    """Load AIRLINES/AIRPORTS from the reference snapshot or the JSON files (once per process)."""
+    global _reference_loaded
+    if _reference_loaded:
+        return
+    with _reference_lock:
+        if _reference_loaded:
+            return
+        started = time.perf_counter()
+        snapshot = load_reference_snapshot(json_dir=REFERENCE_JSON_DIR)
+        if snapshot is not None:
+            airlines, airports, _header = snapshot
+            perf_metrics.incr('reference.snapshot_loads')
+        else:
+            airlines, airports = parse_reference_json(REFERENCE_JSON_DIR)
+            perf_metrics.incr('reference.json_loads')
+            if not airlines:
+                print("❌ Could not load airlines.json from", REFERENCE_JSON_DIR)
+            if not airports:
+                print("❌ Could not load airports.json from", REFERENCE_JSON_DIR)
+        AIRLINES.update(airlines)
+        AIRPORTS.update(airports)
+        perf_metrics.record_timing('startup.reference_data', time.perf_counter() - started)
+
+        global airport_index, airport_dataset
+        started = time.perf_counter()
+        airport_index = AirportIndex(AIRPORTS, airport_popularity())
+        airport_dataset = AirportDataset(AIRPORTS)
+        perf_metrics.record_timing('startup.airport_index', time.perf_counter() - started)
+        perf_metrics.set_gauge('airports.dataset_bytes', len(airport_dataset.body))
+        perf_metrics.set_gauge('airports.dataset_gzip_bytes', len(airport_dataset.gzip_body))
+        _reference_loaded = True
+
+
+def airport_popularity():
+    """Past searches per airport (as origin or destination), used to rank autocomplete."""
+    counts = {}
+    try:
+        with app.app_context():
+            for column in (Search.origin, Search.destination):
+                for code, n in db.session.query(column, db.func.count()).group_by(column):
+                    counts[code] = counts.get(code, 0) + n
+    except Exception as e:
+        print(f"⚠️ Airport popularity unavailable, ranking by name only: {e}")
+    return counts
+
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def ensure_schema():
+    """
+    Create missing tables and add missing nullable columns (once per process),
+    so a database created by an older version works without `flask init-db`.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        try:
+            with app.app_context():
+                db.create_all()
+                added = add_missing_columns(db.engine)
+            if added:
+                print(f"🧱 Added columns: {', '.join(added)}")
+            _schema_ready = True
+        except Exception as e:
+            print(f"⚠️ Schema check failed, retrying on next use: {e}")
+
+
+@app.before_request
+def _ensure_schema():
+    ensure_schema()
+
+
+@app.before_request
+def _ensure_reference_data():
+    load_reference_data()
+
+
+
 
 # =========================
-# Load Airports Data
+# Database Initialization
 # =========================
-# Load airport information from JSON file (airport names, cities, IATA codes)
-# Converts ICAO codes to IATA codes for easier searching
-try:
-    with open(os.path.join("json-files", "airports.json"), encoding="utf-8") as f:
-        airports_raw = json.load(f)
-        AIRPORTS = {}
-        for icao, info in airports_raw.items():
-            iata = info.get("iata")
-            if iata:  # Only include airports with IATA codes
-                AIRPORTS[iata] = {
-                    "city": info.get("city") or "",
-                    "name": info.get("name") or "",
-                    "country": info.get("country") or ""
-                }
-except Exception as e:
-    print("❌ Could not load airports.json:", e)
-    AIRPORTS = {}
-
-# --- Initialize database and seed static reference data on first run ---
-with app.app_context():
+def cleanup_legacy_tables():
+    """Drop legacy tables from older schema to avoid duplicates ('users', 'bookings')"""
     try:
-        db.create_all()
+        insp = db.inspect(db.engine)
+        existing = set(insp.get_table_names())
+        to_drop = [t for t in ('users', 'bookings') if t in existing]
+        if to_drop:
+            with db.engine.begin() as conn:
+                for t in to_drop:
+                    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {t}")
+            print(f"🧹 Dropped legacy tables: {', '.join(to_drop)}")
+    except Exception as e:
+        print(f"⚠️ Legacy table cleanup skipped: {e}")
 
-        # Drop legacy tables from older schema to avoid duplicates ('users', 'bookings')
-        def cleanup_legacy_tables():
-            try:
-                insp = db.inspect(db.engine)
-                existing = set(insp.get_table_names())
-                to_drop = [t for t in ('users', 'bookings') if t in existing]
-                if to_drop:
-                    with db.engine.begin() as conn:
-                        for t in to_drop:
-                            conn.exec_driver_sql(f"DROP TABLE IF EXISTS {t}")
-                    print(f"🧹 Dropped legacy tables: {', '.join(to_drop)}")
-            except Exception as e:
-                print(f"⚠️ Legacy table cleanup skipped: {e}")
 
-        cleanup_legacy_tables()
+def init_database():
+    """Create tables and indexes, drop legacy tables and seed static reference data."""
+    with app.app_context():
+        try:
+            db.create_all()
+            cleanup_legacy_tables()
+            added = add_missing_columns(db.engine)
+            if added:
+                print(f"🧱 Added columns: {', '.join(added)}")
+            create_missing_indexes(db.engine)
+
+            seed_airlines_airports(REFERENCE_JSON_DIR)
+            header = build_reference_snapshot(REFERENCE_JSON_DIR)
+            print(f"📦 Reference snapshot {header['data_version']} written to {REFERENCE_SNAPSHOT_PATH}")
+            print(f"✅ Database ready ({DB_PROFILE}): {app.config['SQLALCHEMY_DATABASE_URI']}")
+        except Exception as db_err:
+            print("❌ Database initialization error:", db_err)
+
 
-        # Seed only if empty; function handles checks internally
-        seed_airlines_airports(os.path.join(os.path.dirname(__file__), 'json-files'))
-        print(f"✅ Database ready at: {db_path}")
-    except Exception as db_err:
-        print("❌ Database initialization error:", db_err)
+if APP_INIT_MODE == 'eager':
+    load_reference_data()
+    init_database()
 
 # =========================
 # Helper Functions
@@ -233,15 +384,56 @@ def normalize_date(date_str: str) -> str:
         dt = datetime.now() + timedelta(days=1)
     return dt.strftime("%Y-%m-%d")
 
-def build_flights(origin: str, destination: str, date_str: str):
+def search_cabin(origin: str, destination: str, date_str: str, travel_class: str, max_results: int = 50):
+    """
+    Run a single Amadeus flight-offers search for one cabin class.
+    Served from the shared offer cache when a recent identical search exists.
+    Records the upstream latency per cabin so slow classes show up in metrics.
+
+    Returns:
+        List of raw Amadeus offer dicts (empty on error or no results)
+    """
+    started = time.perf_counter()
+    try:
+        print(f"🔎 Searching {travel_class}: {origin} -> {destination} on {date_str}")
+        offers = search_flight_offers(
+            flight_provider, origin, destination, date_str,
+            travel_class=travel_class,
+            adults=1,
+            max_results=max_results
+        )
+        if offers:
+            print(f"  → {travel_class} returned {len(offers)} offers")
+            return offers
+        print(f"  → {travel_class} returned no offers")
+        return []
+    except ResponseError as e:
+        perf_metrics.incr(f"search.cabin.{travel_class}.errors")
+        try:
+            print("❌ Full error details:", e.response.result)
+            print("Status code:", e.response.status_code)
+        except Exception:
+            print("❌ ResponseError:", e)
+        return []
+    finally:
+        elapsed = time.perf_counter() - started
+        perf_metrics.record_timing(f"search.cabin.{travel_class}", elapsed)
+        print(f"  ⏱️ {travel_class} took {elapsed * 1000:.0f} ms")
+
+
+def build_flights(origin: str, destination: str, date_str: str, deadline: float | None = None):
     """
     Search Amadeus API for flight offers and return merged, frontend-friendly flight data.
-    Searches across multiple cabin classes and consolidates results.
+    Searches across multiple cabin classes concurrently and consolidates results.
+    Identical searches that arrive while one is already running wait for it and
+    share its result (the returned list is shared, so callers must not mutate it).
     
     Args:
         origin: IATA code of departure airport (e.g., "JFK")
         destination: IATA code of arrival airport (e.g., "LAX")
         date_str: Departure date in YYYY-MM-DD format
+        deadline: Seconds to wait for all cabins (defaults to SEARCH_DEADLINE_SECONDS).
+                  Cabins still running when it expires are left out of the result.
     
     Returns:
         List of flight dictionaries with fare information organized by cabin class
@@ -250,115 +442,50 @@ def build_flights(origin: str, destination: str, date_str: str):
         return []
 
     searched_date = normalize_date(date_str)
+    if deadline is None:
+        deadline = SEARCH_DEADLINE_SECONDS
 
-    # Cabin classes to search for
-    # Note: Can limit to ["ECONOMY"] during development to reduce API calls
-    TRAVEL_CLASSES = ["ECONOMY", "PREMIUM_ECONOMY", "BUSINESS", "FIRST"]
-    # TRAVEL_CLASSES = ["ECONOMY"]  # Uncomment for development
-
-    max_results = 50  # Maximum results per cabin class
-    all_flights = []
+    return search_coalescer.do(
+        (origin, destination, searched_date),
+        lambda: _fetch_and_merge_flights(origin, destination, searched_date, deadline)
+    )
 
-    # Search each cabin class separately
-    for tclass in TRAVEL_CLASSES:
-        try:
-            print(f"🔎 Searching {tclass}: {origin} -> {destination} on {searched_date}")
-            response = amadeus.shopping.flight_offers_search.get(
-                originLocationCode=origin,
-                destinationLocationCode=destination,
-                departureDate=searched_date,
-                adults=1,
-                max=max_results,
-                travelClass=tclass
-            )
-            if getattr(response, "data", None):
-                all_flights.extend(response.data)
-                print(f"  → {tclass} returned {len(response.data)} offers")
-            else:
-                print(f"  → {tclass} returned no offers")
-        except ResponseError as e:
-            try:
-                print("❌ Full error details:", e.response.result)
-                print("Status code:", e.response.status_code)
-            except Exception:
-                print("❌ ResponseError:", e)
 
-    merged_flights = {}
-    for flight in all_flights:
-        flight_id = flight.get("id")
-        if not flight_id:
-            continue
+# Cabin classes to search for (shared by build_flights and the streaming search)
+# Note: Can limit to ["ECONOMY"] during development to reduce API calls
+TRAVEL_CLASSES = ["ECONOMY", "PREMIUM_ECONOMY", "BUSINESS", "FIRST"]
+# TRAVEL_CLASSES = ["ECONOMY"]  # Uncomment for development
+CABIN_MAX_RESULTS = 50  # Maximum results per cabin class
 
-        if flight_id not in merged_flights:
-            validating_codes = flight.get("validatingAirlineCodes") or []
-            airline_code = validating_codes[0] if validating_codes else ""
-            airline_info = AIRLINES.get(airline_code, {"name": airline_code or "Unknown", "logo": ""})
-
-            itineraries = flight.get("itineraries") or []
-            first_itin = itineraries[0] if itineraries else {}
-            segments = first_itin.get("segments", [])
-            if not segments:
-                continue
-
-            stops = len(segments) - 1
-            stops_text = "Non-stop" if stops == 0 else f"{stops} stop{'s' if stops > 1 else ''}"
-
-            segment_list = []
-            for seg in segments:
-                dep = seg.get("departure", {})
-                arr = seg.get("arrival", {})
-                seg_duration = seg.get("duration", "")
-                seg_duration = seg_duration[2:].replace("H", "h ").replace("M", "m") if seg_duration else ""
-                segment_list.append({
-                    "origin": dep.get("iataCode"),
-                    "destination": arr.get("iataCode"),
-                    "departure": dep.get("at"),
-                    "arrival": arr.get("at"),
-                    "duration": seg_duration
-                })
 
-            merged_flights[flight_id] = {
-                "offer_id": flight_id,
-                "airline_name": airline_info.get("name", ""),
-                "airline_logo": airline_info.get("logo", ""),
-                "origin": segments[0].get("departure", {}).get("iataCode", ""),
-                "destination": segments[-1].get("arrival", {}).get("iataCode", ""),
-                "departure": segments[0].get("departure", {}).get("at", ""),
-                "arrival": segments[-1].get("arrival", {}).get("at", ""),
-                "duration": first_itin.get("duration", "").replace("PT", "").replace("H", "h ").replace("M", "m"),
-                "stops_text": stops_text,
-                "segments": segment_list,
-                "fares_by_cabin": {},
-                "date": searched_date
-            }
+def _fetch_and_merge_flights(origin: str, destination: str, searched_date: str, deadline: float):
+    """Fan out the cabin searches for one route/date and merge offers by id."""
+    max_results = CABIN_MAX_RESULTS
+    all_flights = []
 
-        for tp in flight.get("travelerPricings", []):
-            price_info = tp.get("price", {}) or {}
-            price_total = price_info.get("total", 0)
-            price_base = price_info.get("base")
-            currency = price_info.get("currency", "")
-            for fd in tp.get("fareDetailsBySegment", []):
-                cabin = fd.get("cabin", "ECONOMY")
-                bags_info = fd.get("includedCheckedBags", {}) or {}
-                fare = {
-                    "fare_type": fd.get("fareBasis", "Standard"),
-                    "price": float(price_total or 0),
-                    "base": float(price_base) if price_base is not None else None,
-                    "taxes": (float(price_total) - float(price_base)) if price_base is not None else None,
-                    "currency": currency,
-                    "seat": "Included" if fd.get("seat") else "Not included",
-                    "bags": {
-                        "quantity": bags_info.get("quantity", 0),
-                        "weight": bags_info.get("weight"),
-                        "type": bags_info.get("type")
-                    },
-                    "flexibility": "Refundable" if tp.get("refundability") == "REFUNDABLE" else "Non-refundable"
-                }
-                if cabin not in merged_flights[flight_id]["fares_by_cabin"]:
-                    merged_flights[flight_id]["fares_by_cabin"][cabin] = []
-                merged_flights[flight_id]["fares_by_cabin"][cabin].append(fare)
+    # Search each cabin class in parallel on the shared pool
+    started = time.perf_counter()
+    futures = {
+        tclass: search_executor.submit(search_cabin, origin, destination, searched_date, tclass, max_results)
+        for tclass in TRAVEL_CLASSES
+    }
+    _done, not_done = wait(futures.values(), timeout=deadline)
+    for future in not_done:
+        future.cancel()
+
+    # Merge in TRAVEL_CLASSES order so results do not depend on completion order
+    for tclass, future in futures.items():
+        if future in not_done:
+            perf_metrics.incr(f"search.cabin.{tclass}.deadline_missed")
+            print(f"  ⌛ {tclass} missed the {deadline:.1f}s deadline; returning other cabins")
+            continue
+        try:
+            all_flights.extend(future.result())
+        except Exception as e:
+            print(f"❌ {tclass} search failed: {e}")
+    perf_metrics.record_timing("search.build_flights", time.perf_counter() - started)
 
-    flights = list(merged_flights.values())
+    flights = merge_offers(all_flights, searched_date, AIRLINES)
     print(f"✅ Total offers after merge: {len(flights)} (raw offers fetched: {len(all_flights)})")
     return flights
 
@@ -382,6 +509,98 @@ def extract_iata(value):
         return match.group(1)
     return value.strip().upper()
 
+# =========================
+# Search Persistence
+# =========================
+# Logged-in searches are saved write-behind: handlers enqueue a plain-data
+# snapshot and a background thread group-commits batches (see write_behind.py).
+SEARCH_WRITE_BATCH = int(os.getenv('SEARCH_WRITE_BATCH', 100))
+SEARCH_WRITE_INTERVAL_SECONDS = float(os.getenv('SEARCH_WRITE_INTERVAL_SECONDS', 0.5))
+SEARCH_WRITE_QUEUE_MAX = int(os.getenv('SEARCH_WRITE_QUEUE_MAX', 10000))
+
+
+def persist_search(user_id, origin, destination, searched_date, return_date, trip_type, target_price, outbound_flights):
+    """
+    Queue a logged-in user's search and its outbound offers for saving.
+    Shared by /search and the streaming search; the write happens in the background.
+    """
+    try:
+        dep_dt = datetime.strptime(searched_date, "%Y-%m-%d") if searched_date else None
+    except Exception:
+        dep_dt = None
+    try:
+        ret_dt = datetime.strptime(return_date, "%Y-%m-%d") if (trip_type == 'roundtrip' and return_date) else None
+    except Exception:
+        ret_dt = None
+
+    search_writer.submit({
+        'user_id': user_id,
+        'origin': (origin or '').upper(),
+        'destination': (destination or '').upper(),
+        'departure_date': dep_dt,
+        'return_date': ret_dt,
+        'target_price': float(target_price) if target_price is not None else None,
+        'offers': [
+            {
+                'offer_id': f.offer_id,
+                'airline_name': f.airline_name,
+                'origin': f.origin,
+                'destination': f.destination,
+                'departure': f.departs.at,
+                'arrival': f.arrives.at,
+                'duration_text': f.duration,
+                'stops_text': f.stops_text,
+                'lowest_price': f.min_price,
+                'currency': f.currency,
+            }
+            for f in outbound_flights
+        ],
+        'observations': observations_from_offers(outbound_flights),
+    })
+
+
+def write_search_batch(snapshots):
+    """Insert a batch of queued searches, their FlightOffer rows and price observations in one commit."""
+    from models import FlightOffer  # local import to avoid circular at runtime
+    try:
+        search_rows = [
+            Search(
+                user_id=snap['user_id'],
+                origin=snap['origin'],
+                destination=snap['destination'],
+                departure_date=snap['departure_date'],
+                return_date=snap['return_date'],
+                target_price=snap['target_price'],
+            )
+            for snap in snapshots
+        ]
+        db.session.add_all(search_rows)
+        db.session.flush()  # assigns every search_id in one round trip
+
+        offer_rows = []
+        for snap, search_row in zip(snapshots, search_rows):
+            offer_rows.extend(
+                FlightOffer(search_id=search_row.search_id, **offer) for offer in snap['offers']
+            )
+        if offer_rows:
+            db.session.bulk_save_objects(offer_rows, return_defaults=False)
+
+        # Fares returned by the API go to the price history instead of one Search row per offer
+        insert_observations(db.session, [row for snap in snapshots for row in snap['observations']])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+search_writer = WriteBehindQueue(
+    'search_writer', write_search_batch, app,
+    batch_size=SEARCH_WRITE_BATCH,
+    flush_interval=SEARCH_WRITE_INTERVAL_SECONDS,
+    max_queue=SEARCH_WRITE_QUEUE_MAX,
+)
+
+
 # =========================
 # Search Flights
 # =========================
@@ -392,6 +611,7 @@ def search():
     return_flights = []
     searched_date = ""
     return_date = ""
+    outbound_key = return_key = None
     trip_type = (request.form.get('trip_type') if request.method == 'POST' else request.args.get('trip_type')) or 'oneway'
     origin = destination = None
     
@@ -428,6 +648,7 @@ def search():
     today = datetime.now()
     date_range = [(today + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(31)]
     min_prices = {d: None for d in date_range}
+    price_currencies = {}  # date -> currency of its min price
 
     # --- Only proceed if we have origin + destination ---
     if origin and destination:
@@ -435,142 +656,43 @@ def search():
         print(f"🔍 SEARCH REQUEST: {origin} -> {destination} on {searched_date}")
         print(f"Trip Type: {trip_type}")
         print(f"{'='*60}")
+        # Start the return leg now so both legs search in parallel
+        return_future = None
+        if trip_type == 'roundtrip' and return_date:
+            return_future = leg_executor.submit(build_flights, destination, origin, return_date)
+        # Fill the date slider from cheapest-date lookups while the main search runs
+        calendar = request_calendar(flight_provider, origin, destination, date_range)
         outbound_flights = build_flights(origin, destination, searched_date)
         flights = outbound_flights  # for backward-compat templates
         print(f"✅ Found {len(outbound_flights)} outbound flights")
         print(f"{'='*60}\n")
-        # Compute minimum price for the searched date (for slider)
-        all_prices = []
-        for f in outbound_flights:
-            for fares in f.get("fares_by_cabin", {}).values():
-                for fare in fares:
-                    all_prices.append(fare.get("price", 0))
-        if all_prices:
-            min_prices[searched_date] = min(all_prices)
-
-        if trip_type == 'roundtrip' and return_date:
-            return_flights = build_flights(destination, origin, return_date)
+        for d, cheapest in calendar.result().items():
+            if cheapest is not None:
+                min_prices[d], price_currencies[d] = cheapest
+        # Keep the result sets server-side; the booking pages post offer references into them
+        outbound_key = store_result_set(origin, destination, searched_date, outbound_flights)
+
+        # Compute minimum price for the searched date (for slider); the live search wins over the calendar
+        priced = [f for f in outbound_flights if f.min_price is not None]
+        if priced:
+            cheapest = min(priced, key=lambda f: f.min_price)
+            min_prices[searched_date] = cheapest.min_price
+            price_currencies[searched_date] = cheapest.currency
+
+        if return_future is not None:
+            try:
+                return_flights = return_future.result()
+            except Exception as e:
+                print(f"❌ Return leg search failed: {e}")
+                return_flights = []
+            # /select_return renders the return leg from this key
+            return_key = store_result_set(destination, origin, return_date, return_flights)
 
         # Persist search + all offers if user is logged in
-        try:
-            user_id = session.get('user_id')
-            if user_id:
-                # Parse dates
-                try:
-                    dep_dt = datetime.strptime(searched_date, "%Y-%m-%d") if searched_date else None
-                except Exception:
-                    dep_dt = None
-                try:
-                    ret_dt = datetime.strptime(return_date, "%Y-%m-%d") if (trip_type == 'roundtrip' and return_date) else None
-                except Exception:
-                    ret_dt = None
-
-                target_price = min_prices.get(searched_date)
-
-                search_row = Search(
-                    user_id=user_id,
-                    origin=(origin or '').upper(),
-                    destination=(destination or '').upper(),
-                    departure_date=dep_dt,
-                    return_date=ret_dt,
-                    target_price=float(target_price) if target_price is not None else None,
-                )
-                db.session.add(search_row)
-                db.session.flush()  # get search_id without full commit yet
-
-                # Prepare offers
-                from models import FlightOffer  # local import to avoid circular at runtime
-                offer_rows = []
-                for f in outbound_flights:
-                    # Determine lowest price + currency
-                    lowest_price = None
-                    currency = None
-                    for fares in f.get('fares_by_cabin', {}).values():
-                        for fare in fares:
-                            price = fare.get('price')
-                            if price is not None:
-                                if lowest_price is None or price < lowest_price:
-                                    lowest_price = price
-                                    currency = fare.get('currency')
-
-                    # Parse departure/arrival datetimes if possible
-                    def parse_dt(val):
-                        try:
-                            return datetime.fromisoformat(val.replace('Z','')) if val else None
-                        except Exception:
-                            return None
-
-                    offer_rows.append(
-                        FlightOffer(
-                            search_id=search_row.search_id,
-                            offer_id=f.get('offer_id'),
-                            airline_name=f.get('airline_name'),
-                            origin=f.get('origin'),
-                            destination=f.get('destination'),
-                            departure=parse_dt(f.get('departure')),
-                            arrival=parse_dt(f.get('arrival')),
-                            duration_text=f.get('duration'),
-                            stops_text=f.get('stops_text'),
-                            lowest_price=lowest_price,
-                            currency=currency,
-                        )
-                    )
-
-                if offer_rows:
-                    db.session.bulk_save_objects(offer_rows, return_defaults=False)
-
-                db.session.commit()
-
-                # Also log each outbound flight directly into Search table (one row per offer) per request
-                # This fulfills requirement to have all API returned results represented in Search table.
-                # NOTE: This will grow the Search table quickly; consider pagination/archival later.
-                per_offer_rows = []
-                seen_offer_ids = set()
-                for f in outbound_flights:
-                    offer_id = f.get('offer_id')
-                    if not offer_id or offer_id in seen_offer_ids:
-                        continue
-                    seen_offer_ids.add(offer_id)
-
-                    # Lowest price for this offer
-                    lowest_price = None
-                    for fares in f.get('fares_by_cabin', {}).values():
-                        for fare in fares:
-                            p = fare.get('price')
-                            if p is not None and (lowest_price is None or p < lowest_price):
-                                lowest_price = p
-
-                    # Departure date for the offer (date part only)
-                    dep_dt_offer = None
-                    try:
-                        raw_dep = f.get('departure')
-                        if raw_dep:
-                            dep_iso = raw_dep.replace('Z','')
-                            dep_dt_full = datetime.fromisoformat(dep_iso)
-                            dep_dt_offer = dep_dt_full.replace(hour=0, minute=0, second=0, microsecond=0)
-                    except Exception:
-                        dep_dt_offer = dep_dt
-
-                    per_offer_rows.append(
-                        Search(
-                            user_id=user_id,
-                            origin=(f.get('origin') or '').upper(),
-                            destination=(f.get('destination') or '').upper(),
-                            departure_date=dep_dt_offer,
-                            return_date=ret_dt,
-                            target_price=float(lowest_price) if lowest_price is not None else None,
-                        )
-                    )
-
-                if per_offer_rows:
-                    db.session.bulk_save_objects(per_offer_rows, return_defaults=False)
-                    db.session.commit()
-        except Exception as e:
-            try:
-                db.session.rollback()
-            except Exception:
-                pass
-            print(f"⚠️ Could not persist search + offers: {e}")
+        user_id = session.get('user_id')
+        if user_id:
+            persist_search(user_id, origin, destination, searched_date, return_date, trip_type,
+                           min_prices.get(searched_date), outbound_flights)
 
 
     return render_template(
@@ -582,11 +704,14 @@ def search():
         COUNTRY_NAMES=COUNTRY_NAMES,
         searched_date=searched_date,
         return_date=return_date,
+        outbound_key=outbound_key,
+        return_key=return_key,
         trip_type=trip_type,
         origin=origin,
         destination=destination,
         date_range=date_range,
         min_prices=min_prices,
+        price_currencies=price_currencies,
         adults=adults,
         children=children,
         infants=infants,
@@ -594,6 +719,120 @@ def search():
     )
 
 
+# =========================
+# Streaming Search (Server-Sent Events)
+# =========================
+def _sse(event, payload):
+    """Format one Server-Sent Event (offers serialize through app.json)."""
+    return f"event: {event}\ndata: {app.json.dumps(payload)}\n\n"
+
+
+@app.route('/search/live')
+def search_live():
+    """Results page shell that fills itself from /api/search/stream."""
+    origin = extract_iata(request.args.get('origin', ''))
+    destination = extract_iata(request.args.get('destination', ''))
+    if not origin or not destination:
+        return redirect(url_for('search'))
+    trip_type = request.args.get('trip_type') or 'oneway'
+    searched_date = normalize_date(request.args.get('date') or '')
+    return_date = normalize_date(request.args.get('return_date') or '') if trip_type == 'roundtrip' else ''
+    return render_template(
+        'search_live.html',
+        AIRPORTS=AIRPORTS,
+        origin=origin,
+        destination=destination,
+        searched_date=searched_date,
+        return_date=return_date,
+        trip_type=trip_type,
+    )
+
+
+@app.route('/api/search/stream')
+def search_stream():
+    """
+    Stream a search as Server-Sent Events, one cabin at a time.
+    Query: origin, destination, date; optional trip_type=roundtrip + return_date.
+
+    Events:
+        start         {outbound_key}: result set the offers are stored under
+        offers        {cabin, elapsed_ms, offers}: offers added or changed by one cabin
+        cabin_missed  {cabin}: cabin still running at SEARCH_DEADLINE_SECONDS
+        done          {count, min_price, return_key, elapsed_ms}
+    """
+    origin = extract_iata(request.args.get('origin', ''))
+    destination = extract_iata(request.args.get('destination', ''))
+    if not origin or not destination:
+        return jsonify({'error': 'origin and destination are required'}), 400
+    trip_type = request.args.get('trip_type') or 'oneway'
+    searched_date = normalize_date(request.args.get('date') or '')
+    return_date = normalize_date(request.args.get('return_date') or '') if trip_type == 'roundtrip' else ''
+    user_id = session.get('user_id')
+
+    def generate():
+        started = time.perf_counter()
+        return_future = leg_executor.submit(build_flights, destination, origin, return_date) if return_date else None
+        outbound_key = store_result_set(origin, destination, searched_date, [])
+        yield _sse('start', {'outbound_key': outbound_key})
+
+        merger = OfferMerger(searched_date, AIRLINES)
+        futures = {
+            search_executor.submit(search_cabin, origin, destination, searched_date, tclass, CABIN_MAX_RESULTS): tclass
+            for tclass in TRAVEL_CLASSES
+        }
+        first_sent = False
+        try:
+            for future in as_completed(futures, timeout=SEARCH_DEADLINE_SECONDS):
+                tclass = futures[future]
+                try:
+                    changed = merger.add(future.result())
+                except Exception as e:
+                    print(f"❌ {tclass} search failed: {e}")
+                    changed = []
+                extend_result_set(outbound_key, changed)
+                elapsed = time.perf_counter() - started
+                if changed and not first_sent:
+                    first_sent = True
+                    perf_metrics.record_timing("search.stream.first_offers", elapsed)
+                yield _sse('offers', {'cabin': tclass, 'elapsed_ms': round(elapsed * 1000), 'offers': changed})
+        except FuturesTimeout:
+            for future, tclass in futures.items():
+                if not future.done():
+                    future.cancel()
+                    perf_metrics.incr(f"search.cabin.{tclass}.deadline_missed")
+                    yield _sse('cabin_missed', {'cabin': tclass})
+
+        outbound_flights = merger.offers()
+        return_key = None
+        if return_future is not None:
+            try:
+                return_flights = return_future.result()
+            except Exception as e:
+                print(f"❌ Return leg search failed: {e}")
+                return_flights = []
+            return_key = store_result_set(destination, origin, return_date, return_flights)
+
+        prices = [f.min_price for f in outbound_flights if f.min_price is not None]
+        elapsed = time.perf_counter() - started
+        perf_metrics.record_timing("search.stream", elapsed)
+        yield _sse('done', {
+            'count': len(outbound_flights),
+            'min_price': min(prices) if prices else None,
+            'return_key': return_key,
+            'elapsed_ms': round(elapsed * 1000),
+        })
+
+        if user_id:
+            persist_search(user_id, origin, destination, searched_date, return_date, trip_type,
+                           min(prices) if prices else None, outbound_flights)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 # =========================
 # Flight Details API
 # =========================
@@ -604,10 +843,10 @@ def flight_details():
         return jsonify({"error": "Missing offer_id"}), 400
 
     try:
-        response = amadeus.shopping.flight_offers.pricing.post(
+        priced = flight_provider.price_offers(
             {"data": {"type": "flight-offers-pricing", "flightOffers": [{"id": offer_id}]}}
         )
-        flight_offer = response.data[0]
+        flight_offer = priced["flightOffers"][0] if isinstance(priced, dict) else priced[0]
         segments = flight_offer.get("itineraries", [{}])[0].get("segments", [])
         price_info = flight_offer.get("price", {})
 
@@ -652,38 +891,33 @@ def format_date(value):
     except:
         return value
 
+CURRENCY_SYMBOLS = {'USD': '$', 'EUR': '€', 'GBP': '£', 'JPY': '¥', 'NGN': '₦', 'INR': '₹',
+                    'CAD': 'CA$', 'AUD': 'A$'}
+
+
+@app.template_filter('currency_symbol')
+def currency_symbol(code):
+    """'$' for USD (also when unknown), '€' for EUR; codes without a symbol as 'CHF '."""
+    code = (code or 'USD').upper()
+    return CURRENCY_SYMBOLS.get(code, f"{code} ")
+
 # Additional summary formatting filters
+# Offers carry these strings pre-formatted (offer.departs.time12 etc.); the filters
+# remain for other ISO strings and share the same memoized parser
 @app.template_filter('time12')
 def jinja_time12(iso_str: str) -> str:
     """Format to HH:MM AM/PM with leading zeros and uppercase meridiem."""
-    try:
-        dt = datetime.fromisoformat(iso_str)
-        hour12 = dt.hour % 12 or 12
-        minutes = dt.minute
-        ampm = 'AM' if dt.hour < 12 else 'PM'
-        return f"{hour12:02d}:{minutes:02d} {ampm}"
-    except Exception:
-        return ''
+    return parse_moment(iso_str).time12
 
 @app.template_filter('date_full')
 def jinja_date_full(iso_str: str) -> str:
-    try:
-        dt = datetime.fromisoformat(iso_str)
-        # Build portable day and month names without leading zeros
-        day_abbr = dt.strftime('%a')
-        month_abbr = dt.strftime('%b')
-        return f"{day_abbr}, {month_abbr} {dt.day}, {dt.year}"
-    except Exception:
-        return ''
+    """Return like 'Wed, Sep 17, 2025'."""
+    return parse_moment(iso_str).date_full
 
 @app.template_filter('date_compact')
 def jinja_date_compact(iso_str: str) -> str:
     """Return like 'wed, 17, 2025' in lowercase, with day-of-month no leading zero."""
-    try:
-        dt = datetime.fromisoformat(iso_str)
-        return f"{dt.strftime('%a').lower()}, {dt.day}, {dt.year}"
-    except Exception:
-        return ''
+    return parse_moment(iso_str).date_compact
 
 
 # =========================
@@ -743,8 +977,8 @@ def flight_information():
         return render_template('base.html', message="No flight data provided")
 
     try:
-        flight = json.loads(offer_json)
-        fares_by_cabin = flight.get('fares_by_cabin', {})
+        flight = Offer.from_dict(json.loads(offer_json))
+        fares_by_cabin = flight.fares_by_cabin
 
         # Pick a default cabin if the requested one is not available
         if selected_cabin not in fares_by_cabin:
@@ -759,8 +993,6 @@ def flight_information():
         logo = flight.get('airline_logo', '')
         origin = flight.get('origin', '')
         destination = flight.get('destination', '')
-        departure_iso = flight.get('departure', '')
-        arrival_iso = flight.get('arrival', '')
         duration = flight.get('duration', '')
         stops = flight.get('stops_text', '')
 
@@ -768,12 +1000,12 @@ def flight_information():
         origin_city = AIRPORTS.get(origin, {}).get("city", origin)
         destination_city = AIRPORTS.get(destination, {}).get("city", destination)
 
-        # Convert departure/arrival to datetime objects and format
-        departure_dt = datetime.fromisoformat(departure_iso) if departure_iso else None
-        arrival_dt = datetime.fromisoformat(arrival_iso) if arrival_iso else None
+        # Departure/arrival were parsed once when the offer was normalized
+        departure_dt = flight.departs.at
+        arrival_dt = flight.arrives.at
 
-        departure_time = departure_dt.strftime("%I:%M %p") if departure_dt else ""
-        arrival_time = arrival_dt.strftime("%I:%M %p") if arrival_dt else ""
+        departure_time = flight.departs.time12
+        arrival_time = flight.arrives.time12
         departure_date = departure_dt.strftime("%A %d %Y") if departure_dt else ""
         arrival_date = arrival_dt.strftime("%A %d %Y") if arrival_dt else ""
 
@@ -805,26 +1037,84 @@ def flight_information():
         return render_template('base.html', message=f"Error processing flight data: {ex}")
 
 
+# =========================
+# Selected Offer Helpers
+# =========================
+def _keep_selected_flight(leg, ref, flight):
+    """
+    Mirror the selected offer into the user's session. Stored result sets
+    expire OFFER_STORE_TTL_SECONDS after the search, so the later booking
+    pages can still resolve `ref` for a user who takes longer than that.
+    """
+    selected = session.get('selected_offers') or {}
+    if (selected.get(leg) or {}).get('ref') == ref:
+        return
+    offer = flight.to_dict() if hasattr(flight, 'to_dict') else dict(flight)
+    selected[leg] = {'ref': ref, 'offer': offer}
+    session['selected_offers'] = selected
+
+
+def offer_expired_redirect():
+    """Send the user back to search when the posted offer can no longer be resolved."""
+    flash('That flight offer has expired. Please search again to see current prices.', 'error')
+    return redirect(url_for('search'))
+
+
+def load_selected_flight(leg: str):
+    """
+    Resolve the flight chosen for `leg` ('outbound' or 'return') on a previous page.
+    Prefers the offer-store reference posted as `<leg>_ref`; when the store no
+    longer has it, the copy kept in the session for that reference is used.
+    A legacy `<leg>_json` payload is still accepted, normalized into an Offer
+    and stored so later pages can post a reference.
+    Returns (flight, ref), or (None, None) when nothing usable was posted.
+    """
+    ref = request.form.get(f'{leg}_ref')
+    flight = resolve_offer(ref)
+    if flight is not None:
+        _keep_selected_flight(leg, ref, flight)
+        return flight, ref
+    kept = (session.get('selected_offers') or {}).get(leg) or {}
+    if ref and kept.get('ref') == ref:
+        perf_metrics.incr('offer_store.session_fallbacks')
+        flight = Offer.from_dict(kept['offer'])
+        new_ref = remember_offer(flight)
+        _keep_selected_flight(leg, new_ref, flight)
+        return flight, new_ref
+    raw = request.form.get(f'{leg}_json')
+    if not raw:
+        if ref:
+            print(f"⚠️ Offer reference {ref} expired or unknown")
+        return None, None
+    try:
+        flight = json.loads(raw)
+    except ValueError:
+        return None, None
+    if not isinstance(flight, dict):
+        return None, None
+    flight = Offer.from_dict(flight)
+    ref = remember_offer(flight)
+    _keep_selected_flight(leg, ref, flight)
+    return flight, ref
+
+
 # =========================
 # Flight Summary (Roundtrip)
 # =========================
 @app.route('/flight_summary', methods=['POST'])
 def flight_summary():
     """
-    Accepts selected outbound and optional return flight JSON payloads, computes total, and renders summary.
+    Accepts the selected outbound and optional return flight (offer references), computes total, and renders summary.
     """
-    outbound_json = request.form.get('outbound_json')
-    return_json = request.form.get('return_json')
+    outbound, outbound_ref = load_selected_flight('outbound')
+    return_flight, return_ref = load_selected_flight('return')
     selected_cabin_out = request.form.get('cabin_out') or 'ECONOMY'
     selected_cabin_ret = request.form.get('cabin_ret') or 'ECONOMY'
 
-    if not outbound_json:
-        return redirect(url_for('search'))
+    if not outbound:
+        return offer_expired_redirect()
 
     try:
-        outbound = json.loads(outbound_json)
-        return_flight = json.loads(return_json) if return_json else None
-
         def pick_price(flight, preferred_cabin):
             fares_by_cabin = flight.get('fares_by_cabin', {}) or {}
             # Prefer preferred cabin if available; else pick lowest among any cabin
@@ -852,24 +1142,6 @@ def flight_summary():
         def city(iata):
             return AIRPORTS.get(iata, {}).get('city', iata)
 
-        # Nice date/time formatting
-        def fmt_time(iso_str):
-            try:
-                dt = datetime.fromisoformat(iso_str)
-                hour12 = dt.hour % 12 or 12
-                minutes = dt.minute
-                ampm = 'AM' if dt.hour < 12 else 'PM'
-                return f"{hour12:02d}:{minutes:02d} {ampm}"
-            except Exception:
-                return ''
-
-        def day_name(iso_str):
-            try:
-                dt = datetime.fromisoformat(iso_str)
-                return dt.strftime('%A')
-            except Exception:
-                return ''
-
         def pick_fare(flight, cabin):
             fares_by_cabin = flight.get('fares_by_cabin', {}) or {}
             fares = fares_by_cabin.get(cabin) or []
@@ -900,9 +1172,9 @@ def flight_summary():
 
         context = {
             'outbound': outbound,
-            'outbound_json': json.dumps(outbound),  # For seat selection
+            'outbound_ref': outbound_ref,  # For seat selection
             'return_flight': return_flight,
-            'return_json': json.dumps(return_flight) if return_flight else None,  # For seat selection
+            'return_ref': return_ref,  # For seat selection
             'price_out': price_out,
             'price_ret': price_ret,
             'total_price': total_price,
@@ -921,16 +1193,16 @@ def flight_summary():
             'children': children,
             'infants': infants,
             'total_passengers': total_passengers,
-            # Outbound formatted
-            'out_dep_time': fmt_time(outbound.get('departure')),
-            'out_arr_time': fmt_time(outbound.get('arrival')),
-            'out_dep_day': day_name(outbound.get('departure')),
-            'out_arr_day': day_name(outbound.get('arrival')),
+            # Outbound formatted (pre-formatted during normalization)
+            'out_dep_time': outbound.departs.time12,
+            'out_arr_time': outbound.arrives.time12,
+            'out_dep_day': outbound.departs.day_name,
+            'out_arr_day': outbound.arrives.day_name,
             # Return formatted
-            'ret_dep_time': fmt_time(return_flight.get('departure')) if return_flight else '',
-            'ret_arr_time': fmt_time(return_flight.get('arrival')) if return_flight else '',
-            'ret_dep_day': day_name(return_flight.get('departure')) if return_flight else '',
-            'ret_arr_day': day_name(return_flight.get('arrival')) if return_flight else '',
+            'ret_dep_time': return_flight.departs.time12 if return_flight else '',
+            'ret_arr_time': return_flight.arrives.time12 if return_flight else '',
+            'ret_dep_day': return_flight.departs.day_name if return_flight else '',
+            'ret_arr_day': return_flight.arrives.day_name if return_flight else '',
         }
 
         return render_template('flight_summary.html', AIRPORTS=AIRPORTS, **context)
@@ -948,21 +1220,18 @@ def seat_selection():
     Seat selection page - allows users to choose seats before booking.
     Shows interactive seatmap using Amadeus SeatMap API.
     """
-    outbound_json = request.form.get('outbound_json')
-    return_json = request.form.get('return_json')
+    outbound, outbound_ref = load_selected_flight('outbound')
+    return_flight, return_ref = load_selected_flight('return')
     cabin_out = request.form.get('cabin_out', 'ECONOMY')
     cabin_ret = request.form.get('cabin_ret', 'ECONOMY')
     total_price = request.form.get('total_price', '0.00')
     base_total = request.form.get('base_total')
     taxes_total = request.form.get('taxes_total')
 
-    if not outbound_json:
-        return redirect(url_for('search'))
+    if not outbound:
+        return offer_expired_redirect()
 
     try:
-        outbound = json.loads(outbound_json)
-        return_flight = json.loads(return_json) if return_json else None
-
         # Helper function for city names
         def city(iata):
             return AIRPORTS.get(iata, {}).get('city', iata)
@@ -976,9 +1245,9 @@ def seat_selection():
 
         context = {
             'outbound': outbound,
-            'outbound_json': outbound_json,
+            'outbound_ref': outbound_ref,
             'return_flight': return_flight,
-            'return_json': return_json,
+            'return_ref': return_ref,
             'cabin_out': cabin_out,
             'cabin_ret': cabin_ret,
             'total_price': total_price,
@@ -1005,31 +1274,37 @@ def seat_selection():
 def select_return():
     """
     Presents return flight options after an outbound has been selected.
-    Expects: outbound_json, cabin_out, origin, destination, return_date
+    Expects: outbound_ref, cabin_out, origin, destination, return_date
+    Optional: return_key (return results already fetched by /search)
     """
-    outbound_json = request.form.get('outbound_json')
+    outbound, outbound_ref = load_selected_flight('outbound')
     cabin_out = (request.form.get('cabin_out') or 'ECONOMY').upper()
     origin = request.form.get('origin')
     destination = request.form.get('destination')
     return_date = request.form.get('return_date')
+    return_key = request.form.get('return_key')
 
-    if not (outbound_json and origin and destination and return_date):
-        return redirect(url_for('search'))
-
-    try:
-        outbound = json.loads(outbound_json)
-    except Exception:
+    if not outbound:
+        return offer_expired_redirect()
+    if not (origin and destination and return_date):
         return redirect(url_for('search'))
 
-    # Search for return flights (destination -> origin on return_date)
+    # Return flights (destination -> origin on return_date): reuse the set /search
+    # already fetched when it is still stored, otherwise search again
     return_date = normalize_date(return_date)
-    return_flights = build_flights(destination, origin, return_date)
+    stored = get_result_set(return_key)
+    if stored and (stored['origin'], stored['destination'], stored['date']) == (destination, origin, return_date):
+        return_flights = stored['flights']
+    else:
+        return_flights = build_flights(destination, origin, return_date)
+        return_key = store_result_set(destination, origin, return_date, return_flights)
 
     return render_template(
         'select_return.html',
         AIRPORTS=AIRPORTS,
         COUNTRY_NAMES=COUNTRY_NAMES,
-        outbound_json=outbound_json,
+        outbound_ref=outbound_ref,
+        return_key=return_key,
         cabin_out=cabin_out,
         origin=origin,
         destination=destination,
@@ -1049,8 +1324,8 @@ def booking():
     Collects information for all passengers (adults, children, infants).
     """
     # Get all the flight data from the summary page
-    outbound_json = request.form.get('outbound_json')
-    return_json = request.form.get('return_json')
+    outbound, outbound_ref = load_selected_flight('outbound')
+    return_flight, return_ref = load_selected_flight('return')
     cabin_out = request.form.get('cabin_out', 'ECONOMY')
     cabin_ret = request.form.get('cabin_ret', 'ECONOMY')
     total_price = request.form.get('total_price', '0.00')
@@ -1078,15 +1353,8 @@ def booking():
     child_price = base_price * 0.75
     infant_price = base_price * 0.10
     
-    # Parse flight data
-    try:
-        outbound = json.loads(outbound_json) if outbound_json else None
-        return_flight = json.loads(return_json) if return_json else None
-    except:
-        return redirect(url_for('search'))
-    
     if not outbound:
-        return redirect(url_for('search'))
+        return offer_expired_redirect()
     
     # Get airport details
     origin_city = AIRPORTS.get(outbound.get('origin', ''), {}).get('city', outbound.get('origin', ''))
@@ -1095,7 +1363,9 @@ def booking():
     return render_template(
         'booking.html',
         outbound=outbound,
+        outbound_ref=outbound_ref,
         return_flight=return_flight,
+        return_ref=return_ref,
         cabin_out=cabin_out,
         cabin_ret=cabin_ret,
         total_price=total_price,
@@ -1180,8 +1450,11 @@ def confirmation():
     payment_intent_id = request.form.get('payment_intent_id')
     
     # Get flight details
-    outbound_json = request.form.get('outbound_json')
-    return_json = request.form.get('return_json')
+    outbound, _ = load_selected_flight('outbound')
+    return_flight, _ = load_selected_flight('return')
+    if not outbound:
+        print(f"⚠️ Confirmation without a resolvable outbound offer (payment {payment_intent_id or 'n/a'})")
+        return offer_expired_redirect()
     cabin_out = request.form.get('cabin_out', 'ECONOMY')
     cabin_ret = request.form.get('cabin_ret', 'ECONOMY')
     total_price = request.form.get('total_price', '0.00')
@@ -1193,13 +1466,6 @@ def confirmation():
     except Exception:
         passenger_details = []
     
-    # Parse flight data
-    try:
-        outbound = json.loads(outbound_json) if outbound_json else None
-        return_flight = json.loads(return_json) if return_json else None
-    except:
-        return redirect(url_for('search'))
-    
     # Generate booking reference
     import random, string
     booking_ref = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
@@ -1211,32 +1477,9 @@ def confirmation():
     # Persist Ticket and Flight (best-effort; does not block rendering)
     try:
         with app.app_context():
-            def parse_dt(val):
-                try:
-                    return datetime.fromisoformat(val) if val else None
-                except Exception:
-                    return None
-
-            def duration_minutes(s: str | None) -> int | None:
-                if not s:
-                    return None
-                try:
-                    # expects like "12h 30m" or "12h" or "30m"
-                    mins = 0
-                    import re
-                    h = re.search(r"(\d+)h", s)
-                    m = re.search(r"(\d+)m", s)
-                    if h:
-                        mins += int(h.group(1)) * 60
-                    if m:
-                        mins += int(m.group(1))
-                    return mins or None
-                except Exception:
-                    return None
-
-            dep_time = parse_dt(outbound.get('departure') if outbound else None)
-            arr_time = parse_dt(outbound.get('arrival') if outbound else None)
-            dur = duration_minutes(outbound.get('duration') if outbound else None)
+            dep_time = outbound.departs.at if outbound else None
+            arr_time = outbound.arrives.at if outbound else None
+            dur = (outbound.duration_minutes or None) if outbound else None
 
             flight = Flight(
                 flight_number=None,  # unknown in simplified offer
@@ -1297,7 +1540,7 @@ def confirmation():
                 origin=outbound.get('origin', '') if outbound else '',
                 destination=outbound.get('destination', '') if outbound else '',
                 departure_date=dep_time.date() if dep_time else None,
-                return_date=parse_dt(return_flight.get('departure')).date() if return_flight and return_flight.get('departure') else None,
+                return_date=return_flight.departs.at.date() if return_flight and return_flight.departs.at else None,
                 airline=outbound.get('airline', '') if outbound else '',
                 flight_number=outbound.get('flight', '') if outbound else '',
                 passengers_json=json.dumps(passengers_data),
@@ -1345,7 +1588,8 @@ def confirmation():
 def airport_search():
     """
     Search airports by keyword.
-    Primary source: local AIRPORTS dataset for broad/global coverage (fast, offline).
+    Primary source: local AIRPORTS dataset through the ranked autocomplete index
+    (exact IATA, then word prefixes, then substrings; see airport_index.py).
     Secondary source: Amadeus Airport & City Search API to enrich results when available.
     Returns airport suggestions for autocomplete functionality with a consistent shape.
     """
@@ -1354,37 +1598,11 @@ def airport_search():
     if not keyword or len(keyword) < 2:
         return jsonify([])
     
-    # Normalize for search
-    q = keyword.lower()
-
-    def build_display(iata_code: str, name: str, city_name: str, country: str = "") -> str:
-        city_part = city_name or iata_code
-        name_part = name or ""
-        country_part = f", {country}" if country else ""
-        # Example: "Lagos, Nigeria - Murtala Muhammed Intl (LOS)"
-        return f"{city_part}{country_part} - {name_part} ({iata_code})".strip()
-
-    # 1) Local fallback (primary) using AIRPORTS loaded at startup
+    # 1) Local results (primary) from the index built with AIRPORTS
     local_matches = []
     try:
-        for iata, info in AIRPORTS.items():
-            city = (info.get('city') or '').strip()
-            name = (info.get('name') or '').strip()
-            country = (info.get('country') or '').strip()
-            if (
-                q in iata.lower() or
-                (city and q in city.lower()) or
-                (name and q in name.lower())
-            ):
-                local_matches.append({
-                    'iata': iata,
-                    'name': name,
-                    'city': city,
-                    'country': country,
-                    'display': build_display(iata, name, city, country)
-                })
-            if len(local_matches) >= 20:
-                break
+        with perf_metrics.timed('airports.local_search'):
+            local_matches = airport_index.search(keyword, limit=20)
     except Exception as e:
         print(f"❌ Local airport search error: {e}")
         local_matches = []
@@ -1392,41 +1610,71 @@ def airport_search():
     results_by_iata = {s['iata']: s for s in local_matches}
 
     # 2) Remote enrichment (secondary) using Amadeus
-    # Only attempt if we have fewer than 20 matches to keep list concise
-    try:
-        if len(results_by_iata) < 20 and os.getenv('AMADEUS_CLIENT_ID') and os.getenv('AMADEUS_CLIENT_SECRET'):
-            response = amadeus.reference_data.locations.get(
-                keyword=keyword,
-                subType='AIRPORT,CITY'
-            )
-            if hasattr(response, 'data') and response.data:
-                for location in response.data:
-                    iata_code = location.get('iataCode') or ''
-                    if not iata_code or iata_code in results_by_iata:
-                        continue
-                    name = location.get('name') or ''
-                    city_name = (location.get('address', {}) or {}).get('cityName') or ''
-                    country = (location.get('address', {}) or {}).get('countryName') or ''
-                    results_by_iata[iata_code] = {
-                        'iata': iata_code,
-                        'name': name,
-                        'city': city_name,
-                        'country': country,
-                        'display': build_display(iata_code, name, city_name, country)
-                    }
-                    if len(results_by_iata) >= 20:
-                        break
-    except ResponseError as e:
-        # Log but don't fail the endpoint — local data still works
-        print(f"❌ Airport search (Amadeus) error: {e}")
-    except Exception as e:
-        print(f"❌ Unexpected airport search error: {e}")
+    # Only attempt if we have fewer than 20 matches to keep list concise. The lookup
+    # is cached (including empty results) and bounded by LOCATION_DEADLINE_SECONDS;
+    # see location_lookup.py
+    if len(results_by_iata) < 20 and os.getenv('AMADEUS_CLIENT_ID') and os.getenv('AMADEUS_CLIENT_SECRET'):
+        for suggestion in lookup_locations(amadeus, keyword):
+            if suggestion['iata'] not in results_by_iata:
+                results_by_iata[suggestion['iata']] = suggestion
+                if len(results_by_iata) >= 20:
+                    break
 
     # Return combined results (local first, then remote), up to 20
     suggestions = list(results_by_iata.values())[:20]
     return jsonify(suggestions)
 
 
+# =========================
+# Airport Dataset (client-side autocomplete)
+# =========================
+@app.route('/api/airports/dataset')
+def airport_dataset_current():
+    """Redirect to the current versioned airport dataset (see airport_dataset.py)."""
+    response = redirect(url_for('airport_dataset_version', version=airport_dataset.version))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/api/airports/dataset/<version>.json')
+def airport_dataset_version(version):
+    """
+    Serve the compact airport dataset for browser-side autocomplete.
+    Versioned URLs never change, so they are cached for a year (immutable);
+    an outdated version redirects to the current one.
+    """
+    if version != airport_dataset.version:
+        return airport_dataset_current()
+
+    body, etag, gzipped = airport_dataset.representation(request.headers.get('Accept-Encoding'))
+    headers = {
+        'ETag': etag,
+        'Cache-Control': AIRPORT_DATASET_CACHE_CONTROL,
+        'Vary': 'Accept-Encoding',
+    }
+    if etag in request.headers.get('If-None-Match', ''):
+        perf_metrics.incr('airports.dataset_not_modified')
+        return Response(status=304, headers=headers)
+
+    perf_metrics.incr('airports.dataset_served')
+    if gzipped:
+        headers['Content-Encoding'] = 'gzip'
+    return Response(body, mimetype='application/json', headers=headers)
+
+
+@app.route('/api/airports/dataset/usage', methods=['POST'])
+def airport_dataset_usage():
+    """Record how many autocomplete lookups a page answered locally (sent with sendBeacon)."""
+    try:
+        data = json.loads(request.get_data(as_text=True) or '{}')
+        local_lookups = max(0, min(int(data.get('local_lookups', 0)), 1000))
+    except (ValueError, TypeError, AttributeError):
+        return jsonify({'error': 'Invalid usage report'}), 400
+    perf_metrics.incr('airports.client_sessions')
+    perf_metrics.incr('airports.client_local_lookups', local_lookups)
+    return Response(status=204)
+
+
 # =========================
 # Flight Booking API (Create Orders)
 # =========================
@@ -1446,17 +1694,10 @@ def book_flight():
         if not flight_offer or not travelers:
             return jsonify({'error': 'Missing flight offer or traveler information'}), 400
         
-        # Create flight order using Amadeus API
-        response = amadeus.booking.flight_orders.post(
-            data={
-                'type': 'flight-order',
-                'flightOffers': [flight_offer],
-                'travelers': travelers
-            }
-        )
+        # Create flight order through the flight provider
+        order_data = flight_provider.create_order([flight_offer], travelers)
         
-        if hasattr(response, 'data'):
-            order_data = response.data
+        if order_data:
             
             # Extract booking details
             booking_reference = order_data.get('associatedRecords', [{}])[0].get('reference', 'N/A')
@@ -1496,12 +1737,12 @@ def get_flight_order(order_id):
     Retrieve flight order details using Amadeus Flight Order Management API.
     """
     try:
-        response = amadeus.booking.flight_orders(order_id).get()
+        order = flight_provider.get_order(order_id)
         
-        if hasattr(response, 'data'):
+        if order:
             return jsonify({
                 'success': True,
-                'order': response.data
+                'order': order
             })
         else:
             return jsonify({'error': 'Order not found'}), 404
@@ -1520,12 +1761,12 @@ def cancel_flight_order(order_id):
     Cancel a flight order using Amadeus Flight Order Management API.
     """
     try:
-        response = amadeus.booking.flight_orders(order_id).delete()
+        result = flight_provider.cancel_order(order_id)
         
         return jsonify({
             'success': True,
             'message': 'Flight order cancelled successfully',
-            'result': response.data if hasattr(response, 'data') else {}
+            'result': result
         })
             
     except ResponseError as e:
@@ -1593,11 +1834,11 @@ def get_seatmaps():
         if not flight_offer:
             return jsonify({'error': 'Flight offer is required'}), 400
         
-        response = amadeus.shopping.seatmaps.post(flight_offer)
+        seatmap_data_list = flight_provider.seatmaps(flight_offer)
         
-        if hasattr(response, 'data'):
+        if seatmap_data_list is not None:
             seatmaps = []
-            for seatmap_data in response.data:
+            for seatmap_data in seatmap_data_list:
                 seatmap_info = {
                     'segmentId': seatmap_data.get('segmentId'),
                     'carrierCode': seatmap_data.get('carrierCode'),
@@ -1855,11 +2096,11 @@ def get_cheapest_dates():
         if departure_date:
             params['departureDate'] = departure_date
         
-        response = amadeus.shopping.flight_dates.get(**params)
+        date_options = flight_provider.cheapest_dates(**params)
         
-        if hasattr(response, 'data') and response.data:
+        if date_options:
             dates = []
-            for date_option in response.data:
+            for date_option in date_options:
                 dates.append({
                     'departureDate': date_option.get('departureDate'),
                     'returnDate': date_option.get('returnDate'),
@@ -2611,7 +2852,7 @@ def cancel_budget_request(request_id):
         if not budget_request:
             return jsonify({'success': False, 'message': 'Request not found'}), 404
         
-        if budget_request.status in ['booked', 'cancelled']:
+        if budget_request.status in ['booked', 'cancelled', 'expired']:
             return jsonify({'success': False, 'message': 'Cannot cancel this request'}), 400
         
         budget_request.status = 'cancelled'
@@ -2634,6 +2875,7 @@ def check_budget_request_now(request_id):
     
     try:
         from models import BudgetBuyRequest, Passport
+        from monitor_leases import CHECKABLE_STATUSES, claim as claim_lease, release as release_leases, transition
         user_id = session.get('user_id')
         
         budget_request = BudgetBuyRequest.query.filter_by(
@@ -2644,9 +2886,14 @@ def check_budget_request_now(request_id):
         if not budget_request:
             return jsonify({'success': False, 'message': 'Request not found'}), 404
         
-        if budget_request.status in ['booked', 'cancelled']:
+        if budget_request.status in ['booked', 'cancelled', 'expired']:
             return jsonify({'success': False, 'message': 'Cannot check this request'}), 400
         
+        if departed(budget_request.departure_date):
+            schedule_next_check(budget_request)  # marks it expired
+            db.session.commit()
+            return jsonify({'success': False, 'message': 'The departure date has passed; this request has expired'}), 400
+        
         # Check for passport if auto-book mode
         passport = None
         if budget_request.mode == 'auto_book':
@@ -2658,197 +2905,208 @@ def check_budget_request_now(request_id):
                     'needs_passport': True
                 }), 400
         
-        # Search for flights
+        # Lease the request for this check: no monitor (or second click) can act on it meanwhile
+        lease_owner = f"web:{request_id}:{secrets.token_hex(4)}"
+        if not claim_lease(db.session, request_id, lease_owner):
+            return jsonify({'success': False, 'message': 'A price check for this request is already running'}), 409
+        
         try:
-            date_str = budget_request.departure_date.strftime('%Y-%m-%d') if budget_request.departure_date else (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
+            # Search for flights
+            try:
+                date_str = budget_request.departure_date.strftime('%Y-%m-%d') if budget_request.departure_date else (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
             
-            response = amadeus.shopping.flight_offers_search.get(
-                originLocationCode=budget_request.origin,
-                destinationLocationCode=budget_request.destination,
-                departureDate=date_str,
-                adults=1,
-                max=10
-            )
+                # Non-stop/airline preferences go upstream; stops and time window are filtered below
+                offers = search_flight_offers(
+                    flight_provider,
+                    budget_request.origin,
+                    budget_request.destination,
+                    date_str,
+                    adults=1,
+                    **request_search_params(budget_request)
+                )
             
-            if not hasattr(response, 'data') or not response.data:
-                budget_request.last_checked_at = datetime.utcnow()
-                db.session.commit()
-                return jsonify({
-                    'success': False,
-                    'message': 'No flights found for this route'
-                })
+                if not offers:
+                    budget_request.last_checked_at = datetime.utcnow()
+                    db.session.commit()
+                    return jsonify({
+                        'success': False,
+                        'message': 'No flights found for this route'
+                    })
             
-            # Find lowest price and best offer
-            lowest_price = None
-            best_offer = None
-            for offer in response.data:
-                try:
-                    price = float(offer.get('price', {}).get('total', 0))
-                    if price > 0 and (lowest_price is None or price < lowest_price):
-                        lowest_price = price
-                        best_offer = offer
-                except Exception:
-                    continue
+                # Find lowest price and best offer among those matching the preferences
+                predicate = request_filter(budget_request)
+                lowest_price, best_offer = cheapest_offer(offers, predicate)
             
-            if lowest_price is None:
-                budget_request.last_checked_at = datetime.utcnow()
-                db.session.commit()
-                return jsonify({
-                    'success': False,
-                    'message': 'Could not find pricing information'
-                })
+                if lowest_price is None:
+                    budget_request.last_checked_at = datetime.utcnow()
+                    db.session.commit()
+                    return jsonify({
+                        'success': False,
+                        'message': 'No flights match your preferences' if predicate else 'Could not find pricing information'
+                    })
             
-            # Update last checked
-            budget_request.last_checked_at = datetime.utcnow()
+                # Update last checked (last_price also feeds the monitor's check scheduling)
+                budget_request.last_checked_at = datetime.utcnow()
+                budget_request.last_price = lowest_price
             
-            # Check if in budget
-            in_budget = budget_request.min_budget <= lowest_price <= budget_request.max_budget
+                # Check if in budget
+                in_budget = budget_request.min_budget <= lowest_price <= budget_request.max_budget
             
-            if in_budget and budget_request.mode == 'auto_book':
-                # AUTO-BOOK THE FLIGHT!
-                try:
-                    # Extract flight details from offer
-                    itinerary = best_offer.get('itineraries', [{}])[0]
-                    segments = itinerary.get('segments', [{}])
-                    first_segment = segments[0] if segments else {}
-                    
-                    # Parse departure time
-                    dep_time_str = first_segment.get('departure', {}).get('at', '')
-                    arr_time_str = first_segment.get('arrival', {}).get('at', '')
+                if in_budget and budget_request.mode == 'auto_book':
+                    # Compare-and-set under our lease: only one process may act on the match
+                    previous_status = budget_request.status
+                    if not transition(db.session, request_id, 'price_found',
+                                      from_statuses=CHECKABLE_STATUSES, owner=lease_owner):
+                        db.session.rollback()
+                        return jsonify({'success': False, 'message': 'A price check for this request is already running'}), 409
                     
+                    # AUTO-BOOK THE FLIGHT!
                     try:
-                        dep_time = datetime.fromisoformat(dep_time_str.replace('Z', '+00:00')) if dep_time_str else None
-                        arr_time = datetime.fromisoformat(arr_time_str.replace('Z', '+00:00')) if arr_time_str else None
-                    except:
-                        dep_time = None
-                        arr_time = None
+                        # Extract flight details from offer
+                        details = booking_details(best_offer)
+                        currency = details['currency'] or budget_request.currency or 'USD'
                     
-                    # Create Flight record
-                    flight = Flight(
-                        flight_number=first_segment.get('carrierCode', '') + first_segment.get('number', ''),
-                        departure_airport=budget_request.origin,
-                        arrival_airport=budget_request.destination,
-                        departure_time=dep_time,
-                        arrival_time=arr_time,
-                        duration=None
-                    )
-                    db.session.add(flight)
-                    db.session.flush()
+                        # Create Flight record
+                        flight = Flight(
+                            flight_number=details['flight_number'],
+                            departure_airport=budget_request.origin,
+                            arrival_airport=budget_request.destination,
+                            departure_time=details['departure_time'],
+                            arrival_time=details['arrival_time'],
+                            duration=details['duration']
+                        )
+                        db.session.add(flight)
+                        db.session.flush()
                     
-                    # Create Ticket record (old model for compatibility)
-                    ticket = Ticket(
-                        flight_id=flight.flight_id,
-                        search_id=None,
-                        price=lowest_price,
-                        currency='USD',
-                        fare_class='ECONOMY',
-                        Ticket_bought=True
-                    )
-                    db.session.add(ticket)
-                    db.session.flush()
+                        # Create Ticket record (old model for compatibility)
+                        ticket = Ticket(
+                            flight_id=flight.flight_id,
+                            search_id=None,
+                            price=lowest_price,
+                            currency=currency,
+                            fare_class='ECONOMY',
+                            Ticket_bought=True
+                        )
+                        db.session.add(ticket)
+                        db.session.flush()
                     
-                    # Create Payment record for admin dashboard
-                    payment = Payment(
-                        user_id=user_id,
-                        amount=lowest_price,
-                        currency='USD',
-                        status='completed',
-                        provider='budget_buy',
-                        transaction_id=f'BB{request_id:06d}',
-                        payment_method_id=None,
-                        card_last4=None,
-                        card_brand=None,
-                        completed_at=datetime.utcnow()
-                    )
-                    db.session.add(payment)
-                    db.session.flush()
+                        # Create Payment record for admin dashboard
+                        payment = Payment(
+                            user_id=user_id,
+                            amount=lowest_price,
+                            currency=currency,
+                            status='completed',
+                            provider='budget_buy',
+                            transaction_id=f'BB{request_id:06d}',
+                            payment_method_id=None,
+                            card_last4=None,
+                            card_brand=None,
+                            completed_at=datetime.utcnow()
+                        )
+                        db.session.add(payment)
+                        db.session.flush()
                     
-                    # Get user info for passenger details
-                    user = User.query.get(user_id)
-                    passengers_data = [{
-                        'name': f"{passport.first_name} {passport.last_name}" if passport else user.name,
-                        'passport': passport.passport_number if passport else None,
-                        'type': 'adult'
-                    }]
+                        # Get user info for passenger details
+                        user = User.query.get(user_id)
+                        passengers_data = [{
+                            'name': f"{passport.First_name} {passport.last_name}" if passport else user.name,
+                            'passport': passport.passport_number if passport else None,
+                            'type': 'adult'
+                        }]
                     
-                    # Calculate base price and taxes
-                    base = lowest_price * 0.85
-                    taxes = lowest_price * 0.15
+                        # Calculate base price and taxes
+                        base = lowest_price * 0.85
+                        taxes = lowest_price * 0.15
                     
-                    # Generate PNR
-                    import random, string
-                    pnr = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+                        # Generate PNR
+                        import random, string
+                        pnr = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
                     
-                    # Create Booking record for admin dashboard
-                    booking = Booking(
-                        user_id=user_id,
-                        pnr=pnr,
-                        origin=budget_request.origin,
-                        destination=budget_request.destination,
-                        departure_date=dep_time.date() if dep_time else budget_request.departure_date,
-                        return_date=budget_request.return_date,
-                        airline=first_segment.get('carrierCode', 'Unknown'),
-                        flight_number=first_segment.get('carrierCode', '') + first_segment.get('number', ''),
-                        passengers_json=json.dumps(passengers_data),
-                        base_price=base,
-                        taxes=taxes,
-                        total_amount=lowest_price,
-                        currency='USD',
-                        status='confirmed',
-                        api_provider='amadeus_budget_buy',
-                        api_booking_reference=f'BB{request_id:06d}',
-                        payment_id=payment.payment_id
-                    )
-                    db.session.add(booking)
-                    db.session.flush()
+                        # Create Booking record for admin dashboard
+                        booking = Booking(
+                            user_id=user_id,
+                            pnr=pnr,
+                            origin=budget_request.origin,
+                            destination=budget_request.destination,
+                            departure_date=details['departure_time'].date() if details['departure_time'] else budget_request.departure_date,
+                            return_date=budget_request.return_date,
+                            airline=details['carrier'] or 'Unknown',
+                            flight_number=details['flight_number'],
+                            passengers_json=json.dumps(passengers_data),
+                            base_price=base,
+                            taxes=taxes,
+                            total_amount=lowest_price,
+                            currency=currency,
+                            status='confirmed',
+                            api_provider='amadeus_budget_buy',
+                            api_booking_reference=f'BB{request_id:06d}',
+                            payment_id=payment.payment_id
+                        )
+                        db.session.add(booking)
+                        db.session.flush()
                     
-                    # Update budget request
-                    budget_request.status = 'booked'
-                    budget_request.booked_ticket_id = ticket.ticket_id
-                    budget_request.booked_price = lowest_price
-                    budget_request.booking_confirmation = pnr
-                    budget_request.completed_at = datetime.utcnow()
+                        # Update budget request, in the same transaction as the booking rows
+                        # (fails if the user cancelled meanwhile)
+                        if not transition(db.session, request_id, 'booked', from_statuses=('price_found',),
+                                          owner=lease_owner, commit=False,
+                                          booked_ticket_id=ticket.ticket_id,
+                                          booked_price=lowest_price,
+                                          booking_confirmation=pnr,
+                                          completed_at=datetime.utcnow()):
+                            raise RuntimeError('the request is no longer waiting for this booking')
                     
-                    db.session.commit()
+                        db.session.commit()
+                    
+                        print(f"✅ Auto-booked flight for request {request_id} - PNR: {pnr}, Price: ${lowest_price}")
                     
-                    print(f"✅ Auto-booked flight for request {request_id} - PNR: {pnr}, Price: ${lowest_price}")
+                        return jsonify({
+                            'success': True,
+                            'booked': True,
+                            'price': lowest_price,
+                            'pnr': pnr,
+                            'message': f'🎉 Flight booked successfully!\nPNR: {pnr}\nPrice: ${lowest_price:.2f}\nSaved: ${budget_request.max_budget - lowest_price:.2f}'
+                        })
                     
+                    except Exception as book_error:
+                        db.session.rollback()
+                        print(f"❌ Booking error: {book_error}")
+                        import traceback
+                        traceback.print_exc()
+                        # Undo 'price_found' (committed before booking) so the monitor keeps checking
+                        try:
+                            transition(db.session, request_id, previous_status,
+                                       from_statuses=('price_found',), owner=lease_owner)
+                        except Exception as e:
+                            db.session.rollback()
+                            print(f"⚠️ Could not restore request {request_id} to {previous_status}: {e}")
+                        return jsonify({
+                            'success': False,
+                            'message': f'Price found (${lowest_price:.2f}) but booking failed: {str(book_error)}'
+                        }), 500
+                else:
+                    # Price not in budget or alert-only mode
+                    db.session.commit()
                     return jsonify({
                         'success': True,
-                        'booked': True,
+                        'booked': False,
                         'price': lowest_price,
-                        'pnr': pnr,
-                        'message': f'🎉 Flight booked successfully!\nPNR: {pnr}\nPrice: ${lowest_price:.2f}\nSaved: ${budget_request.max_budget - lowest_price:.2f}'
+                        'in_budget': in_budget,
+                        'min_budget': budget_request.min_budget,
+                        'max_budget': budget_request.max_budget,
+                        'message': f'Found flights from ${lowest_price:.2f}. ' + 
+                                  ('✅ Price is within your budget!' if in_budget else '⏳ Price not in budget yet.')
                     })
-                    
-                except Exception as book_error:
-                    db.session.rollback()
-                    print(f"❌ Booking error: {book_error}")
-                    import traceback
-                    traceback.print_exc()
-                    return jsonify({
-                        'success': False,
-                        'message': f'Price found (${lowest_price:.2f}) but booking failed: {str(book_error)}'
-                    }), 500
-            else:
-                # Price not in budget or alert-only mode
-                db.session.commit()
-                return jsonify({
-                    'success': True,
-                    'booked': False,
-                    'price': lowest_price,
-                    'in_budget': in_budget,
-                    'min_budget': budget_request.min_budget,
-                    'max_budget': budget_request.max_budget,
-                    'message': f'Found flights from ${lowest_price:.2f}. ' + 
-                              ('✅ Price is within your budget!' if in_budget else '⏳ Price not in budget yet.')
-                })
             
-        except ResponseError as e:
-            return jsonify({
-                'success': False,
-                'message': f'Flight search error: {str(e)}'
-            }), 500
+            except ResponseError as e:
+                return jsonify({
+                    'success': False,
+                    'message': f'Flight search error: {str(e)}'
+                }), 500
+        finally:
+            try:
+                release_leases(db.session, [request_id], owner=lease_owner)
+            except Exception:
+                db.session.rollback()
             
     except Exception as e:
         db.session.rollback()
@@ -2926,11 +3184,28 @@ def save_passport():
 # =========================
 @app.cli.command('init-db')
 def init_db_command():
-    """Initialize the database tables and seed reference data."""
+    """Initialize the database tables and indexes and seed reference data."""
+    init_database()
+    print('Database initialized and seeded.')
+
+@app.cli.command('seed-reference')
+@click.option('--prune', is_flag=True, help='Delete rows that are no longer in the JSON files.')
+@click.option('--json-dir', default=REFERENCE_JSON_DIR, show_default=True)
+def seed_reference_command(prune, json_dir):
+    """Sync the airlines/airports tables and the reference snapshot with the JSON files."""
     with app.app_context():
-        db.create_all()
-        seed_airlines_airports(os.path.join(os.path.dirname(__file__), 'json-files'))
-        print('Database initialized and seeded.')
+        report = sync_reference_data(db.engine, json_dir, prune=prune)
+        print("Reference data synced:\n" + format_sync_report(report))
+    header = build_reference_snapshot(json_dir)
+    print(f"Reference snapshot {header['data_version']} written to {REFERENCE_SNAPSHOT_PATH}")
+
+@app.cli.command('prices-maintain')
+def prices_maintain_command():
+    """Roll up old price observations and apply the retention policy."""
+    with app.app_context():
+        result = maintain_price_history(db.session)
+        print(f"Rolled up {result['rolled_up']} raw price observations; "
+              f"removed {result['expired_rollups']} expired daily rollups.")
 
 @app.cli.command('clean-legacy')
 def clean_legacy_command():
@@ -2964,9 +3239,18 @@ def inject_active_requests():
     return dict(active_requests=active_requests)
 
 
+@app.context_processor
+def inject_airport_dataset():
+    """URL of the current airport dataset, loaded by static/js/airports.js."""
+    return dict(AIRPORTS_DATASET_URL=url_for('airport_dataset_version', version=airport_dataset.version))
+
+
 
 # =========================
 # Run App
 # =========================
+perf_metrics.set_gauge('startup.import_app_ms', round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1))
+
 if __name__ == '__main__':
+    init_database()  # the dev server creates/updates the schema itself
     app.run(debug=True)
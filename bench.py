@@ -0,0 +1,842 @@
+"""
+Performance Benchmarks
+======================
+Offline benchmarks for the search pipeline. They run on synthetic
+Amadeus-shaped payloads and never call the real API.
+
+Usage:
+    python bench.py offers                       # offer model: memory + CPU per search
+    python bench.py normalize [--payload FILE]   # parse-once timestamps/durations vs re-parsing
+    python bench.py search  [--requests N --concurrency C --routes R]
+                                                 # /search throughput against the synthetic provider
+    python bench.py monitor [--checks N --routes R]
+                                                 # Budget Buy monitor searches per second
+    python bench.py cycle   [--requests N --routes R]
+                                                 # one full monitor cycle over seeded requests
+    python bench.py prices  [--rows N]           # price history inserts, route queries, rollup
+    python bench.py db [--profiles P ...] [--readers R --writers W --seconds S]
+                                                 # engine profiles under mixed read/write load
+    python bench.py startup [--runs N]           # `import app` time and memory, lazy vs eager
+    python bench.py reference [--airports N]     # reference data: JSON parse vs prebuilt snapshot
+    python bench.py autocomplete [--sizes N ...] # airport autocomplete: linear scan vs index
+
+--payload takes a recorded Flight Offers Search response (the raw JSON body, or
+just its "data" list); without it a synthetic 4-cabin search is used.
+
+`search` and `monitor` import the app with FLIGHT_PROVIDER=synthetic (see
+flight_providers.py); --latency-ms and --error-rate shape the simulated upstream.
+Anonymous searches and monitor lookups do not write to the database.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from offer_model import merge_offers, parse_duration, parse_moment
+
+CABINS = ["ECONOMY", "PREMIUM_ECONOMY", "BUSINESS", "FIRST"]
+AIRLINES = {code: {"name": f"Airline {code}", "logo": f"/static/logos/{code}.png"}
+            for code in ("AA", "DL", "UA", "B6", "AS")}
+
+
+# =========================
+# Synthetic payloads
+# =========================
+def synthetic_offer(rng, offer_id, cabin, date="2026-11-20"):
+    """One raw flight offer shaped like an Amadeus Flight Offers Search result."""
+    n_segments = rng.choice((1, 1, 2, 2, 3))
+    hour = rng.randint(5, 20)
+    segments = []
+    airports = ["JFK"] + [rng.choice(("ORD", "DFW", "DEN", "ATL")) for _ in range(n_segments - 1)] + ["LAX"]
+    for i in range(n_segments):
+        segments.append({
+            "departure": {"iataCode": airports[i], "at": f"{date}T{hour + i * 2:02d}:{rng.choice((0, 15, 30, 45)):02d}:00"},
+            "arrival": {"iataCode": airports[i + 1], "at": f"{date}T{hour + i * 2 + 1:02d}:{rng.choice((5, 25, 50)):02d}:00"},
+            "duration": f"PT1H{rng.randint(5, 55)}M",
+            "carrierCode": "AA",
+            "number": str(rng.randint(100, 999)),
+        })
+    total = round(rng.uniform(90, 2400), 2)
+    return {
+        "id": str(offer_id),
+        "validatingAirlineCodes": [rng.choice(list(AIRLINES))],
+        "itineraries": [{"duration": f"PT{n_segments * 2}H{rng.randint(0, 59)}M", "segments": segments}],
+        "price": {"total": f"{total:.2f}", "currency": "USD"},
+        "travelerPricings": [{
+            "refundability": rng.choice(("REFUNDABLE", "NON_REFUNDABLE")),
+            "price": {"total": f"{total:.2f}", "base": f"{total * 0.82:.2f}", "currency": "USD"},
+            "fareDetailsBySegment": [
+                {"cabin": cabin, "fareBasis": "YLOW", "includedCheckedBags": {"quantity": 1}}
+                for _ in segments
+            ],
+        }],
+    }
+
+
+def synthetic_search(seed=7, per_cabin=50):
+    """Raw offers for one search: `per_cabin` offers from each of the 4 cabins."""
+    rng = random.Random(seed)
+    return [synthetic_offer(rng, i, cabin) for cabin in CABINS for i in range(per_cabin)]
+
+
+# =========================
+# Offer model benchmark
+# =========================
+def legacy_merge(raw_offers, searched_date, airlines):
+    """The previous dict-based normalization from build_flights(), kept as the baseline."""
+    merged_flights = {}
+    for flight in raw_offers:
+        flight_id = flight.get("id")
+        if not flight_id:
+            continue
+
+        if flight_id not in merged_flights:
+            validating_codes = flight.get("validatingAirlineCodes") or []
+            airline_code = validating_codes[0] if validating_codes else ""
+            airline_info = airlines.get(airline_code, {"name": airline_code or "Unknown", "logo": ""})
+
+            itineraries = flight.get("itineraries") or []
+            first_itin = itineraries[0] if itineraries else {}
+            segments = first_itin.get("segments", [])
+            if not segments:
+                continue
+
+            stops = len(segments) - 1
+            stops_text = "Non-stop" if stops == 0 else f"{stops} stop{'s' if stops > 1 else ''}"
+
+            segment_list = []
+            for seg in segments:
+                dep = seg.get("departure", {})
+                arr = seg.get("arrival", {})
+                seg_duration = seg.get("duration", "")
+                seg_duration = seg_duration[2:].replace("H", "h ").replace("M", "m") if seg_duration else ""
+                segment_list.append({
+                    "origin": dep.get("iataCode"),
+                    "destination": arr.get("iataCode"),
+                    "departure": dep.get("at"),
+                    "arrival": arr.get("at"),
+                    "duration": seg_duration
+                })
+
+            merged_flights[flight_id] = {
+                "offer_id": flight_id,
+                "airline_name": airline_info.get("name", ""),
+                "airline_logo": airline_info.get("logo", ""),
+                "origin": segments[0].get("departure", {}).get("iataCode", ""),
+                "destination": segments[-1].get("arrival", {}).get("iataCode", ""),
+                "departure": segments[0].get("departure", {}).get("at", ""),
+                "arrival": segments[-1].get("arrival", {}).get("at", ""),
+                "duration": first_itin.get("duration", "").replace("PT", "").replace("H", "h ").replace("M", "m"),
+                "stops_text": stops_text,
+                "segments": segment_list,
+                "fares_by_cabin": {},
+                "date": searched_date
+            }
+
+        for tp in flight.get("travelerPricings", []):
+            price_info = tp.get("price", {}) or {}
+            price_total = price_info.get("total", 0)
+            price_base = price_info.get("base")
+            currency = price_info.get("currency", "")
+            for fd in tp.get("fareDetailsBySegment", []):
+                cabin = fd.get("cabin", "ECONOMY")
+                bags_info = fd.get("includedCheckedBags", {}) or {}
+                fare = {
+                    "fare_type": fd.get("fareBasis", "Standard"),
+                    "price": float(price_total or 0),
+                    "base": float(price_base) if price_base is not None else None,
+                    "taxes": (float(price_total) - float(price_base)) if price_base is not None else None,
+                    "currency": currency,
+                    "seat": "Included" if fd.get("seat") else "Not included",
+                    "bags": {
+                        "quantity": bags_info.get("quantity", 0),
+                        "weight": bags_info.get("weight"),
+                        "type": bags_info.get("type")
+                    },
+                    "flexibility": "Refundable" if tp.get("refundability") == "REFUNDABLE" else "Non-refundable"
+                }
+                if cabin not in merged_flights[flight_id]["fares_by_cabin"]:
+                    merged_flights[flight_id]["fares_by_cabin"][cabin] = []
+                merged_flights[flight_id]["fares_by_cabin"][cabin].append(fare)
+
+    return list(merged_flights.values())
+
+
+def legacy_min_prices(flights):
+    """What search() did per request: walk every fare for the slider, the offer rows and the per-offer rows."""
+    slider = [fare["price"] for f in flights for fares in f["fares_by_cabin"].values() for fare in fares]
+    rows = []
+    for _pass in range(2):
+        for f in flights:
+            lowest = currency = None
+            for fares in f["fares_by_cabin"].values():
+                for fare in fares:
+                    if lowest is None or fare["price"] < lowest:
+                        lowest, currency = fare["price"], fare["currency"]
+            rows.append((lowest, currency))
+    return min(slider), rows
+
+
+def model_min_prices(offers):
+    slider = [o.min_price for o in offers]
+    rows = [(o.min_price, o.currency) for _pass in range(2) for o in offers]
+    return min(slider), rows
+
+
+def retained_bytes(build):
+    """Bytes still allocated after build() returns (its result is kept alive)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def best_of(fn, repeat, number=20):
+    """Best average seconds per call over `repeat` rounds of `number` calls."""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+
+def load_payload(path):
+    """Raw offers from a recorded API response file."""
+    with open(path, encoding="utf-8") as fh:
+        payload = json.load(fh)
+    return payload.get("data", []) if isinstance(payload, dict) else payload
+
+
+def bench_offers(args):
+    raw = synthetic_search(per_cabin=args.per_cabin)
+    print(f"📦 {len(raw)} raw offers ({args.per_cabin} per cabin × {len(CABINS)} cabins)")
+
+    dict_bytes, flights = retained_bytes(lambda: legacy_merge(raw, "2026-11-20", AIRLINES))
+    model_bytes, offers = retained_bytes(lambda: merge_offers(raw, "2026-11-20", AIRLINES))
+    assert legacy_min_prices(flights)[0] == model_min_prices(offers)[0]
+
+    t_dict = best_of(lambda: legacy_min_prices(legacy_merge(raw, "2026-11-20", AIRLINES)), args.repeat)
+    t_model = best_of(lambda: model_min_prices(merge_offers(raw, "2026-11-20", AIRLINES)), args.repeat)
+
+    print(f"{'':24}{'dicts':>12}{'offer model':>14}")
+    print(f"{'retained memory (KiB)':24}{dict_bytes / 1024:>12.1f}{model_bytes / 1024:>14.1f}")
+    print(f"{'normalize + prices (ms)':24}{t_dict * 1000:>12.2f}{t_model * 1000:>14.2f}")
+    print(f"✅ per search: memory {(model_bytes / dict_bytes - 1) * 100:+.0f}%, cpu {(t_model / t_dict - 1) * 100:+.0f}%")
+
+
+# =========================
+# Normalization benchmark
+# =========================
+def legacy_time12(iso_str):
+    try:
+        dt = datetime.fromisoformat(iso_str)
+        return f"{dt.hour % 12 or 12:02d}:{dt.minute:02d} {'AM' if dt.hour < 12 else 'PM'}"
+    except Exception:
+        return ''
+
+
+def legacy_date_compact(iso_str):
+    try:
+        dt = datetime.fromisoformat(iso_str)
+        return f"{dt.strftime('%a').lower()}, {dt.day}, {dt.year}"
+    except Exception:
+        return ''
+
+
+def legacy_duration_minutes(text):
+    h = re.search(r"(\d+)h", text or "")
+    m = re.search(r"(\d+)m", text or "")
+    return (int(h.group(1)) * 60 if h else 0) + (int(m.group(1)) if m else 0) or None
+
+
+def legacy_downstream(flights):
+    """The parsing search() persistence, the summary filters and confirmation used to repeat."""
+    out = []
+    for f in flights:
+        dep = datetime.fromisoformat(f["departure"].replace("Z", ""))
+        arr = datetime.fromisoformat(f["arrival"].replace("Z", ""))
+        day = datetime.fromisoformat(f["departure"].replace("Z", "")).replace(hour=0, minute=0, second=0)
+        out.append((dep, arr, day, legacy_duration_minutes(f["duration"]),
+                    legacy_time12(f["departure"]), legacy_date_compact(f["departure"])))
+        for seg in f["segments"]:
+            out.append((legacy_time12(seg["departure"]), legacy_date_compact(seg["departure"]),
+                        legacy_time12(seg["arrival"])))
+    return out
+
+
+def model_downstream(offers):
+    out = []
+    for o in offers:
+        out.append((o.departs.at, o.arrives.at, o.departs.at.replace(hour=0, minute=0, second=0),
+                    o.duration_minutes, o.departs.time12, o.departs.date_compact))
+        for seg in o.segments:
+            out.append((seg.departs.time12, seg.departs.date_compact, seg.arrives.time12))
+    return out
+
+
+def cold_model_pipeline(raw):
+    """merge_offers() + downstream reads with empty parse caches (a worst case)."""
+    parse_moment.cache_clear()
+    parse_duration.cache_clear()
+    return model_downstream(merge_offers(raw, "2026-11-20", AIRLINES))
+
+
+def bench_normalize(args):
+    raw = load_payload(args.payload) if args.payload else synthetic_search()
+    source = args.payload or "synthetic search"
+    print(f"📦 {len(raw)} raw offers from {source}")
+
+    legacy = legacy_downstream(legacy_merge(raw, "2026-11-20", AIRLINES))
+    model = cold_model_pipeline(raw)
+    assert [row[:2] for row in legacy] == [row[:2] for row in model], "pipelines disagree"
+
+    t_legacy = best_of(lambda: legacy_downstream(legacy_merge(raw, "2026-11-20", AIRLINES)), args.repeat)
+    t_cold = best_of(lambda: cold_model_pipeline(raw), args.repeat)
+    t_warm = best_of(lambda: model_downstream(merge_offers(raw, "2026-11-20", AIRLINES)), args.repeat)
+
+    print(f"{'re-parse downstream (ms)':30}{t_legacy * 1000:>8.2f}")
+    print(f"{'parse once, cold cache (ms)':30}{t_cold * 1000:>8.2f}  ({(t_cold / t_legacy - 1) * 100:+.0f}%)")
+    print(f"{'parse once, warm cache (ms)':30}{t_warm * 1000:>8.2f}  ({(t_warm / t_legacy - 1) * 100:+.0f}%)")
+
+
+# =========================
+# Offline load benchmarks (synthetic provider)
+# =========================
+ROUTES = [("JFK", "LAX"), ("ORD", "MIA"), ("ATL", "SEA"), ("BOS", "SFO"), ("DFW", "LAS"),
+          ("LHR", "CDG"), ("DXB", "BOM"), ("SIN", "HKG"), ("YYZ", "YVR"), ("MAD", "FCO")]
+
+
+def load_synthetic_app(args):
+    """Import the app with the synthetic provider configured from the command line."""
+    os.environ["FLIGHT_PROVIDER"] = "synthetic"
+    os.environ["SYNTHETIC_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["SYNTHETIC_ERROR_RATE"] = str(args.error_rate)
+    # The Amadeus client is never built (it is created on first use)
+    os.environ.setdefault("AMADEUS_CLIENT_ID", "offline")
+    os.environ.setdefault("AMADEUS_CLIENT_SECRET", "offline")
+    import app as flight_app
+    return flight_app
+
+
+def workload(count, n_routes):
+    """`count` (origin, destination, date) lookups spread over `n_routes` route/dates."""
+    first_day = datetime.now() + timedelta(days=14)
+    keys = []
+    for i in range(n_routes):
+        origin, destination = ROUTES[i % len(ROUTES)]
+        keys.append((origin, destination, (first_day + timedelta(days=i // len(ROUTES))).strftime("%Y-%m-%d")))
+    return [keys[i % len(keys)] for i in range(count)]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def print_load_report(label, latencies, elapsed, upstream_calls):
+    print(f"{label}: {len(latencies)} in {elapsed:.2f}s → {len(latencies) / elapsed:.1f}/s")
+    print(f"  latency p50 {percentile(latencies, 50) * 1000:.0f} ms, "
+          f"p95 {percentile(latencies, 95) * 1000:.0f} ms, max {max(latencies) * 1000:.0f} ms")
+    print(f"  upstream search calls: {upstream_calls}")
+
+
+def bench_search(args):
+    flight_app = load_synthetic_app(args)
+    import perf_metrics
+    perf_metrics.reset()
+    lookups = workload(args.requests, args.routes)
+
+    def one(lookup):
+        origin, destination, date = lookup
+        started = time.perf_counter()
+        response = flight_app.app.test_client().get(
+            "/search", query_string={"origin": origin, "destination": destination, "date": date})
+        assert response.status_code == 200, response.status_code
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = list(pool.map(one, lookups))
+    elapsed = time.perf_counter() - started
+
+    counters = perf_metrics.snapshot()["counters"]
+    print(f"🔎 /search × {args.requests}, {args.concurrency} concurrent, {args.routes} distinct route/dates, "
+          f"synthetic latency {args.latency_ms:.0f} ms")
+    print_load_report("requests", latencies, elapsed, counters.get("provider.synthetic.search_offers", 0))
+    print(f"  synthetic errors: {counters.get('provider.synthetic.errors', 0)}")
+
+
+def bench_monitor(args):
+    load_synthetic_app(args)
+    import budget_monitor
+    import perf_metrics
+    perf_metrics.reset()
+    lookups = workload(args.checks, args.routes)
+
+    latencies = []
+    started = time.perf_counter()
+    with budget_monitor.app.app_context():
+        for origin, destination, date in lookups:
+            t0 = time.perf_counter()
+            budget_monitor.search_flights(origin, destination, date)
+            latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    counters = perf_metrics.snapshot()["counters"]
+    print(f"💰 Budget Buy monitor × {args.checks} checks, {args.routes} distinct route/dates, "
+          f"synthetic latency {args.latency_ms:.0f} ms")
+    print_load_report("checks", latencies, elapsed, counters.get("provider.synthetic.search_offers", 0))
+
+
+def bench_cycle(args):
+    """One full monitor_prices() cycle over seeded Budget Buy requests in a scratch database."""
+    import tempfile
+    from werkzeug.security import generate_password_hash
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-cycle-"), "flight.db")
+    os.environ["MONITOR_WORKERS"] = str(args.workers)
+    os.environ["MONITOR_RATE_PER_SECOND"] = str(args.rate)
+    flight_app = load_synthetic_app(args)
+    import budget_monitor
+    import perf_metrics
+    from models import db, User, BudgetBuyRequest
+
+    rng = random.Random(21)
+    with flight_app.app.app_context():
+        db.create_all()
+        users = [User(name=f"user{u}", email=f"user{u}@example.com", password_hash=generate_password_hash("x"))
+                 for u in range(args.users)]
+        db.session.add_all(users)
+        db.session.flush()
+        for origin, destination, date in workload(args.requests, args.routes):
+            db.session.add(BudgetBuyRequest(
+                user_id=rng.choice(users).user_id, origin=origin, destination=destination,
+                departure_date=datetime.strptime(date, "%Y-%m-%d"),
+                min_budget=0, max_budget=1.0,  # never matches: every request stays active
+                mode="alert_only", status="pending"))
+        db.session.commit()
+
+    perf_metrics.reset()
+    started = time.perf_counter()
+    stats = budget_monitor.monitor_prices()
+    elapsed = time.perf_counter() - started
+    upstream = perf_metrics.snapshot()["counters"].get("provider.synthetic.search_offers", 0)
+    print(f"🔁 monitor cycle: {stats['requests']} requests over {args.routes} route/dates, "
+          f"synthetic latency {args.latency_ms:.0f} ms, {args.workers} workers, {args.rate:g} calls/s")
+    print(f"  {elapsed:.2f}s, {stats['searches']} group searches, {upstream} upstream calls, "
+          f"{stats['calls_saved']} calls saved, peak {stats['peak_in_flight']} in flight, "
+          f"{stats['throttle_waits']} throttled")
+
+
+# =========================
+# Price history benchmark
+# =========================
+def bench_prices(args):
+    import tempfile
+    from sqlalchemy import create_engine
+    import price_history
+    from models import PriceObservation, PriceObservationDaily
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-prices-"), "prices.db")
+    engine = create_engine(f"sqlite:///{path}")
+    PriceObservation.metadata.create_all(
+        engine, tables=[PriceObservation.__table__, PriceObservationDaily.__table__])
+
+    rng = random.Random(11)
+    routes = [(o, d) for o, d in ROUTES] + [(d, o) for o, d in ROUTES]
+    now = datetime.utcnow().replace(microsecond=0)
+    first_day = now.date()
+
+    def batch(size):
+        return [{
+            "origin": route[0], "destination": route[1],
+            "departure_day": first_day + timedelta(days=rng.randrange(330)),
+            "carrier": rng.choice(("AA", "DL", "UA", "BA", "AF", "LH")),
+            "cabin": rng.choice(CABINS),
+            "currency": "USD",
+            "price_cents": rng.randint(9000, 250000),
+            "observed_at": now - timedelta(minutes=rng.randrange(60 * 24 * 60)),
+        } for route in (rng.choice(routes) for _ in range(size))]
+
+    with engine.connect() as conn:
+        inserted, insert_time = 0, 0.0
+        while inserted < args.rows:
+            rows = batch(min(args.batch, args.rows - inserted))
+            started = time.perf_counter()
+            price_history.insert_observations(conn, rows)
+            conn.commit()
+            insert_time += time.perf_counter() - started
+            inserted += len(rows)
+        print(f"📈 {inserted} observations inserted in {insert_time:.2f}s "
+              f"({inserted / insert_time:,.0f} rows/s, batches of {args.batch})")
+
+        latencies = []
+        for _ in range(args.queries):
+            origin, destination = rng.choice(routes)
+            start_day = first_day + timedelta(days=rng.randrange(300))
+            started = time.perf_counter()
+            price_history.cheapest_by_day(conn, origin, destination, start_day, start_day + timedelta(days=30))
+            latencies.append(time.perf_counter() - started)
+        print(f"  31-day route query: p50 {percentile(latencies, 50) * 1000:.2f} ms, "
+              f"p95 {percentile(latencies, 95) * 1000:.2f} ms")
+
+        started = time.perf_counter()
+        result = price_history.maintain(conn, now=now)
+        print(f"  maintain: rolled up {result['rolled_up']} raw rows in {time.perf_counter() - started:.2f}s")
+    print(f"  database size: {os.path.getsize(path) / 1024 / 1024:.1f} MiB ({path})")
+
+
+# =========================
+# Database profile benchmark
+# =========================
+def bench_db(args):
+    import tempfile
+    import threading
+    from sqlalchemy import insert, text
+    from sqlalchemy.exc import OperationalError
+    import db_profiles
+    from models import db, User, Search, FlightOffer
+
+    tables = [User.__table__, Search.__table__, FlightOffer.__table__]
+    print(f"🗄️ {args.readers} readers + {args.writers} writers for {args.seconds:.0f}s per profile")
+    print(f"{'profile':22}{'reads/s':>10}{'writes/s':>10}{'read p95':>11}{'write p95':>11}{'locked':>8}")
+
+    for name in args.profiles:
+        if name == "production-server-db":
+            url = os.getenv("DATABASE_URL")
+            if not url:
+                print(f"{name:22}  skipped (set DATABASE_URL)")
+                continue
+        else:
+            url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-db-"), "flight.db")
+        engine = db_profiles.create_profile_engine(name, url)
+        db.metadata.drop_all(engine, tables=tables)
+        db.metadata.create_all(engine, tables=tables)
+
+        rng = random.Random(5)
+        now = datetime.utcnow()
+        with engine.begin() as conn:
+            conn.execute(insert(User.__table__), [
+                {"user_id": u, "name": f"user{u}", "email": f"user{u}@example.com", "password_hash": "x",
+                 "created_at": now}
+                for u in range(1, 201)])
+            conn.execute(insert(Search.__table__), [
+                {"user_id": rng.randint(1, 200), "origin": o, "destination": d,
+                 "departure_date": now + timedelta(days=rng.randrange(90)), "created_at": now}
+                for o, d in (rng.choice(ROUTES) for _ in range(args.seed_rows))])
+
+        stop = threading.Event()
+        results = {"read": [], "write": [], "locked": 0}
+        lock = threading.Lock()
+
+        def reader(seed):
+            local = random.Random(seed)
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    with engine.connect() as conn:
+                        conn.execute(text(
+                            "SELECT search_id, origin, destination, departure_date FROM Search "
+                            "WHERE user_id = :u ORDER BY created_at DESC LIMIT 20"), {"u": local.randint(1, 200)}).all()
+                        conn.execute(text("SELECT COUNT(*) FROM FlightOffer")).scalar()
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        results["read"].append(elapsed)
+                except OperationalError:
+                    with lock:
+                        results["locked"] += 1
+
+        def writer(seed):
+            local = random.Random(seed)
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    with engine.begin() as conn:
+                        origin, destination = local.choice(ROUTES)
+                        search_id = conn.execute(insert(Search.__table__).values(
+                            user_id=local.randint(1, 200), origin=origin, destination=destination,
+                            departure_date=now, created_at=datetime.utcnow())).inserted_primary_key[0]
+                        conn.execute(insert(FlightOffer.__table__), [
+                            {"search_id": search_id, "offer_id": str(i), "origin": origin,
+                             "destination": destination, "lowest_price": 100.0 + i, "created_at": now}
+                            for i in range(20)])
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        results["write"].append(elapsed)
+                except OperationalError:
+                    with lock:
+                        results["locked"] += 1
+
+        threads = ([threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+                   + [threading.Thread(target=writer, args=(100 + i,)) for i in range(args.writers)])
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+        reads, writes = results["read"], results["write"]
+        print(f"{name:22}{len(reads) / args.seconds:>10.0f}{len(writes) / args.seconds:>10.0f}"
+              f"{percentile(reads, 95) * 1000 if reads else 0:>9.1f}ms"
+              f"{percentile(writes, 95) * 1000 if writes else 0:>9.1f}ms{results['locked']:>8}")
+
+
+# =========================
+# Startup benchmark
+# =========================
+_STARTUP_PROBE = """
+import resource, time
+started = time.perf_counter()
+import app
+elapsed = (time.perf_counter() - started) * 1000
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def bench_startup(args):
+    import subprocess
+    import sys
+    import tempfile
+
+    # Eager mode creates/seeds the schema on import: point it at a scratch database
+    scratch_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-startup-"), "flight.db")
+    print(f"🚀 `import app` in a fresh interpreter, {args.runs} runs per mode (after one warm-up run)")
+    print(f"{'mode':8}{'median':>10}{'min':>10}{'max':>10}{'max RSS':>12}")
+    for mode in args.modes:
+        env = dict(os.environ, APP_INIT_MODE=mode)
+        env.setdefault("DATABASE_URL", scratch_url)
+        env.setdefault("AMADEUS_CLIENT_ID", "bench")
+        env.setdefault("AMADEUS_CLIENT_SECRET", "bench")
+        times, rss = [], []
+        for run in range(args.runs + 1):
+            out = subprocess.run([sys.executable, "-c", _STARTUP_PROBE], env=env, capture_output=True,
+                                 text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            elapsed, max_rss = out.stdout.strip().splitlines()[-1].split()
+            if run == 0:
+                continue
+            times.append(float(elapsed))
+            rss.append(int(max_rss) / 1024)  # KiB -> MiB
+        print(f"{mode:8}{percentile(times, 50):>8.0f}ms{min(times):>8.0f}ms{max(times):>8.0f}ms"
+              f"{max(rss):>10.1f}MiB")
+
+
+# =========================
+# Reference data benchmarks
+# =========================
+_SYLLABLES = ["san", "lo", "ma", "ri", "ber", "ton", "new", "port", "ka", "vel", "do", "mi",
+              "ran", "sta", "lin", "gor", "a", "el", "mon", "tre", "al", "bu", "char", "les"]
+
+
+def synthetic_airports_json(count, seed=11):
+    """airports.json-shaped dict (ICAO-keyed, about 25% without an IATA code)."""
+    rng = random.Random(seed)
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+    def word():
+        return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+    airports = {}
+    for _ in range(count):
+        icao = "".join(rng.choice(letters) for _ in range(4))
+        city = word() if rng.random() < 0.7 else f"{word()} {word()}"
+        airports[icao] = {
+            "icao": icao, "iata": "".join(rng.choice(letters) for _ in range(3)) if rng.random() < 0.75 else "",
+            "name": f"{word()} {rng.choice(['International Airport', 'Airport', 'Regional Airport', 'Airfield'])}",
+            "city": city, "state": "State",
+            "country": rng.choice(["US", "GB", "FR", "DE", "BR", "IN"]), "elevation": rng.randrange(3000),
+            "lat": rng.uniform(-60, 70), "lon": rng.uniform(-180, 180), "tz": "UTC",
+        }
+    return airports
+
+
+def legacy_airport_search(airports, keyword, limit=20):
+    """The pre-index /api/airports/search local loop: substring scan in dict order."""
+    q = keyword.lower()
+    matches = []
+    for iata, info in airports.items():
+        city = (info.get('city') or '').strip()
+        name = (info.get('name') or '').strip()
+        if q in iata.lower() or (city and q in city.lower()) or (name and q in name.lower()):
+            matches.append(iata)
+        if len(matches) >= limit:
+            break
+    return matches
+
+
+def bench_autocomplete(args):
+    from airport_index import AirportIndex
+    from reference_snapshot import parse_reference_json
+
+    print(f"🔤 airport autocomplete, {args.queries} queries of 2-4 characters per dataset size")
+    print(f"{'airports':>9}{'build':>9}{'scan p50':>11}{'scan p95':>11}{'index p50':>11}{'index p95':>11}")
+    for size in args.sizes:
+        import tempfile
+        json_dir = tempfile.mkdtemp(prefix="bench-autocomplete-")
+        with open(os.path.join(json_dir, "airports.json"), "w", encoding="utf-8") as f:
+            json.dump(synthetic_airports_json(size), f)
+        _, airports = parse_reference_json(json_dir)
+        rng = random.Random(3)
+        popularity = {code: rng.randrange(500) for code in rng.sample(sorted(airports), min(300, len(airports)))}
+
+        started = time.perf_counter()
+        index = AirportIndex(airports, popularity)
+        build = time.perf_counter() - started
+
+        # Typical keystrokes: prefixes of city names and of codes, plus some misses
+        cities = [info["city"] for info in airports.values()]
+        queries = []
+        for _ in range(args.queries):
+            roll = rng.random()
+            if roll < 0.7:
+                queries.append(rng.choice(cities)[:rng.randint(2, 4)])
+            elif roll < 0.9:
+                queries.append(rng.choice(sorted(airports))[:rng.randint(2, 3)].lower())
+            else:
+                queries.append("".join(rng.choice("xqzj") for _ in range(rng.randint(2, 4))))
+
+        def measure(fn):
+            timings = []
+            for q in queries:
+                t = time.perf_counter()
+                fn(q)
+                timings.append(time.perf_counter() - t)
+            return percentile(timings, 50) * 1e6, percentile(timings, 95) * 1e6
+
+        scan = measure(lambda q: legacy_airport_search(airports, q))
+        indexed = measure(lambda q: index.search(q))
+        print(f"{len(airports):>9}{build * 1000:>7.0f}ms{scan[0]:>9.0f}us{scan[1]:>9.0f}us"
+              f"{indexed[0]:>9.0f}us{indexed[1]:>9.0f}us")
+_REFERENCE_PROBE = """
+import os, sys, time
+import reference_snapshot as rs
+
+def rss_kib():  # current resident set; ru_maxrss is inherited from the parent across fork/exec
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+before = rss_kib()
+started = time.perf_counter()
+if sys.argv[1] == "snapshot":
+    airlines, airports, _ = rs.load_snapshot(sys.argv[3], sys.argv[2])
+else:
+    airlines, airports = rs.parse_reference_json(sys.argv[2])
+elapsed = (time.perf_counter() - started) * 1000
+print(elapsed, rss_kib() - before, len(airports))
+"""
+
+
+def bench_reference(args):
+    import shutil
+    import subprocess
+    import sys
+    import tempfile
+    import reference_snapshot
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    json_dir = tempfile.mkdtemp(prefix="bench-reference-")
+    shutil.copy(os.path.join(here, "json-files", "airlines.json"), json_dir)
+    real_airports = os.path.join(here, "json-files", "airports.json")
+    if os.path.exists(real_airports) and not args.airports:
+        shutil.copy(real_airports, json_dir)
+    else:
+        with open(os.path.join(json_dir, "airports.json"), "w", encoding="utf-8") as f:
+            json.dump(synthetic_airports_json(args.airports or 29000), f)
+    snapshot = os.path.join(json_dir, "reference.snap")
+    reference_snapshot.build_snapshot(json_dir, snapshot)
+
+    json_bytes = sum(os.path.getsize(os.path.join(json_dir, name)) for name in reference_snapshot.SOURCES)
+    print(f"📦 sources {json_bytes / 1024:.0f} KiB, snapshot {os.path.getsize(snapshot) / 1024:.0f} KiB "
+          f"({args.runs} fresh interpreters per source)")
+    print(f"{'source':10}{'median':>10}{'min':>10}{'RSS growth':>13}{'airports':>10}")
+    for source in ("json", "snapshot"):
+        times, rss = [], []
+        for _ in range(args.runs):
+            out = subprocess.run([sys.executable, "-c", _REFERENCE_PROBE, source, json_dir, snapshot],
+                                 capture_output=True, text=True, check=True, cwd=here)
+            elapsed, grown, count = out.stdout.split()
+            times.append(float(elapsed))
+            rss.append(int(grown) / 1024)
+        print(f"{source:10}{percentile(times, 50):>8.1f}ms{min(times):>8.1f}ms"
+              f"{percentile(rss, 50):>10.1f}MiB{count:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("offers", help="offer model memory/CPU per search")
+    p.add_argument("--per-cabin", type=int, default=50)
+    p.add_argument("--repeat", type=int, default=7)
+    p.set_defaults(func=bench_offers)
+
+    p = sub.add_parser("normalize", help="timestamp/duration parsing per search")
+    p.add_argument("--payload", help="recorded Flight Offers Search response (JSON)")
+    p.add_argument("--repeat", type=int, default=7)
+    p.set_defaults(func=bench_normalize)
+
+    p = sub.add_parser("search", help="/search throughput with the synthetic provider")
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--routes", type=int, default=20)
+    p.add_argument("--latency-ms", type=float, default=250)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.set_defaults(func=bench_search)
+
+    p = sub.add_parser("monitor", help="Budget Buy monitor checks with the synthetic provider")
+    p.add_argument("--checks", type=int, default=100)
+    p.add_argument("--routes", type=int, default=20)
+    p.add_argument("--latency-ms", type=float, default=250)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.set_defaults(func=bench_monitor)
+
+    p = sub.add_parser("cycle", help="one Budget Buy monitor cycle over seeded requests")
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--routes", type=int, default=20)
+    p.add_argument("--users", type=int, default=50)
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--rate", type=float, default=5.0, help="upstream calls per second")
+    p.add_argument("--latency-ms", type=float, default=250)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.set_defaults(func=bench_cycle)
+
+    p = sub.add_parser("prices", help="price history write/query/rollup throughput")
+    p.add_argument("--rows", type=int, default=500_000)
+    p.add_argument("--batch", type=int, default=5_000)
+    p.add_argument("--queries", type=int, default=200)
+    p.set_defaults(func=bench_prices)
+
+    p = sub.add_parser("db", help="database engine profiles under concurrent reads/writes")
+    p.add_argument("--profiles", nargs="+", default=["dev", "production-sqlite", "production-server-db"])
+    p.add_argument("--readers", type=int, default=8)
+    p.add_argument("--writers", type=int, default=2)
+    p.add_argument("--seconds", type=float, default=5)
+    p.add_argument("--seed-rows", type=int, default=20_000)
+    p.set_defaults(func=bench_db)
+
+    p = sub.add_parser("startup", help="app import time, lazy vs eager initialization")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--modes", nargs="+", default=["lazy", "eager"])
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("reference", help="reference data load: JSON vs snapshot")
+    p.add_argument("--airports", type=int, default=0, help="synthetic airport count (default: real file or 29000)")
+    p.add_argument("--runs", type=int, default=5)
+    p.set_defaults(func=bench_reference)
+
+    p = sub.add_parser("autocomplete", help="airport autocomplete: scan vs index")
+    p.add_argument("--sizes", type=int, nargs="+", default=[2000, 10000, 40000])
+    p.add_argument("--queries", type=int, default=2000)
+    p.set_defaults(func=bench_autocomplete)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
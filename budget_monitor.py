@@ -9,6 +9,48 @@ This script should be run as a separate process or scheduled task:
 - Or scheduled with cron/Task Scheduler to run every hour
 - Or integrated with Celery/RQ for proper background task management
 
+Each cycle groups the active requests by search (route, departure day,
+passengers) and runs one upstream search per group. Every member is then
+evaluated against the shared offers, so fifty users watching JFK → LAX on
+the same day cost one call instead of fifty.
+
+Only due requests are checked: check_scheduler.py sets a next_check_at per
+request after every check (sooner close to departure, when the price is
+near the budget or the route is volatile), and a cycle serves due requests
+earliest-first from the (status, next_check_at) index, so when the quota is
+tight the most overdue groups are searched first. In --continuous mode the
+monitor sleeps until the next request is due. Requests whose departure day
+is over are marked 'expired' without a search.
+
+Several monitors can run at once (on one or many hosts): each cycle leases
+the due requests it will check (monitor_leases.py), so no request is
+searched or booked by two processes, and requests left behind by a crashed
+process are picked up again once their lease expires.
+
+Preferences are part of the search: non-stop and airline go upstream
+(nonStop, includedAirlineCodes) and are part of the group key, and the rest
+(stop count, departure time window) is applied to the shared offers by a
+compiled predicate per request (offer_filter.py), so each request is
+compared with the cheapest offer it would actually accept.
+
+Groups are processed concurrently by a pool of MONITOR_WORKERS threads, each
+in its own application context (and database session). Upstream calls take
+a token from a bucket sized to the Amadeus quota instead of sleeping a fixed
+time, so a cycle runs as fast as the quota allows; cached searches cost no
+token.
+
+Settings (environment):
+- MONITOR_WORKERS            concurrent search groups (default 8)
+- MONITOR_RATE_PER_SECOND    upstream calls per second (default 5)
+- MONITOR_RATE_BURST         calls allowed back to back before throttling (default 5)
+- MONITOR_MIN_CHECK_MINUTES / MONITOR_MAX_CHECK_HOURS   see check_scheduler.py
+- MONITOR_WORKER_ID / MONITOR_LEASE_SECONDS / MONITOR_CLAIM_BATCH   see monitor_leases.py
+
+Metrics (perf_metrics): monitor.cycle (timing), monitor.cycle_seconds,
+monitor.in_flight / monitor.peak_in_flight / monitor.due_requests (gauges),
+monitor.leases_lost / monitor.expired (counters) and the token bucket's
+monitor.upstream.throttle_waits / .throttle_wait.
+
 Author: Group 5
 Date: 2025
 """
@@ -17,6 +59,8 @@ import os
 import sys
 import time
 import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
@@ -25,9 +69,16 @@ from dotenv import load_dotenv
 # Add parent directory to path to import app modules
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import app, db, amadeus
+from app import app, db, ensure_schema, flight_provider
 from models import BudgetBuyRequest, Passport, User, Flight, Ticket
 from amadeus import ResponseError
+from flight_providers import RateLimitedProvider
+from offer_cache import search_flight_offers
+from rate_limiter import TokenBucket
+from check_scheduler import departed, next_check_values, route_volatility
+from offer_filter import booking_details, cheapest_offer, request_filter, request_search_params
+from monitor_leases import ACTIVE_STATUSES, WORKER_ID, claim_due, release, renew, transition
+import perf_metrics
 
 # Load environment variables
 load_dotenv()
@@ -39,6 +90,14 @@ SMTP_USER = os.getenv('SMTP_USER', '')
 SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', '')
 FROM_EMAIL = os.getenv('FROM_EMAIL', 'noreply@skyvela.com')
 
+# Concurrency and upstream quota
+MONITOR_WORKERS = int(os.getenv('MONITOR_WORKERS', 8))
+MONITOR_RATE_PER_SECOND = float(os.getenv('MONITOR_RATE_PER_SECOND', 5))
+MONITOR_RATE_BURST = float(os.getenv('MONITOR_RATE_BURST', 5))
+
+upstream_bucket = TokenBucket(MONITOR_RATE_PER_SECOND, MONITOR_RATE_BURST, name='monitor.upstream')
+monitor_provider = RateLimitedProvider(flight_provider, upstream_bucket)
+
 
 def send_email(to_email, subject, html_content):
     """Send email notification to user."""
@@ -67,24 +126,23 @@ def send_email(to_email, subject, html_content):
         return False
 
 
-def search_flights(origin, destination, departure_date):
-    """Search for flights using Amadeus API."""
+def search_flights(origin, destination, departure_date, adults=1, non_stop=False, included_airlines=None,
+                   max_results=10):
+    """Search for flights through the configured flight provider (and the shared offer cache)."""
     try:
         date_str = departure_date.strftime('%Y-%m-%d') if isinstance(departure_date, datetime) else departure_date
         
-        print(f"🔎 Searching: {origin} → {destination} on {date_str}")
+        constraints = ''.join([' non-stop' if non_stop else '',
+                               f' on {included_airlines}' if included_airlines else ''])
+        print(f"🔎 Searching: {origin} → {destination} on {date_str}{constraints}")
         
-        response = amadeus.shopping.flight_offers_search.get(
-            originLocationCode=origin,
-            destinationLocationCode=destination,
-            departureDate=date_str,
-            adults=1,
-            max=10
-        )
+        offers = search_flight_offers(monitor_provider, origin, destination, date_str, adults=adults,
+                                      max_results=max_results, non_stop=non_stop,
+                                      included_airlines=included_airlines)
         
-        if hasattr(response, 'data') and response.data:
-            print(f"  → Found {len(response.data)} offers")
-            return response.data
+        if offers:
+            print(f"  → Found {len(offers)} offers")
+            return offers
         else:
             print(f"  → No offers found")
             return []
@@ -96,21 +154,9 @@ def search_flights(origin, destination, departure_date):
         return []
 
 
-def get_lowest_price(flight_offers):
-    """Extract lowest price from flight offers."""
-    if not flight_offers:
-        return None
-    
-    lowest = None
-    for offer in flight_offers:
-        try:
-            price = float(offer.get('price', {}).get('total', 0))
-            if price > 0 and (lowest is None or price < lowest):
-                lowest = price
-        except Exception:
-            continue
-    
-    return lowest
+def get_lowest_price(flight_offers, predicate=None):
+    """Extract lowest price from flight offers (only those accepted by `predicate`, if given)."""
+    return cheapest_offer(flight_offers, predicate)[0]
 
 
 def process_auto_book(request, user, lowest_price, flight_offer):
@@ -120,26 +166,26 @@ def process_auto_book(request, user, lowest_price, flight_offer):
         passport = Passport.query.filter_by(user_id=user.user_id).first()
         if not passport:
             print(f"⚠️ Request {request.request_id}: No passport info for auto-booking")
-            request.status = 'price_found'
-            db.session.commit()
             
-            # Send alert instead
+            # Send alert instead (the request stays in 'price_found')
             send_price_alert(request, user, lowest_price)
             return
         
         print(f"🚀 Auto-booking for request {request.request_id}")
         
         # In production, you would call Amadeus booking API here
-        # For now, we'll simulate the booking
+        # For now, we'll simulate the booking of the matched offer
+        details = booking_details(flight_offer)
+        currency = details['currency'] or request.currency or 'USD'
         
         # Create flight record
         flight = Flight(
-            flight_number=None,
+            flight_number=details['flight_number'],
             departure_airport=request.origin,
             arrival_airport=request.destination,
-            departure_time=request.departure_date,
-            arrival_time=None,
-            duration=None
+            departure_time=details['departure_time'] or request.departure_date,
+            arrival_time=details['arrival_time'],
+            duration=details['duration']
         )
         db.session.add(flight)
         db.session.flush()
@@ -149,33 +195,40 @@ def process_auto_book(request, user, lowest_price, flight_offer):
             flight_id=flight.flight_id,
             search_id=None,
             price=lowest_price,
-            currency='USD',
+            currency=currency,
             fare_class='ECONOMY',
             Ticket_bought=True
         )
         db.session.add(ticket)
         db.session.flush()
         
-        # Update request
-        request.status = 'booked'
-        request.booked_ticket_id = ticket.ticket_id
-        request.booked_price = lowest_price
-        request.booking_confirmation = f"BB{request.request_id:06d}"
-        request.completed_at = datetime.utcnow()
-        
+        # Mark the request booked in the same transaction as its ticket, only
+        # while this worker still holds the lease on the 'price_found' request
+        booked = transition(
+            db.session, request.request_id, 'booked', from_statuses=('price_found',), commit=False,
+            booked_ticket_id=ticket.ticket_id,
+            booked_price=lowest_price,
+            booking_confirmation=f"BB{request.request_id:06d}",
+            completed_at=datetime.utcnow(),
+        )
+        if not booked:
+            db.session.rollback()
+            print(f"⚠️ Lease on request {request.request_id} lost before booking; nothing booked")
+            perf_metrics.incr('monitor.leases_lost')
+            return
         db.session.commit()
+        db.session.refresh(request)
         
         # Send confirmation email
         send_booking_confirmation(request, user, lowest_price)
         
-        print(f"✅ Auto-booked request {request.request_id} at ${lowest_price}")
+        print(f"✅ Auto-booked request {request.request_id} on {details['flight_number'] or 'unknown flight'} "
+              f"at {lowest_price} {currency}")
         
     except Exception as e:
         db.session.rollback()
         print(f"❌ Auto-booking error: {e}")
-        # Fallback to alert mode
-        request.status = 'price_found'
-        db.session.commit()
+        # Fallback to alert mode (the request stays in 'price_found')
         send_price_alert(request, user, lowest_price)
 
 
@@ -225,10 +278,10 @@ def send_price_alert(request, user, price):
     
     send_email(user.email, subject, html)
     
-    # Update request status
-    request.status = 'alert_sent'
-    request.completed_at = datetime.utcnow()
-    db.session.commit()
+    # Update request status (still ours and still the match this alert is about)
+    if not transition(db.session, request.request_id, 'alert_sent', from_statuses=('price_found',),
+                      completed_at=datetime.utcnow()):
+        _lost(request)
 
 
 def send_booking_confirmation(request, user, price):
@@ -281,8 +334,39 @@ def send_booking_confirmation(request, user, price):
     send_email(user.email, subject, html)
 
 
-def process_request(request):
-    """Process a single budget buy request."""
+def search_group_key(request):
+    """
+    Search parameters of a request: (origin, destination, departure day, adults,
+    non-stop, included airlines, max results). Requests with the same key are
+    served by one upstream search.
+    """
+    departure = request.departure_date or (datetime.now() + timedelta(days=7))
+    params = request_search_params(request)
+    return (request.origin, request.destination, departure.strftime('%Y-%m-%d'), 1,
+            params['non_stop'], params['included_airlines'], params['max_results'])
+
+
+def group_requests(requests):
+    """Map each search_group_key to its requests, in first-seen order."""
+    groups = {}
+    for request in requests:
+        groups.setdefault(search_group_key(request), []).append(request)
+    return groups
+
+
+def process_request(request, flight_offers=None, volatility=None):
+    """
+    Process a single budget buy request and schedule its next check.
+    The caller holds the request's lease (monitor_leases.claim_due). Every
+    status write is a transition() from an active status under that lease:
+    when it changes nothing (the user cancelled, or the lease expired and
+    another worker took over) processing stops without touching the row.
+
+    Args:
+        flight_offers: offers from the shared search of the request's group;
+                       None searches for this request alone
+        volatility: recent relative price volatility of the route (check_scheduler)
+    """
     try:
         print(f"\n{'='*60}")
         print(f"Processing Request #{request.request_id}")
@@ -292,9 +376,9 @@ def process_request(request):
         print(f"{'='*60}")
         
         # Update last checked time
-        request.last_checked_at = datetime.utcnow()
-        request.status = 'searching'
-        db.session.commit()
+        if not transition(db.session, request.request_id, 'searching', last_checked_at=datetime.utcnow()):
+            _lost(request)
+            return
         
         # Get user
         user = User.query.get(request.user_id)
@@ -302,26 +386,21 @@ def process_request(request):
             print(f"⚠️ User not found for request {request.request_id}")
             return
         
-        # Search flights
-        flight_offers = search_flights(
-            request.origin,
-            request.destination,
-            request.departure_date or (datetime.now() + timedelta(days=7))
-        )
+        # Search flights (unless the group search already did)
+        if flight_offers is None:
+            flight_offers = search_flights(*search_group_key(request))
         
         if not flight_offers:
             print(f"  → No flights found, keeping status as pending")
-            request.status = 'pending'
-            db.session.commit()
+            reschedule(request, volatility=volatility)
             return
         
-        # Get lowest price
-        lowest_price = get_lowest_price(flight_offers)
+        # Cheapest offer that meets the request's preferences
+        lowest_price, best_offer = cheapest_offer(flight_offers, request_filter(request))
         
         if lowest_price is None:
-            print(f"  → Could not extract price")
-            request.status = 'pending'
-            db.session.commit()
+            print(f"  → No priced offer matches the preferences")
+            reschedule(request, volatility=volatility)
             return
         
         print(f"  → Lowest price found: ${lowest_price}")
@@ -330,54 +409,200 @@ def process_request(request):
         # Check if price is within budget
         if request.min_budget <= lowest_price <= request.max_budget:
             print(f"✅ Price matches budget!")
-            request.status = 'price_found'
-            db.session.commit()
+            # Only the lease holder may act on a match (no double alert or booking)
+            if not transition(db.session, request.request_id, 'price_found', last_price=lowest_price):
+                _lost(request)
+                return
+            db.session.refresh(request)
             
             # Process based on mode
             if request.mode == 'auto_book':
-                process_auto_book(request, user, lowest_price, flight_offers[0])
+                process_auto_book(request, user, lowest_price, best_offer)
             else:  # alert_only
                 send_price_alert(request, user, lowest_price)
         else:
             print(f"  → Price ${lowest_price} not in budget range")
-            request.status = 'pending'
-            db.session.commit()
+            reschedule(request, lowest_price, volatility)
         
     except Exception as e:
         print(f"❌ Error processing request {request.request_id}: {e}")
         try:
             db.session.rollback()
-            request.status = 'pending'
-            db.session.commit()
+            reschedule(request)
         except Exception:
             pass
 
 
+def _lost(request):
+    print(f"⚠️ Request {request.request_id} was cancelled or its lease lost; leaving it alone")
+    perf_metrics.incr('monitor.leases_lost')
+
+
+def reschedule(request, lowest_price=None, volatility=None):
+    """
+    End a check without a match: back to 'pending' with its next check (or
+    'expired'), if the request is still active and leased by this worker.
+    Returns False when the row was left alone.
+    """
+    values, delay = next_check_values(request, lowest_price, volatility)
+    if not transition(db.session, request.request_id, values.pop('status'), **values):
+        _lost(request)
+        return False
+    if delay is None:
+        print(f"  → Departure has passed, request expired")
+    else:
+        print(f"  → Next check in {delay.total_seconds() / 3600:.1f}h")
+    return True
+
+
+class _InFlight:
+    """Number of search groups being processed right now, and the cycle's peak."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+            perf_metrics.set_gauge('monitor.in_flight', self.current)
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.current -= 1
+            perf_metrics.set_gauge('monitor.in_flight', self.current)
+
+
+def process_group(key, request_ids, in_flight):
+    """
+    One upstream search for a group, then every member evaluated against it (worker thread).
+    Returns the number of members skipped because their lease was lost.
+    """
+    with in_flight, app.app_context():
+        try:
+            # Leases may have expired while the group waited in the pool
+            held = renew(db.session, request_ids)
+            lost = len(request_ids) - len(held)
+            if lost:
+                print(f"⚠️ {lost} lease(s) expired before their check; another worker may take them")
+                perf_metrics.incr('monitor.leases_lost', lost)
+            if not held:
+                return lost
+            origin, destination, date_str = key[:3]
+            now = datetime.utcnow()
+            if departed(datetime.strptime(date_str, '%Y-%m-%d'), now):
+                # Members share the departure day: nothing left to search for
+                expired = sum(transition(db.session, request_id, 'expired', next_check_at=None, completed_at=now)
+                              for request_id in held)
+                print(f"⌛ {origin} → {destination} on {date_str} has departed; expired {expired} request(s)")
+                perf_metrics.incr('monitor.expired', expired)
+                return lost
+            flight_offers = search_flights(*key)
+            perf_metrics.incr('monitor.group_searches')
+            try:
+                volatility = route_volatility(db.session, origin, destination,
+                                              datetime.strptime(date_str, '%Y-%m-%d').date())
+            except Exception as e:
+                print(f"⚠️ Price history unavailable for {origin} → {destination}: {e}")
+                db.session.rollback()
+                volatility = None
+            for request_id in held:
+                request = db.session.get(BudgetBuyRequest, request_id)
+                if request is not None:
+                    process_request(request, flight_offers, volatility)
+            return lost
+        finally:
+            db.session.remove()
+
+
+def seconds_until_next_check(now=None):
+    """Seconds until the earliest scheduled check of an active request (None if there are none)."""
+    now = now or datetime.utcnow()
+    with app.app_context():
+        active = BudgetBuyRequest.query.filter(BudgetBuyRequest.status.in_(ACTIVE_STATUSES))
+        if active.filter(BudgetBuyRequest.next_check_at.is_(None)).first() is not None:
+            return 0.0
+        earliest = active.with_entities(db.func.min(BudgetBuyRequest.next_check_at)).scalar()
+    if earliest is None:
+        return None
+    return max((earliest - now).total_seconds(), 0.0)
+
+
 def monitor_prices():
     """Main monitoring loop."""
+    ensure_schema()
     with app.app_context():
         print(f"\n{'='*80}")
         print(f"Budget Buy Price Monitor - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{'='*80}\n")
         
-        # Get all active requests
-        active_requests = BudgetBuyRequest.query.filter(
-            BudgetBuyRequest.status.in_(['pending', 'searching'])
-        ).all()
+        # Lease the requests due for a check, most overdue first
+        claimed_ids = claim_due(db.session)
+        perf_metrics.set_gauge('monitor.due_requests', len(claimed_ids))
         
-        if not active_requests:
-            print("📭 No active budget requests to process")
-            return
+        if not claimed_ids:
+            print("📭 No budget requests due for a check")
+            return {'requests': 0, 'searches': 0, 'calls_saved': 0,
+                    'seconds': 0.0, 'peak_in_flight': 0, 'throttle_waits': 0, 'leases_lost': 0}
         
-        print(f"📊 Found {len(active_requests)} active request(s)\n")
+        position = {request_id: i for i, request_id in enumerate(claimed_ids)}
+        active_requests = sorted(
+            BudgetBuyRequest.query.filter(BudgetBuyRequest.request_id.in_(claimed_ids)).all(),
+            key=lambda r: position[r.request_id],
+        )
         
-        for request in active_requests:
-            process_request(request)
-            time.sleep(2)  # Rate limiting between requests
+        # Groups keep the order of their most overdue member
+        groups = group_requests(active_requests)
+        print(f"📊 Leased {len(active_requests)} due request(s) as {WORKER_ID} in {len(groups)} search group(s), "
+              f"{MONITOR_WORKERS} worker(s), {MONITOR_RATE_PER_SECOND:g} upstream call(s)/s\n")
+        # Workers load their own copies; release the rows this session holds
+        group_ids = {key: [r.request_id for r in members] for key, members in groups.items()}
+        db.session.rollback()
+        
+        started = time.perf_counter()
+        throttle_waits_before = upstream_bucket.waits
+        in_flight = _InFlight()
+        leases_lost = 0
+        try:
+            with ThreadPoolExecutor(max_workers=MONITOR_WORKERS, thread_name_prefix='budget-monitor') as pool:
+                futures = [pool.submit(process_group, key, ids, in_flight) for key, ids in group_ids.items()]
+                for future in futures:
+                    try:
+                        leases_lost += future.result()
+                    except Exception as e:
+                        print(f"❌ Search group failed: {e}")
+        finally:
+            release(db.session, claimed_ids)
+        elapsed = time.perf_counter() - started
+        throttle_waits = upstream_bucket.waits - throttle_waits_before
+        perf_metrics.record_timing('monitor.cycle', elapsed)
+        perf_metrics.set_gauge('monitor.cycle_seconds', round(elapsed, 3))
+        perf_metrics.set_gauge('monitor.peak_in_flight', in_flight.peak)
+        
+        calls_saved = len(active_requests) - len(groups)
+        perf_metrics.incr('monitor.requests_checked', len(active_requests))
+        perf_metrics.incr('monitor.upstream_calls_saved', calls_saved)
+        perf_metrics.set_gauge('monitor.cycle_groups', len(groups))
+        perf_metrics.set_gauge('monitor.cycle_calls_saved', calls_saved)
         
         print(f"\n{'='*80}")
-        print(f"✅ Monitoring cycle complete")
+        print(f"✅ Monitoring cycle complete: {len(active_requests)} request(s), "
+              f"{len(groups)} search(es), {calls_saved} upstream call(s) saved")
+        print(f"   {elapsed:.1f}s, peak {in_flight.peak} in flight, {throttle_waits} throttled call(s), "
+              f"{leases_lost} lease(s) lost")
         print(f"{'='*80}\n")
+        return {
+            'requests': len(active_requests),
+            'searches': len(groups),
+            'calls_saved': calls_saved,
+            'seconds': elapsed,
+            'peak_in_flight': in_flight.peak,
+            'throttle_waits': throttle_waits,
+            'leases_lost': leases_lost,
+        }
 
 
 if __name__ == '__main__':
@@ -388,12 +613,15 @@ if __name__ == '__main__':
     continuous = '--continuous' in sys.argv
     
     if continuous:
-        print("Running in continuous mode (every 60 minutes)")
+        print("Running in continuous mode (as requests fall due)")
         while True:
             try:
                 monitor_prices()
-                print(f"😴 Sleeping for 60 minutes...\n")
-                time.sleep(3600)  # Sleep for 1 hour
+                # Sleep until the next request is due (1 to 60 minutes)
+                due_in = seconds_until_next_check()
+                pause = 3600 if due_in is None else min(max(due_in, 60), 3600)
+                print(f"😴 Sleeping for {pause / 60:.0f} minutes...\n")
+                time.sleep(pause)
             except KeyboardInterrupt:
                 print("\n\n👋 Shutting down monitor...")
                 break
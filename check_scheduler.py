@@ -0,0 +1,128 @@
+"""
+Budget Buy Check Scheduler
+==========================
+Decides when each BudgetBuyRequest is checked next (BudgetBuyRequest.next_check_at),
+so the API quota goes to the requests most likely to match soon.
+
+The interval after a check is a base interval by days to departure, scaled by:
+- the price gap: the further the lowest price is above max_budget, the longer
+  the wait (up to 4x when it is double the budget); a price already inside
+  the budget halves it
+- recent volatility: the coefficient of variation of the route's cheapest
+  daily price (price_history), or the change since the request's last check
+  when there is no history yet; a route that moves 10% checks twice as often
+
+and clamped to [MONITOR_MIN_CHECK_MINUTES, MONITOR_MAX_CHECK_HOURS], never
+past the departure itself. New requests have no next_check_at and are due
+at once. budget_monitor.py serves due requests earliest-first.
+
+Once the departure day is over there is nothing left to buy: the request is
+marked 'expired' and no longer scheduled.
+
+Settings (environment):
+- MONITOR_MIN_CHECK_MINUTES   shortest interval between checks (default 15)
+- MONITOR_MAX_CHECK_HOURS     longest interval between checks (default 48)
+"""
+
+import os
+import statistics
+from datetime import datetime, timedelta
+
+from price_history import price_trend
+
+MIN_CHECK_INTERVAL = timedelta(minutes=float(os.getenv('MONITOR_MIN_CHECK_MINUTES', 15)))
+MAX_CHECK_INTERVAL = timedelta(hours=float(os.getenv('MONITOR_MAX_CHECK_HOURS', 48)))
+
+# (departing within N days, base interval); the last tier has no limit
+DEPARTURE_TIERS = (
+    (3, timedelta(minutes=30)),
+    (14, timedelta(hours=1)),
+    (60, timedelta(hours=4)),
+    (180, timedelta(hours=12)),
+    (None, timedelta(hours=24)),
+)
+
+VOLATILITY_WINDOW = 14  # most recent observation days used for volatility
+
+
+def base_interval(days_to_departure):
+    for limit, interval in DEPARTURE_TIERS:
+        if limit is None or days_to_departure <= limit:
+            return interval
+
+
+def gap_factor(lowest_price, max_budget):
+    """Interval multiplier for how far the lowest price is above max_budget."""
+    if lowest_price is None or not max_budget:
+        return 1.0
+    gap = (lowest_price - max_budget) / max_budget
+    if gap <= 0:
+        return 0.5
+    return 1.0 + 3.0 * min(gap, 1.0)
+
+
+def volatility_factor(volatility):
+    """Interval multiplier for relative price volatility (0.1 = prices move by ~10%)."""
+    return 1.0 / (1.0 + 10.0 * max(volatility or 0.0, 0.0))
+
+
+def route_volatility(conn, origin, destination, departure_day):
+    """
+    Relative volatility (coefficient of variation) of a route's cheapest fare
+    for one departure day over the last VOLATILITY_WINDOW observation days,
+    or None with fewer than two days of price history.
+    """
+    trend = price_trend(conn, origin, destination, departure_day)[-VOLATILITY_WINDOW:]
+    prices = [cents for _, cents in trend if cents]
+    if len(prices) < 2:
+        return None
+    return statistics.pstdev(prices) / statistics.fmean(prices)
+
+
+def departed(departure_date, now=None):
+    """True once the departure day is over (departure_date holds the day, at midnight)."""
+    now = now or datetime.utcnow()
+    return departure_date is not None and departure_date.date() < now.date()
+
+
+def next_check_delay(departure_date, lowest_price, max_budget, volatility=0.0, now=None):
+    """How long to wait before checking a request again (timedelta)."""
+    now = now or datetime.utcnow()
+    departure = departure_date or (now + timedelta(days=7))
+    days = max((departure - now).total_seconds() / 86400, 0.0)
+    delay = base_interval(days) * gap_factor(lowest_price, max_budget) * volatility_factor(volatility)
+    delay = min(max(delay, MIN_CHECK_INTERVAL), MAX_CHECK_INTERVAL)
+    # Never schedule past departure (but keep the minimum spacing)
+    return max(min(delay, departure - now), MIN_CHECK_INTERVAL)
+
+
+def next_check_values(request, lowest_price=None, volatility=None, now=None):
+    """
+    Column values that end a check: status 'pending' with next_check_at (and
+    last_price), or status 'expired' once the departure has passed.
+    Without route volatility the change since the request's last check is used.
+
+    Returns:
+        (values, delay); delay is None for an expired request
+    """
+    now = now or datetime.utcnow()
+    if departed(request.departure_date, now):
+        return {'status': 'expired', 'next_check_at': None, 'completed_at': now}, None
+    if volatility is None and request.last_price and lowest_price:
+        volatility = abs(lowest_price - request.last_price) / request.last_price
+    delay = next_check_delay(request.departure_date, lowest_price, request.max_budget, volatility, now)
+    values = {'status': 'pending', 'next_check_at': now + delay}
+    if lowest_price is not None:
+        values['last_price'] = lowest_price
+    return values, delay
+
+
+def schedule_next_check(request, lowest_price=None, volatility=None, now=None):
+    """
+    Apply next_check_values() to `request` (the caller commits); returns the
+    delay, or None when the request was expired instead.
+    """
+    values, delay = next_check_values(request, lowest_price, volatility, now)
+    for name, value in values.items():
+        setattr(request, name, value)
+    return delay
@@ -0,0 +1,125 @@
+"""
+Database Engine Profiles
+========================
+Named connection settings for the shared database used by the web app, the
+admin blueprint and budget_monitor.py. Select one with DB_PROFILE.
+
+- dev                   SQLite, rollback journal, full fsync; behaves like the
+                        old setup but waits for locks instead of failing at once
+- production-sqlite     SQLite in WAL mode: readers no longer block the writer,
+                        synchronous=NORMAL, 256 MiB mmap, 64 MiB page cache,
+                        long busy timeout, larger connection pool
+- production-server-db  a client/server database from DATABASE_URL
+                        (PostgreSQL, MySQL); no PRAGMAs, pooled with pre-ping
+
+SQLite PRAGMAs are applied to every new connection (foreign_keys=ON in all
+SQLite profiles). journal_mode=WAL is persistent in the database file, so
+switching back to `dev` later issues journal_mode=DELETE explicitly.
+
+Settings (environment):
+- DB_PROFILE      dev | production-sqlite | production-server-db (default dev)
+- DATABASE_URL    database URL; required for production-server-db, optional
+                  override for the SQLite profiles (default instance/flight.db)
+"""
+
+import os
+
+from sqlalchemy import create_engine, event
+
+PROFILES = {
+    'dev': {
+        'pragmas': {
+            'foreign_keys': 'ON',
+            'journal_mode': 'DELETE',
+            'synchronous': 'FULL',
+            'busy_timeout': 5000,
+            'cache_size': -2000,      # KiB (negative = size in KiB), SQLite default
+            'mmap_size': 0,
+        },
+        'engine': {
+            'pool_size': 5,
+            'max_overflow': 5,
+            'pool_timeout': 30,
+        },
+    },
+    'production-sqlite': {
+        'pragmas': {
+            'foreign_keys': 'ON',
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',  # durable across app crashes; last commits may roll back on power loss
+            'busy_timeout': 15000,
+            'cache_size': -65536,     # 64 MiB per connection
+            'mmap_size': 268435456,   # 256 MiB
+            'temp_store': 'MEMORY',
+            'wal_autocheckpoint': 1000,
+        },
+        'engine': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 15,
+        },
+    },
+    'production-server-db': {
+        'pragmas': {},
+        'engine': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 10,
+            'pool_pre_ping': True,
+            'pool_recycle': 1800,
+        },
+    },
+}
+
+DEFAULT_PROFILE = 'dev'
+
+
+def get_profile(name=None):
+    """Return (name, settings) for `name` or DB_PROFILE. Unknown names raise ValueError."""
+    name = (name or os.getenv('DB_PROFILE') or DEFAULT_PROFILE).strip()
+    if name not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {name!r}; expected one of: {', '.join(PROFILES)}")
+    return name, PROFILES[name]
+
+
+def database_uri(name, sqlite_path):
+    """Database URL for profile `name` (DATABASE_URL, or the SQLite file for SQLite profiles)."""
+    url = os.getenv('DATABASE_URL')
+    if name == 'production-server-db':
+        if not url:
+            raise ValueError("DB_PROFILE=production-server-db requires DATABASE_URL")
+        return url
+    return url or 'sqlite:///' + sqlite_path
+
+
+def engine_options(name):
+    """Keyword arguments for create_engine() / SQLALCHEMY_ENGINE_OPTIONS."""
+    return dict(get_profile(name)[1]['engine'])
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    """Run `PRAGMA key=value` for each setting on a new DB-API connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for key, value in pragmas.items():
+            cursor.execute(f"PRAGMA {key}={value}")
+    finally:
+        cursor.close()
+
+
+def attach(engine, name):
+    """Apply profile `name`'s PRAGMAs to every new connection of a SQLite `engine`."""
+    pragmas = get_profile(name)[1]['pragmas']
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
+
+
+def create_profile_engine(name, url):
+    """Standalone engine configured like profile `name` (scripts and benchmarks)."""
+    engine = create_engine(url, **engine_options(name))
+    attach(engine, name)
+    return engine
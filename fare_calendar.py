@@ -0,0 +1,119 @@
+"""
+Low-Fare Calendar
+=================
+Fills the 31-day date slider on the search page with the cheapest known
+one-way fare per departure day, and its currency.
+
+The window is split into batches of CALENDAR_BATCH_DAYS consecutive days and
+each batch is one Amadeus Flight Cheapest Date Search call (the same API behind
+/api/cheapest-dates) using a departureDate range. Batches run in parallel and
+their results are kept in a per-route calendar cache with its own TTL, so the
+slider for a popular route costs no upstream calls on most page loads.
+
+Settings (environment):
+- CALENDAR_TTL_SECONDS        fresh lifetime of a cached batch (default 21600 = 6h)
+- CALENDAR_BATCH_DAYS         days per cheapest-date call (default 7)
+- CALENDAR_WORKERS            parallel cheapest-date calls (default 4)
+- CALENDAR_DEADLINE_SECONDS   how long a page load waits for the calendar (default 8)
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from amadeus import ResponseError
+
+import perf_metrics
+from offer_cache import OfferCache
+
+CALENDAR_TTL_SECONDS = float(os.getenv('CALENDAR_TTL_SECONDS', 6 * 3600))
+CALENDAR_BATCH_DAYS = int(os.getenv('CALENDAR_BATCH_DAYS', 7))
+CALENDAR_WORKERS = int(os.getenv('CALENDAR_WORKERS', 4))
+CALENDAR_DEADLINE_SECONDS = float(os.getenv('CALENDAR_DEADLINE_SECONDS', 8))
+
+calendar_cache = OfferCache(
+    ttl=CALENDAR_TTL_SECONDS,
+    stale_ttl=CALENDAR_TTL_SECONDS,
+    max_entries=1024,
+    name='calendar_cache',
+)
+calendar_executor = ThreadPoolExecutor(max_workers=CALENDAR_WORKERS, thread_name_prefix='fare-calendar')
+
+
+def fetch_cheapest_dates(provider, origin, destination, first_date, last_date):
+    """
+    Cheapest one-way price per departure date between first_date and last_date.
+
+    Returns:
+        Dict mapping YYYY-MM-DD to (lowest total price found for that day, currency)
+    """
+    date_options = provider.cheapest_dates(
+        origin=origin,
+        destination=destination,
+        departureDate=f"{first_date},{last_date}",
+        oneWay='true'
+    )
+    prices = {}
+    for date_option in date_options:
+        day = date_option.get('departureDate')
+        try:
+            price = float(date_option.get('price', {}).get('total'))
+        except (TypeError, ValueError):
+            continue
+        if day and (day not in prices or price < prices[day][0]):
+            prices[day] = (price, date_option.get('price', {}).get('currency') or '')
+    return prices
+
+
+def _cached_batch(provider, origin, destination, batch):
+    key = (origin, destination, batch[0], batch[-1])
+    return calendar_cache.get_or_fetch(
+        key, lambda: fetch_cheapest_dates(provider, origin, destination, batch[0], batch[-1])
+    )
+
+
+class CalendarRequest:
+    """Cheapest-date lookups for one route, running in the background."""
+
+    def __init__(self, provider, origin, destination, dates):
+        self.dates = list(dates)
+        self.started = time.perf_counter()
+        self.futures = [
+            calendar_executor.submit(_cached_batch, provider, origin, destination, batch)
+            for batch in (
+                self.dates[i:i + CALENDAR_BATCH_DAYS]
+                for i in range(0, len(self.dates), CALENDAR_BATCH_DAYS)
+            )
+        ]
+
+    def result(self, deadline=None):
+        """
+        Wait until `deadline` seconds after the request started, then return
+        {date: (min_price, currency) or None} for every date. Late or failed
+        batches are None.
+        """
+        if deadline is None:
+            deadline = CALENDAR_DEADLINE_SECONDS
+        remaining = max(0.0, deadline - (time.perf_counter() - self.started))
+        _done, not_done = wait(self.futures, timeout=remaining)
+
+        prices = {}
+        for future in self.futures:
+            if future in not_done:
+                perf_metrics.incr('calendar.batch_deadline_missed')
+                continue
+            try:
+                prices.update(future.result())
+            except ResponseError as e:
+                perf_metrics.incr('calendar.batch_errors')
+                print(f"❌ Cheapest date batch error: {e}")
+            except Exception as e:
+                perf_metrics.incr('calendar.batch_errors')
+                print(f"❌ Unexpected cheapest date error: {e}")
+        perf_metrics.record_timing('calendar.build', time.perf_counter() - self.started)
+        return {d: prices.get(d) for d in self.dates}
+
+
+def request_calendar(provider, origin, destination, dates):
+    """Start background cheapest-date lookups for `dates` and return a CalendarRequest."""
+    return CalendarRequest(provider, origin, destination, dates)
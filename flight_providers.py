@@ -0,0 +1,486 @@
+"""
+Flight Data Providers
+=====================
+Every shopping and booking call the app makes upstream goes through a
+FlightProvider instead of the Amadeus SDK directly:
+
+- search_offers      Flight Offers Search (per cabin, used by /search and Budget Buy)
+- cheapest_dates     Flight Cheapest Date Search (date slider, /api/cheapest-dates)
+- price_offers       Flight Offers Price
+- seatmaps           SeatMap Display
+- create_order / get_order / cancel_order   Flight Create Orders / Order Management
+
+Methods take Amadeus request parameters and return the Amadeus response "data"
+(lists/dicts in the Amadeus JSON shape). Failures raise amadeus.ResponseError
+(or a subclass) for every provider, so existing error handling keeps working.
+
+Providers:
+- AmadeusProvider    wraps an amadeus.Client (the default)
+- SyntheticProvider  local stand-in that generates realistic Amadeus-shaped offers
+                     with configurable latency and error rate, for load testing
+                     /search and the Budget Buy monitor offline
+- RateLimitedProvider wraps another provider and takes a token from a
+                     rate_limiter.TokenBucket before every upstream call
+
+Settings (environment):
+- FLIGHT_PROVIDER                 amadeus | synthetic (default amadeus)
+- SYNTHETIC_LATENCY_MS            mean latency per synthetic call (default 250)
+- SYNTHETIC_LATENCY_JITTER_MS     standard deviation of that latency (default 75)
+- SYNTHETIC_ERROR_RATE            fraction of calls that fail with a 500 (default 0)
+- SYNTHETIC_OFFERS                offers returned per search before `max` (default 20)
+"""
+
+import os
+import random
+import secrets
+import string
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from amadeus import Client
+from amadeus.client.errors import NotFoundError, ServerError
+
+import perf_metrics
+
+
+class FlightProvider(ABC):
+    """Interface for upstream flight shopping and booking APIs; subclasses must implement every method."""
+
+    name = 'base'
+
+    @abstractmethod
+    def search_offers(self, **params):
+        """Flight Offers Search; `params` use Amadeus names (originLocationCode, travelClass, max...)."""
+
+    @abstractmethod
+    def cheapest_dates(self, **params):
+        """Flight Cheapest Date Search; `departureDate` may be a "first,last" range."""
+
+    @abstractmethod
+    def price_offers(self, body):
+        """Flight Offers Price for a flight-offers-pricing request body."""
+
+    @abstractmethod
+    def seatmaps(self, flight_offer):
+        """SeatMap Display for one flight offer; one seat map per segment."""
+
+    @abstractmethod
+    def create_order(self, flight_offers, travelers):
+        """Flight Create Orders; returns the flight-order dict."""
+
+    @abstractmethod
+    def get_order(self, order_id):
+        """Flight Order Management; returns the flight-order dict."""
+
+    @abstractmethod
+    def cancel_order(self, order_id):
+        """Flight Order Management; cancels the order and returns the response data (if any)."""
+
+
+# =========================
+# Amadeus
+# =========================
+class AmadeusProvider(FlightProvider):
+    """The Amadeus Self-Service APIs through the official SDK."""
+
+    name = 'amadeus'
+
+    def __init__(self, client):
+        self.client = client
+
+    def search_offers(self, **params):
+        with perf_metrics.timed('provider.amadeus.search_offers'):
+            response = self.client.shopping.flight_offers_search.get(**params)
+        return getattr(response, 'data', None) or []
+
+    def cheapest_dates(self, **params):
+        with perf_metrics.timed('provider.amadeus.cheapest_dates'):
+            response = self.client.shopping.flight_dates.get(**params)
+        return getattr(response, 'data', None) or []
+
+    def price_offers(self, body):
+        with perf_metrics.timed('provider.amadeus.price_offers'):
+            return self.client.shopping.flight_offers.pricing.post(body).data
+
+    def seatmaps(self, flight_offer):
+        with perf_metrics.timed('provider.amadeus.seatmaps'):
+            return self.client.shopping.seatmaps.post(flight_offer).data
+
+    def create_order(self, flight_offers, travelers):
+        with perf_metrics.timed('provider.amadeus.create_order'):
+            response = self.client.booking.flight_orders.post(
+                data={
+                    'type': 'flight-order',
+                    'flightOffers': flight_offers,
+                    'travelers': travelers
+                }
+            )
+        return getattr(response, 'data', None)
+
+    def get_order(self, order_id):
+        return self.client.booking.flight_orders(order_id).get().data
+
+    def cancel_order(self, order_id):
+        response = self.client.booking.flight_orders(order_id).delete()
+        return getattr(response, 'data', None) or {}
+
+
+# =========================
+# Synthetic (offline load testing)
+# =========================
+CABIN_FARE_MULTIPLIERS = {'ECONOMY': 1.0, 'PREMIUM_ECONOMY': 1.7, 'BUSINESS': 3.8, 'FIRST': 6.5}
+CARRIERS = ('AA', 'DL', 'UA', 'B6', 'AS', 'BA', 'AF', 'LH', 'KL', 'EK', 'QR', 'TK')
+HUBS = ('ATL', 'ORD', 'DFW', 'DEN', 'CLT', 'LHR', 'CDG', 'FRA', 'AMS', 'IST', 'DXB', 'DOH')
+
+
+class _SyntheticResponse:
+    """Just enough of amadeus.Response for ResponseError and the app's error handlers."""
+
+    def __init__(self, status_code, detail):
+        self.status_code = status_code
+        self.parsed = True
+        self.result = {'errors': [{'status': status_code, 'title': 'SYNTHETIC', 'detail': detail,
+                                   'source': {'parameter': 'synthetic'}}]}
+        self.data = None
+
+
+def _seed(*parts):
+    return zlib.crc32('|'.join(str(p) for p in parts).encode())
+
+
+def _iso_duration(minutes):
+    hours, mins = divmod(int(minutes), 60)
+    return f"PT{hours}H{mins}M" if mins else f"PT{hours}H"
+
+
+class SyntheticProvider(FlightProvider):
+    """
+    Generates Amadeus-shaped responses locally.
+
+    Results are deterministic per request (same route, date and cabin give the
+    same offers, and offer N is the same itinerary in every cabin, as with the
+    real API), while latency and failures are random per call.
+    """
+
+    name = 'synthetic'
+
+    def __init__(self, latency_ms=250.0, jitter_ms=75.0, error_rate=0.0, offers_per_search=20):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.offers_per_search = offers_per_search
+        self._orders = {}
+        self._recent = OrderedDict()  # offer id -> last offer generated with that id (for pricing)
+        self._lock = threading.Lock()
+
+    # Simulated network ---------------------------------------------------
+    def _call(self, operation):
+        perf_metrics.incr(f'provider.synthetic.{operation}')
+        delay = max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000.0
+        if delay:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            perf_metrics.incr('provider.synthetic.errors')
+            raise ServerError(_SyntheticResponse(500, f'Synthetic {operation} failure'))
+
+    # Offer generation ----------------------------------------------------
+    def _route_base_fare(self, origin, destination):
+        return 80 + _seed(min(origin, destination), max(origin, destination)) % 820
+
+    def _itinerary(self, origin, destination, date, n):
+        """Segments for offer `n` on a route/date, independent of cabin."""
+        rng = random.Random(_seed(origin, destination, date, n))
+        stops = rng.choice((0, 0, 0, 1, 1, 2))
+        carrier = rng.choice(CARRIERS)
+        hubs = [h for h in HUBS if h not in (origin, destination)]
+        airports = [origin] + rng.sample(hubs, stops) + [destination]
+
+        depart = datetime.strptime(date, '%Y-%m-%d') + timedelta(
+            hours=rng.randint(5, 21), minutes=rng.choice((0, 10, 15, 25, 30, 40, 45, 55)))
+        start = depart
+        segments = []
+        for i in range(stops + 1):
+            minutes = rng.randint(55, 480)
+            arrive = depart + timedelta(minutes=minutes)
+            segments.append({
+                'departure': {'iataCode': airports[i], 'at': depart.strftime('%Y-%m-%dT%H:%M:%S')},
+                'arrival': {'iataCode': airports[i + 1], 'at': arrive.strftime('%Y-%m-%dT%H:%M:%S')},
+                'carrierCode': carrier,
+                'number': str(rng.randint(100, 2999)),
+                'aircraft': {'code': rng.choice(('320', '321', '738', '739', '77W', '789', '359'))},
+                'operating': {'carrierCode': carrier},
+                'duration': _iso_duration(minutes),
+                'id': str(i + 1),
+                'numberOfStops': 0,
+            })
+            depart = arrive + timedelta(minutes=rng.randint(45, 200))
+        total_minutes = (arrive - start).total_seconds() // 60
+        return carrier, segments, _iso_duration(total_minutes), rng.uniform(0.75, 1.6) / (1 + 0.18 * stops)
+
+    def _offer(self, origin, destination, date, n, cabin, adults):
+        carrier, segments, duration, fare_factor = self._itinerary(origin, destination, date, n)
+        rng = random.Random(_seed(origin, destination, date, n, cabin))
+        per_adult = round(self._route_base_fare(origin, destination) * fare_factor
+                          * CABIN_FARE_MULTIPLIERS.get(cabin, 1.0) * rng.uniform(0.9, 1.15), 2)
+        base = round(per_adult * 0.82, 2)
+        refundable = cabin in ('BUSINESS', 'FIRST') or rng.random() < 0.25
+        fare_basis = f"{cabin[0]}{rng.choice(('LOW', 'STD', 'FLX'))}{rng.randint(1, 9)}"
+        bags = 2 if cabin in ('BUSINESS', 'FIRST') else rng.choice((0, 1, 1))
+        total = round(per_adult * adults, 2)
+        return {
+            'type': 'flight-offer',
+            'id': str(n),
+            'source': 'GDS',
+            'oneWay': False,
+            'lastTicketingDate': date,
+            'numberOfBookableSeats': rng.randint(1, 9),
+            'itineraries': [{'duration': duration, 'segments': segments}],
+            'price': {
+                'currency': 'USD',
+                'total': f"{total:.2f}",
+                'base': f"{base * adults:.2f}",
+                'grandTotal': f"{total:.2f}",
+            },
+            'validatingAirlineCodes': [carrier],
+            'travelerPricings': [{
+                'travelerId': str(t + 1),
+                'fareOption': 'STANDARD',
+                'travelerType': 'ADULT',
+                'refundability': 'REFUNDABLE' if refundable else 'NON_REFUNDABLE',
+                'price': {'currency': 'USD', 'total': f"{per_adult:.2f}", 'base': f"{base:.2f}"},
+                'fareDetailsBySegment': [{
+                    'segmentId': seg['id'],
+                    'cabin': cabin,
+                    'fareBasis': fare_basis,
+                    'class': fare_basis[0],
+                    'includedCheckedBags': {'quantity': bags},
+                } for seg in segments],
+            } for t in range(adults)],
+        }
+
+    def _generate(self, origin, destination, date, cabin, adults, limit, non_stop=False, airlines=None):
+        filtered = non_stop or airlines
+        # Filters pick from all itineraries of the day, like nonStop/includedAirlineCodes upstream
+        count = self.offers_per_search if filtered else min(limit, self.offers_per_search)
+        # Like the real API, not every itinerary is sold in every cabin
+        offers = [self._offer(origin, destination, date, n, cabin, adults)
+                  for n in range(1, count + 1)
+                  if cabin == 'ECONOMY' or _seed(origin, destination, date, n, cabin) % 4]
+        if non_stop:
+            offers = [o for o in offers if len(o['itineraries'][0]['segments']) == 1]
+        if airlines:
+            offers = [o for o in offers if o['validatingAirlineCodes'][0] in airlines]
+        offers.sort(key=lambda o: float(o['price']['total']))
+        return offers[:limit]
+
+    # FlightProvider --------------------------------------------------------
+    def search_offers(self, **params):
+        self._call('search_offers')
+        offers = self._generate(
+            params.get('originLocationCode', ''),
+            params.get('destinationLocationCode', ''),
+            params.get('departureDate', ''),
+            params.get('travelClass') or 'ECONOMY',
+            int(params.get('adults', 1)),
+            int(params.get('max', 250)),
+            non_stop=str(params.get('nonStop', '')).lower() == 'true',
+            airlines=[code for code in (params.get('includedAirlineCodes') or '').split(',') if code],
+        )
+        with self._lock:
+            for offer in offers:
+                self._recent[offer['id']] = offer
+                self._recent.move_to_end(offer['id'])
+            while len(self._recent) > 1000:
+                self._recent.popitem(last=False)
+        return offers
+
+    def cheapest_dates(self, **params):
+        self._call('cheapest_dates')
+        origin = params.get('origin', '')
+        destination = params.get('destination', '')
+        first, _, last = (params.get('departureDate') or '').partition(',')
+        day = datetime.strptime(first, '%Y-%m-%d') if first else datetime.now() + timedelta(days=1)
+        end = datetime.strptime(last, '%Y-%m-%d') if last else day
+        dates = []
+        while day <= end:
+            date_str = day.strftime('%Y-%m-%d')
+            cheapest = self._generate(origin, destination, date_str, 'ECONOMY', 1, self.offers_per_search)
+            if cheapest:
+                dates.append({
+                    'type': 'flight-date',
+                    'origin': origin,
+                    'destination': destination,
+                    'departureDate': date_str,
+                    'price': {'total': cheapest[0]['price']['total'], 'currency': 'USD'},
+                })
+            day += timedelta(days=1)
+        return dates
+
+    def price_offers(self, body):
+        self._call('price_offers')
+        requested = (body.get('data', body) if isinstance(body, dict) else {'flightOffers': body}).get('flightOffers', [])
+        priced = []
+        with self._lock:
+            for offer in requested:
+                if not offer.get('itineraries'):
+                    offer = self._recent.get(str(offer.get('id')))
+                    if offer is None:
+                        raise NotFoundError(_SyntheticResponse(404, 'Flight offer not found'))
+                priced.append(offer)
+        return {'type': 'flight-offers-pricing', 'flightOffers': priced}
+
+    def seatmaps(self, flight_offer):
+        self._call('seatmaps')
+        if flight_offer.get('itineraries'):
+            segments = [s for it in flight_offer['itineraries'] for s in it.get('segments', [])]
+        else:  # a normalized offer (offer_model.Offer.to_dict())
+            segments = [{'departure': {'iataCode': s.get('origin'), 'at': s.get('departure')},
+                         'arrival': {'iataCode': s.get('destination'), 'at': s.get('arrival')}}
+                        for s in flight_offer.get('segments', [])]
+        seatmaps = []
+        for i, seg in enumerate(segments, start=1):
+            rng = random.Random(_seed(seg.get('departure', {}).get('at'), seg.get('number'), i))
+            seats = []
+            for row in range(1, 31):
+                for col, letter in enumerate('ABCDEF'):
+                    codes = ['W'] if letter in 'AF' else ['A'] if letter in 'CD' else ['9']
+                    status = 'AVAILABLE' if rng.random() < 0.6 else 'OCCUPIED'
+                    seats.append({
+                        'cabin': 'ECONOMY',
+                        'number': f"{row}{letter}",
+                        'characteristicsCodes': codes,
+                        'travelerPricing': [{
+                            'travelerId': '1',
+                            'seatAvailabilityStatus': status,
+                            'price': {'currency': 'USD', 'total': '0.00' if row > 10 else f"{rng.choice((15, 25, 39))}.00"},
+                        }],
+                        'coordinates': {'x': row, 'y': col},
+                    })
+            seatmaps.append({
+                'type': 'seatmap',
+                'segmentId': str(i),
+                'carrierCode': seg.get('carrierCode', ''),
+                'number': seg.get('number', ''),
+                'aircraft': seg.get('aircraft', {'code': '320'}),
+                'departure': seg.get('departure', {}),
+                'arrival': seg.get('arrival', {}),
+                'class': 'Y',
+                'decks': [{
+                    'deckType': 'MAIN',
+                    'deckConfiguration': {'width': 6, 'length': 30, 'startSeatRow': 1, 'endSeatRow': 30},
+                    'seats': seats,
+                }],
+            })
+        return seatmaps
+
+    def create_order(self, flight_offers, travelers):
+        self._call('create_order')
+        order_id = f"SYN{secrets.token_hex(6).upper()}"
+        order = {
+            'type': 'flight-order',
+            'id': order_id,
+            'associatedRecords': [{
+                'reference': ''.join(random.choices(string.ascii_uppercase + string.digits, k=6)),
+                'creationDate': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S'),
+                'originSystemCode': 'GDS',
+                'flightOfferId': str((flight_offers or [{}])[0].get('id', '1')),
+            }],
+            'flightOffers': flight_offers,
+            'travelers': travelers,
+        }
+        with self._lock:
+            self._orders[order_id] = order
+        return order
+
+    def get_order(self, order_id):
+        self._call('get_order')
+        with self._lock:
+            order = self._orders.get(order_id)
+        if order is None:
+            raise NotFoundError(_SyntheticResponse(404, 'Order not found'))
+        return order
+
+    def cancel_order(self, order_id):
+        self._call('cancel_order')
+        with self._lock:
+            if self._orders.pop(order_id, None) is None:
+                raise NotFoundError(_SyntheticResponse(404, 'Order not found'))
+        return {}
+
+
+# =========================
+# Rate limiting
+# =========================
+class RateLimitedProvider(FlightProvider):
+    """Another provider behind a token bucket (e.g. the Amadeus quota for background jobs)."""
+
+    def __init__(self, provider, bucket):
+        self.provider = provider
+        self.bucket = bucket
+        self.name = provider.name
+
+    def search_offers(self, **params):
+        self.bucket.acquire()
+        return self.provider.search_offers(**params)
+
+    def cheapest_dates(self, **params):
+        self.bucket.acquire()
+        return self.provider.cheapest_dates(**params)
+
+    def price_offers(self, body):
+        self.bucket.acquire()
+        return self.provider.price_offers(body)
+
+    def seatmaps(self, flight_offer):
+        self.bucket.acquire()
+        return self.provider.seatmaps(flight_offer)
+
+    def create_order(self, flight_offers, travelers):
+        self.bucket.acquire()
+        return self.provider.create_order(flight_offers, travelers)
+
+    def get_order(self, order_id):
+        self.bucket.acquire()
+        return self.provider.get_order(order_id)
+
+    def cancel_order(self, order_id):
+        self.bucket.acquire()
+        return self.provider.cancel_order(order_id)
+
+
+# =========================
+# Provider selection
+# =========================
+def synthetic_from_env():
+    return SyntheticProvider(
+        latency_ms=float(os.getenv('SYNTHETIC_LATENCY_MS', 250)),
+        jitter_ms=float(os.getenv('SYNTHETIC_LATENCY_JITTER_MS', 75)),
+        error_rate=float(os.getenv('SYNTHETIC_ERROR_RATE', 0)),
+        offers_per_search=int(os.getenv('SYNTHETIC_OFFERS', 20)),
+    )
+
+
+def build_provider(name, api_key=None, api_secret=None):
+    """
+    Provider for a configured name (e.g. a FlightAPIProvider row).
+    Returns None for providers this build has no adapter for.
+    """
+    key = (name or '').strip().lower()
+    if key == 'amadeus':
+        return AmadeusProvider(Client(client_id=api_key, client_secret=api_secret))
+    if key == 'synthetic':
+        return synthetic_from_env()
+    return None
+
+
+def provider_from_env(amadeus_client):
+    """The app-wide provider selected by FLIGHT_PROVIDER (default: the given Amadeus client)."""
+    choice = os.getenv('FLIGHT_PROVIDER', 'amadeus').strip().lower()
+    if choice == 'synthetic':
+        print("🧪 Using the synthetic flight provider (no Amadeus calls)")
+        return synthetic_from_env()
+    return AmadeusProvider(amadeus_client)
@@ -0,0 +1,46 @@
+"""
+Lazy Initialization
+===================
+Helpers that keep `import app` cheap. Importing the app happens in every
+gunicorn worker and in every script (budget_monitor.py, create_admin.py, the
+test scripts), most of which never touch Stripe or the Amadeus SDK.
+
+- LazyObject: stands in for a client or module and builds it on first
+  attribute access (thread-safe, built exactly once)
+"""
+
+import threading
+
+
+class LazyObject:
+    """Proxy that creates the real object with `factory()` on first use."""
+
+    def __init__(self, factory, name):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_target', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _resolve(self):
+        target = self._target
+        if target is None:
+            with self._lock:
+                target = self._target
+                if target is None:
+                    target = self._factory()
+                    object.__setattr__(self, '_target', target)
+        return target
+
+    @property
+    def is_initialized(self):
+        return self._target is not None
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._resolve(), name, value)
+
+    def __repr__(self):
+        state = 'initialized' if self._target is not None else 'not initialized'
+        return f"<LazyObject {self._name} ({state})>"
@@ -0,0 +1,134 @@
+"""
+Location Lookup
+===============
+Remote enrichment for airport autocomplete (Amadeus Airport & City Search),
+kept off the typing path.
+
+- Results are cached per normalized keyword (upper case, single spaces) with
+  a long TTL, including empty results (negative caching)
+- A cached empty result for a shorter prefix answers longer keywords too:
+  if nothing matches "XQZ", nothing matches "XQZA"
+- The upstream call runs on a small worker pool and the request waits at most
+  LOCATION_DEADLINE_SECONDS. A late call keeps running and fills the cache, so
+  it still helps the next keystroke
+- After an upstream error remote lookups pause for LOCATION_ERROR_BACKOFF_SECONDS
+
+Settings (environment):
+- LOCATION_CACHE_TTL_SECONDS      fresh lifetime of a cached keyword (default 604800 = 7 days)
+- LOCATION_CACHE_MAX_ENTRIES      LRU bound on cached keywords (default 20000)
+- LOCATION_DEADLINE_SECONDS       how long a request waits for Amadeus (default 0.3)
+- LOCATION_WORKERS                concurrent upstream lookups (default 4)
+- LOCATION_ERROR_BACKOFF_SECONDS  pause after an upstream error (default 30)
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+from amadeus import ResponseError
+
+import perf_metrics
+from airport_index import build_display
+from offer_cache import OfferCache
+
+LOCATION_CACHE_TTL_SECONDS = float(os.getenv('LOCATION_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+LOCATION_CACHE_MAX_ENTRIES = int(os.getenv('LOCATION_CACHE_MAX_ENTRIES', 20000))
+LOCATION_DEADLINE_SECONDS = float(os.getenv('LOCATION_DEADLINE_SECONDS', 0.3))
+LOCATION_WORKERS = int(os.getenv('LOCATION_WORKERS', 4))
+LOCATION_ERROR_BACKOFF_SECONDS = float(os.getenv('LOCATION_ERROR_BACKOFF_SECONDS', 30))
+
+MIN_KEYWORD_LENGTH = 2
+
+location_cache = OfferCache(
+    ttl=LOCATION_CACHE_TTL_SECONDS,
+    stale_ttl=LOCATION_CACHE_TTL_SECONDS,
+    max_entries=LOCATION_CACHE_MAX_ENTRIES,
+    name='location_cache',
+)
+location_executor = ThreadPoolExecutor(max_workers=LOCATION_WORKERS, thread_name_prefix='location-lookup')
+
+_MISSING = object()
+_backoff_until = 0.0
+
+
+def normalize_keyword(keyword):
+    return ' '.join((keyword or '').upper().split())
+
+
+def fetch_locations(client, keyword):
+    """
+    One Airport & City Search call, reduced to autocomplete suggestions.
+
+    Returns:
+        List of {'iata', 'name', 'city', 'country', 'display'} dicts (may be empty)
+    """
+    with perf_metrics.timed('location_lookup.upstream'):
+        response = client.reference_data.locations.get(keyword=keyword, subType='AIRPORT,CITY')
+    suggestions = []
+    for location in getattr(response, 'data', None) or []:
+        iata_code = location.get('iataCode') or ''
+        if not iata_code:
+            continue
+        address = location.get('address', {}) or {}
+        name = location.get('name') or ''
+        city_name = address.get('cityName') or ''
+        country = address.get('countryName') or ''
+        suggestions.append({
+            'iata': iata_code,
+            'name': name,
+            'city': city_name,
+            'country': country,
+            'display': build_display(iata_code, name, city_name, country),
+        })
+    return suggestions
+
+
+def _known_empty(key):
+    """True if a shorter prefix of the keyword is cached with no results."""
+    for end in range(len(key) - 1, MIN_KEYWORD_LENGTH - 1, -1):
+        if location_cache.peek(key[:end], _MISSING) == []:
+            return True
+    return False
+
+
+def _lookup(client, key):
+    global _backoff_until
+    try:
+        return location_cache.get_or_fetch(key, lambda: fetch_locations(client, key))
+    except ResponseError as e:
+        _backoff_until = time.monotonic() + LOCATION_ERROR_BACKOFF_SECONDS
+        perf_metrics.incr('location_lookup.errors')
+        print(f"❌ Airport search (Amadeus) error: {e}")
+    except Exception as e:
+        _backoff_until = time.monotonic() + LOCATION_ERROR_BACKOFF_SECONDS
+        perf_metrics.incr('location_lookup.errors')
+        print(f"❌ Unexpected airport search error: {e}")
+    return []
+
+
+def lookup_locations(client, keyword, deadline=None):
+    """
+    Remote suggestions for `keyword` within `deadline` seconds.
+    Never raises; returns [] on a deadline miss, during error backoff or on errors.
+    """
+    key = normalize_keyword(keyword)
+    if len(key) < MIN_KEYWORD_LENGTH:
+        return []
+
+    cached = location_cache.peek(key, _MISSING)
+    if cached is not _MISSING:
+        return cached
+    if _known_empty(key):
+        perf_metrics.incr('location_lookup.negative_prefix_hits')
+        return []
+    if time.monotonic() < _backoff_until:
+        perf_metrics.incr('location_lookup.backoff_skips')
+        return []
+
+    future = location_executor.submit(_lookup, client, key)
+    try:
+        return future.result(timeout=LOCATION_DEADLINE_SECONDS if deadline is None else deadline)
+    except FuturesTimeout:
+        # The lookup keeps running and warms the cache for the next keystroke
+        perf_metrics.incr('location_lookup.deadline_misses')
+        return []
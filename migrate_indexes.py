@@ -0,0 +1,44 @@
+"""
+Database Migration Script
+=========================
+Adds the secondary indexes declared in models.py to an existing database
+(BudgetBuyRequest, Booking, Payment, APILog, FlightOffer, price history),
+after adding any new nullable columns those indexes need.
+Safe to run repeatedly; columns and indexes that already exist are skipped.
+
+Check the result with: python test_query_plans.py --db instance/flight.db
+"""
+
+from app import app, db
+from models import add_missing_columns, create_missing_indexes
+
+
+def migrate_indexes():
+    """Create any missing model indexes"""
+
+    with app.app_context():
+        print("=" * 60)
+        print("DATABASE MIGRATION - Adding secondary indexes")
+        print("=" * 60)
+
+        try:
+            for name in add_missing_columns(db.engine):
+                print(f"  ✅ Added column {name}")
+            created = create_missing_indexes(db.engine)
+            if created:
+                for name in created:
+                    print(f"  ✅ Created index {name}")
+                print(f"\n✅ {len(created)} index(es) added and statistics refreshed (ANALYZE)")
+            else:
+                print("\n✅ All indexes already exist!")
+
+            print("\n" + "=" * 60)
+            print("✅ Migration completed successfully!")
+            print("=" * 60)
+
+        except Exception as e:
+            print(f"\n❌ Migration error: {e}")
+
+
+if __name__ == '__main__':
+    migrate_indexes()
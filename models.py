@@ -13,7 +13,7 @@ from typing import Optional
 
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.types import String, Integer, DateTime, Float, Text, Boolean
+from sqlalchemy.types import String, Integer, Date, DateTime, Float, Text, Boolean, LargeBinary
 
 # SQLAlchemy extension (initialized in app.py)
 db = SQLAlchemy()
@@ -104,6 +104,8 @@ class FlightOffer(db.Model):
     # Index to avoid duplicates for same search
     __table_args__ = (
         db.UniqueConstraint('search_id', 'offer_id', name='uq_search_offer'),
+        # Offers seen on a route around a departure time
+        db.Index('ix_flightoffer_route_departure', 'origin', 'destination', 'departure'),
     )
 
     search = relationship("Search", back_populates="offers")
@@ -168,7 +170,7 @@ class BudgetBuyRequest(db.Model):
     
     # Status Tracking
     status: Mapped[str] = mapped_column(String(32), default='pending')  
-    # Status values: pending, searching, price_found, booked, alert_sent, cancelled
+    # Status values: pending, searching, price_found, booked, alert_sent, cancelled, expired
     
     # Booking Information (if auto-booked)
     booked_ticket_id: Mapped[Optional[int]] = mapped_column(Integer, db.ForeignKey("Ticket.ticket_id", ondelete="SET NULL"))
@@ -180,9 +182,23 @@ class BudgetBuyRequest(db.Model):
     last_checked_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
     completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
     
+    # Check scheduling (check_scheduler.py): NULL next_check_at = due now
+    next_check_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    last_price: Mapped[Optional[float]] = mapped_column(Float)  # lowest price at the last check
+    
+    # Monitor lease (monitor_leases.py): which monitor process is checking the request, until when
+    lease_owner: Mapped[Optional[str]] = mapped_column(String(128))
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    
     # Relationships
     user = relationship("User", backref="budget_requests")
     
+    __table_args__ = (
+        db.Index('ix_budget_status', 'status'),  # price monitor: all active requests
+        db.Index('ix_budget_status_next_check', 'status', 'next_check_at'),  # price monitor: due requests
+        db.Index('ix_budget_user_status', 'user_id', 'status'),  # a user's active requests
+    )
+    
     def __repr__(self) -> str:
         return f"<BudgetBuyRequest {self.origin}-{self.destination} ${self.min_budget}-${self.max_budget}>"
 
@@ -228,6 +244,11 @@ class Booking(db.Model):
     user = relationship("User", backref="bookings")
     payment = relationship("Payment", back_populates="bookings")
     
+    __table_args__ = (
+        db.Index('ix_booking_created_at', 'created_at'),  # admin metrics by day, recent bookings
+        db.Index('ix_booking_status_created', 'status', 'created_at'),  # admin list filtered by status
+    )
+    
     def __repr__(self) -> str:
         return f"<Booking {self.pnr} {self.status}>"
 
@@ -259,6 +280,11 @@ class Payment(db.Model):
     user = relationship("User", backref="payments")
     bookings = relationship("Booking", back_populates="payment")
     
+    __table_args__ = (
+        db.Index('ix_payment_user_status', 'user_id', 'status'),  # a user's completed payments
+        db.Index('ix_payment_status', 'status'),  # revenue totals
+    )
+    
     def __repr__(self) -> str:
         return f"<Payment {self.transaction_id} {self.status}>"
 
@@ -383,10 +409,80 @@ class APILog(db.Model):
     user = relationship("User", backref="api_logs")
     booking = relationship("Booking", backref="api_logs")
     
+    __table_args__ = (
+        db.Index('ix_apilog_type_created', 'log_type', 'created_at'),  # log viewer filtered by type
+        db.Index('ix_apilog_created_at', 'created_at'),  # log viewer, all types
+        db.Index('ix_apilog_booking', 'booking_id'),  # logs for one booking
+    )
+    
     def __repr__(self) -> str:
         return f"<APILog {self.log_type} {self.provider}>"
 
 
+# --------------------
+# Price History
+# --------------------
+class PriceObservation(db.Model):
+    """Cheapest fare seen for one route/departure day/carrier/cabin at one point in time.
+
+    Append-only and deliberately narrow (prices in integer cents, no foreign
+    keys); written in bulk with Core inserts. Rows older than the raw retention
+    window are folded into PriceObservationDaily and deleted (see price_history.py).
+    """
+    __tablename__ = "PriceObservation"
+    observation_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    origin: Mapped[str] = mapped_column(String(3), nullable=False)
+    destination: Mapped[str] = mapped_column(String(3), nullable=False)
+    departure_day: Mapped[datetime] = mapped_column(Date, nullable=False)
+    carrier: Mapped[str] = mapped_column(String(3), nullable=False)  # validating airline IATA code
+    cabin: Mapped[str] = mapped_column(String(16), nullable=False)
+    price_cents: Mapped[int] = mapped_column(Integer, nullable=False)
+    currency: Mapped[str] = mapped_column(String(3), nullable=False)
+    observed_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Per-route range queries ("price for this route over these days / since then")
+        db.Index('ix_price_obs_route_day', 'origin', 'destination', 'departure_day', 'observed_at'),
+        # Retention and rollup scans by age
+        db.Index('ix_price_obs_observed_at', 'observed_at'),
+    )
+
+
+class PriceObservationDaily(db.Model):
+    """Daily downsampling of PriceObservation: min/max/sum/count per observation day."""
+    __tablename__ = "PriceObservationDaily"
+    rollup_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    origin: Mapped[str] = mapped_column(String(3), nullable=False)
+    destination: Mapped[str] = mapped_column(String(3), nullable=False)
+    departure_day: Mapped[datetime] = mapped_column(Date, nullable=False)
+    carrier: Mapped[str] = mapped_column(String(3), nullable=False)
+    cabin: Mapped[str] = mapped_column(String(16), nullable=False)
+    currency: Mapped[str] = mapped_column(String(3), nullable=False)
+    observed_day: Mapped[datetime] = mapped_column(Date, nullable=False)
+    min_cents: Mapped[int] = mapped_column(Integer, nullable=False)
+    max_cents: Mapped[int] = mapped_column(Integer, nullable=False)
+    sum_cents: Mapped[int] = mapped_column(Integer, nullable=False)
+    samples: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('origin', 'destination', 'departure_day', 'carrier', 'cabin', 'currency',
+                            'observed_day', name='uq_price_daily'),
+        db.Index('ix_price_daily_observed_day', 'observed_day'),
+    )
+
+
+class OfferResultSet(db.Model):
+    """A search result set shared by all app workers (offer_store.py): zlib-compressed JSON until expires_at."""
+    __tablename__ = "OfferResultSet"
+    token: Mapped[str] = mapped_column(String(16), primary_key=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_offer_result_set_expires', 'expires_at'),  # pruning expired sets
+    )
+
+
 # --------------------
 # Reference Data
 # --------------------
@@ -405,45 +501,183 @@ class Airport(db.Model):
     country: Mapped[Optional[str]] = mapped_column(String(255))
 
 
-def seed_airlines_airports(json_dir: str) -> None:
+def load_reference_rows(json_dir: str) -> dict:
     """
-    Seed airlines and airports tables from JSON files if tables are empty.
-    json_dir should contain airlines.json and airports.json
+    Read airlines.json and airports.json into table rows keyed by primary key.
+    A table whose JSON file is missing maps to None (left untouched when syncing).
     """
     import json
 
+    rows = {'airlines': None, 'airports': None}
+    airlines_path = os.path.join(json_dir, 'airlines.json')
+    if os.path.exists(airlines_path):
+        with open(airlines_path, 'r', encoding='utf-8') as f:
+            rows['airlines'] = {}
+            for item in json.load(f):
+                code = (item.get('id') or '').strip()
+                if code:
+                    rows['airlines'][code] = {'code': code, 'name': item.get('name'), 'logo': item.get('logo')}
+
+    airports_path = os.path.join(json_dir, 'airports.json')
+    if os.path.exists(airports_path):
+        with open(airports_path, 'r', encoding='utf-8') as f:
+            rows['airports'] = {}
+            for _icao, info in json.load(f).items():
+                iata = (info.get('iata') or '').strip()
+                if iata:
+                    rows['airports'][iata] = {
+                        'iata': iata,
+                        'name': info.get('name'),
+                        'city': info.get('city'),
+                        'country': info.get('country'),
+                    }
+    return rows
+
+
+def _upsert_statement(conn, table, key: str):
+    """INSERT ... ON CONFLICT (key) DO UPDATE for SQLite/PostgreSQL, None elsewhere."""
+    if conn.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif conn.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c[key]],
+        set_={c.name: stmt.excluded[c.name] for c in table.columns if c.name != key},
+    )
+
+
+def _sync_table(conn, table, key: str, wanted: dict, prune: bool) -> dict:
+    """Write only the rows of `table` that differ from `wanted` (one batched statement per kind)."""
+    from sqlalchemy import delete, insert, select
+
+    columns = [c.name for c in table.columns]
+    existing = {row[key]: row for row in conn.execute(select(table)).mappings()}
+    changed = [row for pk, row in wanted.items()
+               if pk not in existing or any(existing[pk][c] != row.get(c) for c in columns)]
+    inserted = sum(1 for row in changed if row[key] not in existing)
+    removed = [pk for pk in existing if pk not in wanted] if prune else []
+
+    if changed:
+        upsert = _upsert_statement(conn, table, key)
+        if upsert is None:
+            conn.execute(delete(table).where(table.c[key].in_([row[key] for row in changed])))
+            upsert = insert(table)
+        conn.execute(upsert, changed)
+    if removed:
+        conn.execute(delete(table).where(table.c[key].in_(removed)))
+    return {
+        'inserted': inserted,
+        'updated': len(changed) - inserted,
+        'deleted': len(removed),
+        'unchanged': len(wanted) - len(changed),
+    }
+
+
+def sync_reference_data(engine, json_dir: str, prune: bool = False) -> dict:
+    """
+    Bring the airlines and airports tables in line with the JSON reference files.
+
+    Existing rows are read once and diffed in memory; new and changed rows are
+    written with a single batched upsert per table, all in one transaction.
+    With prune=True rows missing from the JSON files are deleted.
+
+    Returns:
+        Dict mapping table name to counts (inserted/updated/deleted/unchanged and
+        seconds), or to None when its JSON file is missing
+    """
+    import time
+
+    started = time.perf_counter()
+    wanted = load_reference_rows(json_dir)
+    report = {}
+    with engine.begin() as conn:
+        for model, key in ((Airline, 'code'), (Airport, 'iata')):
+            table = model.__table__
+            if wanted[table.name] is None:
+                report[table.name] = None
+                continue
+            table_started = time.perf_counter()
+            report[table.name] = _sync_table(conn, table, key, wanted[table.name], prune)
+            report[table.name]['seconds'] = time.perf_counter() - table_started
+    report['seconds'] = time.perf_counter() - started
+    return report
+
+
+def format_sync_report(report: dict) -> str:
+    """Human-readable lines for a sync_reference_data() report."""
+    lines = []
+    for name in ('airlines', 'airports'):
+        counts = report.get(name)
+        if counts is None:
+            lines.append(f"  {name}: skipped (no {name}.json)")
+        else:
+            lines.append(f"  {name}: {counts['inserted']} inserted, {counts['updated']} updated, "
+                         f"{counts['deleted']} deleted, {counts['unchanged']} unchanged "
+                         f"({counts['seconds'] * 1000:.0f} ms)")
+    lines.append(f"  total: {report['seconds'] * 1000:.0f} ms")
+    return "\n".join(lines)
+
+
+def seed_airlines_airports(json_dir: str) -> None:
+    """
+    Seed or refresh the airlines and airports tables from JSON files.
+    json_dir should contain airlines.json and airports.json
+    """
     try:
-        # Only seed if empty
-        if Airline.query.count() == 0:
-            airlines_path = os.path.join(json_dir, 'airlines.json')
-            if os.path.exists(airlines_path):
-                with open(airlines_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    for item in data:
-                        code = (item.get('id') or '').strip()
-                        if not code:
-                            continue
-                        db.session.merge(Airline(code=code, name=item.get('name'), logo=item.get('logo')))
-                db.session.commit()
-
-        if Airport.query.count() == 0:
-            airports_path = os.path.join(json_dir, 'airports.json')
-            if os.path.exists(airports_path):
-                with open(airports_path, 'r', encoding='utf-8') as f:
-                    airports_raw = json.load(f)
-                    for _icao, info in airports_raw.items():
-                        iata = (info.get('iata') or '').strip()
-                        if not iata:
-                            continue
-                        db.session.merge(
-                            Airport(
-                                iata=iata,
-                                name=info.get('name'),
-                                city=info.get('city'),
-                                country=info.get('country'),
-                            )
-                        )
-                db.session.commit()
+        report = sync_reference_data(db.engine, json_dir)
+        print("🌱 Reference data synced:\n" + format_sync_report(report))
     except Exception as e:  # pragma: no cover
         # Non-fatal during startup — log and continue
         print(f"Seeding error: {e}")
+
+
+def add_missing_columns(engine) -> list:
+    """
+    Add nullable columns declared on the models that an existing table lacks
+    (db.create_all() never alters existing tables). Returns "table.column" names.
+    """
+    from sqlalchemy import inspect
+
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def create_missing_indexes(engine) -> list:
+    """
+    Create indexes declared on the models that an existing database lacks
+    (db.create_all() only adds indexes together with new tables), then ANALYZE
+    so the query planner has statistics. Returns the names of created indexes.
+    """
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(engine)
+                created.append(index.name)
+    if created and engine.dialect.name == 'sqlite':
+        with engine.begin() as conn:
+            conn.execute(text('ANALYZE'))
+    return created
@@ -1,13 +1,13 @@
-from pymongo import MongoClient
 import os
 
 _client = None
 _db = None
 _reviews_collection = None
 
-def get_mongo_client() -> MongoClient:
+def get_mongo_client():
     global _client
     if _client is None:
+        from pymongo import MongoClient  # imported on first use to keep app startup fast
         uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/skyvela")
         _client = MongoClient(uri)
     return _client
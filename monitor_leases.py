@@ -0,0 +1,180 @@
+"""
+Budget Buy Monitor Leases
+=========================
+Lets several budget_monitor.py processes (on any number of hosts) share the
+same database without checking or booking a request twice.
+
+A monitor process claims due requests by setting BudgetBuyRequest.lease_owner
+and lease_expires_at. Every write is a compare-and-set UPDATE: it only
+succeeds while the row is unleased, its lease has expired, or the lease
+belongs to this worker, so two processes can never hold the same request.
+- claim_due()       claims up to MONITOR_CLAIM_BATCH due requests, most overdue first
+- claim()           claims one request at once, due or not (the web "check now"
+                    button leases the request as "web:<request_id>:<nonce>")
+- renew()           extends this worker's leases before a search group is processed;
+                    requests whose lease was lost are skipped
+- transition()      moves a leased request between statuses; every status write of
+                    a check goes through it, so a cancelled request, or one
+                    booked by the worker that took over an expired lease, is
+                    never written back by a stale worker
+- release()         clears this worker's leases at the end of a cycle
+
+A crashed worker's leases simply expire after MONITOR_LEASE_SECONDS and the
+requests are claimed again by the next cycle of any worker.
+
+Settings (environment):
+- MONITOR_WORKER_ID      lease owner name (default "<hostname>:<pid>")
+- MONITOR_LEASE_SECONDS  lease lifetime; renewed per search group (default 300)
+- MONITOR_CLAIM_BATCH    requests claimed per cycle (default 500)
+"""
+
+import os
+import socket
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, update
+
+from models import BudgetBuyRequest
+
+WORKER_ID = os.getenv('MONITOR_WORKER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+LEASE_DURATION = timedelta(seconds=float(os.getenv('MONITOR_LEASE_SECONDS', 300)))
+CLAIM_BATCH = int(os.getenv('MONITOR_CLAIM_BATCH', 500))
+
+ACTIVE_STATUSES = ('pending', 'searching')
+# Statuses a user may still check by hand (and book from)
+CHECKABLE_STATUSES = ACTIVE_STATUSES + ('price_found', 'alert_sent')
+
+_requests = BudgetBuyRequest.__table__
+
+
+def _claimable(now, owner):
+    """Unleased, expired, or already ours."""
+    return or_(
+        _requests.c.lease_expires_at.is_(None),
+        _requests.c.lease_expires_at <= now,
+        _requests.c.lease_owner == owner,
+    )
+
+
+def _held(now, owner):
+    return and_(_requests.c.lease_owner == owner, _requests.c.lease_expires_at > now)
+
+
+def claim_due(session, now=None, owner=WORKER_ID, limit=CLAIM_BATCH, attempts=3):
+    """
+    Lease up to `limit` active requests that are due (next_check_at NULL or
+    past), most overdue first. Commits. When another worker wins some of the
+    candidates, the next ones are tried (up to `attempts` rounds).
+
+    Returns:
+        Claimed request ids, most overdue first
+    """
+    now = now or datetime.utcnow()
+    due = and_(
+        _requests.c.status.in_(ACTIVE_STATUSES),
+        or_(_requests.c.next_check_at.is_(None), _requests.c.next_check_at <= now),
+    )
+    order = (_requests.c.next_check_at.asc().nulls_first(), _requests.c.request_id)
+    claimed = []
+    for _ in range(attempts):
+        candidates = session.execute(
+            select(_requests.c.request_id)
+            .where(due, _claimable(now, owner), _requests.c.request_id.not_in(claimed))
+            .order_by(*order)
+            .limit(limit - len(claimed))
+        ).scalars().all()
+        if not candidates:
+            break
+
+        # Compare-and-set: rows another worker claimed in the meantime no longer match
+        session.execute(
+            update(_requests)
+            .where(_requests.c.request_id.in_(candidates), due, _claimable(now, owner))
+            .values(lease_owner=owner, lease_expires_at=now + LEASE_DURATION)
+        )
+        session.commit()
+        held = set(session.execute(
+            select(_requests.c.request_id)
+            .where(_requests.c.request_id.in_(candidates), _held(now, owner))
+        ).scalars())
+        claimed.extend(request_id for request_id in candidates if request_id in held)
+        if len(held) == len(candidates) or len(claimed) >= limit:
+            break
+    return claimed
+
+
+def claim(session, request_id, owner, statuses=CHECKABLE_STATUSES, now=None):
+    """Lease one request now if it is in `statuses` and not leased by someone else. Commits."""
+    now = now or datetime.utcnow()
+    result = session.execute(
+        update(_requests)
+        .where(
+            _requests.c.request_id == request_id,
+            _requests.c.status.in_(statuses),
+            _claimable(now, owner),
+        )
+        .values(lease_owner=owner, lease_expires_at=now + LEASE_DURATION)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def renew(session, request_ids, now=None, owner=WORKER_ID):
+    """Extend this worker's unexpired leases on `request_ids`; returns the ids still held. Commits."""
+    if not request_ids:
+        return []
+    now = now or datetime.utcnow()
+    session.execute(
+        update(_requests)
+        .where(_requests.c.request_id.in_(request_ids), _held(now, owner))
+        .values(lease_expires_at=now + LEASE_DURATION)
+    )
+    session.commit()
+    held = set(session.execute(
+        select(_requests.c.request_id)
+        .where(_requests.c.request_id.in_(request_ids), _held(now, owner))
+    ).scalars())
+    return [request_id for request_id in request_ids if request_id in held]
+
+
+def transition(session, request_id, to_status, from_statuses=ACTIVE_STATUSES, now=None, owner=WORKER_ID,
+               commit=True, **values):
+    """
+    Set a leased request's status (and other `values`) if this worker still
+    holds its lease and it is in one of `from_statuses`. Commits, unless
+    `commit` is False (to make the change atomic with the caller's own writes).
+
+    Returns:
+        True if this worker made the change
+    """
+    now = now or datetime.utcnow()
+    result = session.execute(
+        update(_requests)
+        .where(
+            _requests.c.request_id == request_id,
+            _requests.c.status.in_(from_statuses),
+            _held(now, owner),
+        )
+        .values(status=to_status, **values)
+    )
+    if commit:
+        session.commit()
+    return result.rowcount == 1
+
+
+def release(session, request_ids, owner=WORKER_ID):
+    """Drop this worker's leases on `request_ids` (whatever their expiry). Commits."""
+    if not request_ids:
+        return
+    session.execute(
+        update(_requests)
+        .where(_requests.c.request_id.in_(request_ids), _requests.c.lease_owner == owner)
+        .values(lease_owner=None, lease_expires_at=None)
+    )
+    session.commit()
+
+
+def lease_active(request, now=None):
+    """True if some monitor worker currently holds a lease on `request`."""
+    now = now or datetime.utcnow()
+    return bool(request.lease_owner) and request.lease_expires_at is not None and request.lease_expires_at > now
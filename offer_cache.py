@@ -0,0 +1,256 @@
+"""
+Flight Offer Cache
+==================
+In-process TTL/LRU cache for Amadeus flight-offer searches, shared by the
+search pages, the Budget Buy "check now" endpoint and the price monitor.
+
+Entries are keyed by (origin, destination, departureDate, travelClass,
+adults, max). A fresh entry is served directly. An entry past its TTL but
+still inside the stale window is served immediately while a background
+refresh fetches a new copy (stale-while-revalidate). Anything older is a
+miss and is fetched synchronously.
+
+Settings (environment):
+- OFFER_CACHE_TTL_SECONDS      fresh lifetime of an entry (default 300)
+- OFFER_CACHE_STALE_SECONDS    extra time a stale entry may be served (default 600)
+- OFFER_CACHE_MAX_ENTRIES      LRU bound on the number of cached searches (default 512)
+
+SingleFlight coalesces concurrent identical calls: the first caller runs the
+upstream work and every caller that arrives while it is in flight waits for
+and shares that result instead of issuing its own request.
+"""
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from amadeus.client.errors import ResponseError
+
+import perf_metrics
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+def _waiter_error(error):
+    """
+    A fresh exception for a waiter of a failed call, so waiters never raise (and
+    append their frames to the traceback of) the leader's instance. Keeps the
+    type, so callers' `except ResponseError` handling still applies.
+    """
+    if isinstance(error, ResponseError):
+        return type(error)(error.response)
+    try:
+        return copy.copy(error)
+    except Exception:
+        return RuntimeError(f"shared call failed: {error!r}")
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its result."""
+
+    def __init__(self, name, history=200):
+        self.name = name
+        self.history = history
+        self._calls = {}
+        self._coalesced = OrderedDict()  # key -> total waiters that shared a call
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Return fn() for `key`, or wait for the in-flight call with the same key.
+        When the leading call fails, every waiter raises its own copy of the
+        exception, chained to the leader's.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                call.waiters += 1
+                leader = False
+
+        if not leader:
+            perf_metrics.incr(f'{self.name}.coalesced')
+            call.event.wait()
+            if call.error is not None:
+                raise _waiter_error(call.error) from call.error
+            return call.result
+
+        perf_metrics.incr(f'{self.name}.calls')
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.waiters:
+                    self._coalesced[key] = self._coalesced.pop(key, 0) + call.waiters
+                    while len(self._coalesced) > self.history:
+                        self._coalesced.popitem(last=False)
+                perf_metrics.set_gauge(f'{self.name}.in_flight', len(self._calls))
+            call.event.set()
+            if call.waiters:
+                print(f"🔗 {call.waiters} request(s) shared in-flight {self.name} call {key}")
+        return call.result
+
+    def stats(self):
+        """In-flight count and total coalesced waiters for recently shared keys."""
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'coalesced_by_key': {
+                    '|'.join(str(part) for part in key): waiters
+                    for key, waiters in self._coalesced.items()
+                },
+            }
+
+
+class OfferCache:
+    """Size-bounded LRU cache with TTL and stale-while-revalidate semantics."""
+
+    def __init__(self, ttl=300.0, stale_ttl=600.0, max_entries=512, name='offer_cache'):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.name = name
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f'{name}-refresh')
+        self._misses = SingleFlight(f'{name}.fetch')
+
+    def get_or_fetch(self, key, fetch):
+        """
+        Return the cached value for `key`, calling `fetch()` when needed.
+        Exceptions raised by `fetch` propagate and nothing is cached.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry[0]
+                if age <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._count('hits')
+                    return entry[1]
+                if age <= self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self._count('stale_hits')
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._refresher.submit(self._refresh, key, fetch)
+                    return entry[1]
+            self._count('misses')
+
+        return self._misses.do(key, lambda: self._fetch_and_store(key, fetch))
+
+    def peek(self, key, default=None):
+        """Fresh cached value for `key`, or `default` (never fetches or refreshes)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self._count('hits')
+                return entry[1]
+        return default
+
+    def _fetch_and_store(self, key, fetch):
+        value = fetch()
+        self.set(key, value)
+        return value
+
+    def set(self, key, value):
+        """Store `value` under `key`, evicting least recently used entries."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._count('evictions')
+            perf_metrics.set_gauge(f'{self.name}.entries', len(self._entries))
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            perf_metrics.set_gauge(f'{self.name}.entries', 0)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _refresh(self, key, fetch):
+        try:
+            self.set(key, fetch())
+            self._count('refreshes')
+        except Exception as e:
+            self._count('refresh_errors')
+            print(f"⚠️ Background refresh failed for {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _count(self, event):
+        perf_metrics.incr(f'{self.name}.{event}')
+
+
+# Coalesces identical build_flights() searches (see app.py)
+search_coalescer = SingleFlight('search_coalescer')
+
+offer_cache = OfferCache(
+    ttl=float(os.getenv('OFFER_CACHE_TTL_SECONDS', 300)),
+    stale_ttl=float(os.getenv('OFFER_CACHE_STALE_SECONDS', 600)),
+    max_entries=int(os.getenv('OFFER_CACHE_MAX_ENTRIES', 512)),
+)
+
+
+def search_flight_offers(provider, origin, destination, departure_date, travel_class=None, adults=1, max_results=10,
+                         non_stop=False, included_airlines=None):
+    """
+    Cached wrapper around provider.search_offers() (Flight Offers Search).
+
+    Args:
+        provider: FlightProvider used on a cache miss or refresh
+        departure_date: Date string in YYYY-MM-DD format
+        travel_class: Optional cabin (ECONOMY, PREMIUM_ECONOMY, BUSINESS, FIRST)
+        non_stop: Only non-stop flights (nonStop)
+        included_airlines: Optional comma-separated IATA airline codes (includedAirlineCodes)
+
+    Returns:
+        List of raw Amadeus offer dicts (may be empty). ResponseError propagates.
+    """
+    key = (origin, destination, departure_date, travel_class, adults, max_results, bool(non_stop), included_airlines or None)
+
+    def fetch():
+        params = {
+            'originLocationCode': origin,
+            'destinationLocationCode': destination,
+            'departureDate': departure_date,
+            'adults': adults,
+            'max': max_results,
+        }
+        if travel_class:
+            params['travelClass'] = travel_class
+        if non_stop:
+            params['nonStop'] = 'true'
+        if included_airlines:
+            params['includedAirlineCodes'] = included_airlines
+        return provider.search_offers(**params)
+
+    return offer_cache.get_or_fetch(key, fetch)
@@ -0,0 +1,155 @@
+"""
+Offer Filter
+============
+Budget Buy preferences applied to flight searches.
+
+- upstream_search_params() turns the preferences Flight Offers Search can
+  apply itself (non-stop, airline) into search_flight_offers() arguments,
+  so the offers fetched already match instead of being filtered away
+- compile_offer_filter() builds one predicate for everything, including what
+  the API cannot filter (stop count, departure time window); constants are
+  resolved once and each offer is checked in a single pass over its
+  outbound segments. Upstream constraints are checked again because cached
+  or third-party results may not honour them
+- cheapest_offer() finds the cheapest matching offer in one pass
+- booking_details() extracts what a booking records about the chosen offer
+
+When only the predicate can express a preference, FILTERED_MAX_RESULTS
+offers are fetched instead of the usual 10, so filtering does not leave
+the request with nothing to compare.
+
+Departure time windows (local time at the origin, as in the offers):
+morning 05:00-12:00, afternoon 12:00-17:00, evening 17:00-24:00,
+night 21:00-05:00.
+"""
+
+from offer_model import parse_duration, parse_moment
+
+DEFAULT_MAX_RESULTS = 10
+FILTERED_MAX_RESULTS = 50
+
+# Minutes after midnight, [start, end); night wraps past midnight
+TIME_WINDOWS = {
+    'morning': (5 * 60, 12 * 60),
+    'afternoon': (12 * 60, 17 * 60),
+    'evening': (17 * 60, 24 * 60),
+    'night': (21 * 60, 5 * 60),
+}
+
+
+def _airline(preferred_airline):
+    return (preferred_airline or '').strip().upper() or None
+
+
+def _stop_limit(non_stop_only, max_stops):
+    return 0 if non_stop_only else max_stops
+
+
+def upstream_search_params(non_stop_only=False, max_stops=None, preferred_airline=None, preferred_time=None):
+    """
+    Keyword arguments for search_flight_offers(): non_stop, included_airlines
+    and max_results (larger when stops or time can only be filtered locally).
+    """
+    stop_limit = _stop_limit(non_stop_only, max_stops)
+    local_only = (stop_limit is not None and stop_limit > 0) or (preferred_time or '').strip().lower() in TIME_WINDOWS
+    return {
+        'non_stop': stop_limit == 0,
+        'included_airlines': _airline(preferred_airline),
+        'max_results': FILTERED_MAX_RESULTS if local_only else DEFAULT_MAX_RESULTS,
+    }
+
+
+def compile_offer_filter(non_stop_only=False, max_stops=None, preferred_airline=None, preferred_time=None):
+    """
+    Predicate over raw (Amadeus-shaped) offers for the given preferences,
+    or None when nothing is constrained. Unknown time labels are ignored.
+    """
+    stop_limit = _stop_limit(non_stop_only, max_stops)
+    airline = _airline(preferred_airline)
+    window = TIME_WINDOWS.get((preferred_time or '').strip().lower())
+    if stop_limit is None and airline is None and window is None:
+        return None
+    start, end = window or (0, 0)
+    wraps = start > end
+
+    def matches(offer):
+        itineraries = offer.get('itineraries')
+        if not itineraries:
+            return False
+        segments = itineraries[0].get('segments')
+        if not segments:
+            return False
+        if stop_limit is not None:
+            stops = len(segments) - 1
+            for segment in segments:
+                stops += segment.get('numberOfStops') or 0
+            if stops > stop_limit:
+                return False
+        if airline is not None:
+            for segment in segments:
+                if segment.get('carrierCode') != airline:
+                    return False
+        if window is not None:
+            at = (segments[0].get('departure') or {}).get('at') or ''
+            try:
+                minute = int(at[11:13]) * 60 + int(at[14:16])  # "YYYY-MM-DDTHH:MM:SS"
+            except ValueError:
+                return False
+            if wraps:
+                if end <= minute < start:
+                    return False
+            elif not start <= minute < end:
+                return False
+        return True
+
+    return matches
+
+
+def request_filter(budget_request):
+    """compile_offer_filter() for a BudgetBuyRequest."""
+    return compile_offer_filter(budget_request.non_stop_only, budget_request.max_stops,
+                                budget_request.preferred_airline, budget_request.preferred_time)
+
+
+def request_search_params(budget_request):
+    """upstream_search_params() for a BudgetBuyRequest."""
+    return upstream_search_params(budget_request.non_stop_only, budget_request.max_stops,
+                                  budget_request.preferred_airline, budget_request.preferred_time)
+
+
+def cheapest_offer(offers, predicate=None):
+    """
+    (lowest total price, offer) among offers accepted by `predicate`
+    (all offers when None), or (None, None).
+    """
+    lowest, best = None, None
+    for offer in offers or ():
+        if predicate is not None and not predicate(offer):
+            continue
+        try:
+            price = float(offer.get('price', {}).get('total', 0))
+        except (TypeError, ValueError):
+            continue
+        if price > 0 and (lowest is None or price < lowest):
+            lowest, best = price, offer
+    return lowest, best
+
+
+def booking_details(offer):
+    """
+    Flight and ticket fields for the outbound itinerary of a raw offer:
+    carrier and flight_number (first segment), departure_time, arrival_time
+    (last segment), duration (minutes) and currency. Missing parts are None.
+    """
+    itinerary = ((offer or {}).get('itineraries') or [{}])[0]
+    segments = itinerary.get('segments') or [{}]
+    first, last = segments[0], segments[-1]
+    flight_number = f"{first.get('carrierCode', '')}{first.get('number', '')}" or None
+    return {
+        'carrier': first.get('carrierCode') or None,
+        'flight_number': flight_number,
+        'departure_time': parse_moment((first.get('departure') or {}).get('at')).at,
+        'arrival_time': parse_moment((last.get('arrival') or {}).get('at')).at,
+        'duration': parse_duration(itinerary.get('duration'))[0],
+        'currency': ((offer or {}).get('price') or {}).get('currency') or None,
+    }
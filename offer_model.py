@@ -0,0 +1,422 @@
+"""
+Normalized Flight Offers
+========================
+Compact in-memory model for the offers shown on the search pages.
+
+build_flights() used to produce one nested dict per offer, per segment, per
+fare and per baggage allowance, and search() then walked every fare again to
+find each offer's lowest price (for the slider, the cards and persistence).
+Offers are now slotted dataclasses: no per-instance __dict__, and the per-offer
+minimum price, its currency, the stop count and the duration in minutes are
+computed once while merging.
+
+Identical baggage allowances share one Bags instance, and a traveler pricing
+contributes one fare per distinct (cabin, fare basis, seat, bags) rather than
+one copy per segment.
+
+Normalization is also the only place timestamps and durations are parsed.
+Every departure/arrival becomes a Moment (datetime plus the display strings the
+pages use) and every ISO-8601 duration becomes minutes plus its display text.
+Both parsers are memoized, so a timestamp shared by several cabins, offers or
+segments is parsed once per process. Handlers, persistence and the Jinja
+filters read these values instead of calling datetime.fromisoformat() again.
+
+The classes keep a read-only dict-style get() so code written against the old
+dicts keeps working. to_dict() produces the old dict shape (app.py's JSON
+provider uses it for tojson/jsonify) and Offer.from_dict() rebuilds an Offer
+from it, e.g. from a legacy outbound_json form payload.
+"""
+
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+
+_DURATION_RE = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?')
+_DISPLAY_DURATION_RE = re.compile(r'(?:(\d+)h)?\s*(?:(\d+)m)?')
+
+
+class _DictAccess:
+    """Dict-style read access, so code written for the old dicts keeps working."""
+    __slots__ = ()
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+
+@dataclass(slots=True, frozen=True)
+class Moment(_DictAccess):
+    """A parsed local timestamp and its pre-formatted display strings."""
+    at: datetime | None = None
+    hhmm: str = ''          # 08:05
+    time12: str = ''        # 08:05 AM
+    day_name: str = ''      # Wednesday
+    date_compact: str = ''  # wed, 17, 2025
+    date_full: str = ''     # Wed, Sep 17, 2025
+
+
+_NO_MOMENT = Moment()
+_DAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+_MONTH_ABBRS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+@lru_cache(maxsize=8192)
+def parse_moment(iso_str):
+    """Parse an ISO-8601 local timestamp once; unparseable values give an empty Moment."""
+    if not iso_str or not isinstance(iso_str, str):
+        return _NO_MOMENT
+    try:
+        dt = datetime.fromisoformat(iso_str.replace('Z', ''))
+    except ValueError:
+        return _NO_MOMENT
+    hour, minute = dt.hour, dt.minute
+    day_name = _DAY_NAMES[dt.weekday()]
+    return Moment(
+        dt,
+        f"{hour:02d}:{minute:02d}",
+        f"{hour % 12 or 12:02d}:{minute:02d} {'AM' if hour < 12 else 'PM'}",
+        day_name,
+        f"{day_name[:3].lower()}, {dt.day}, {dt.year}",
+        f"{day_name[:3]}, {_MONTH_ABBRS[dt.month - 1]} {dt.day}, {dt.year}",
+    )
+
+
+@lru_cache(maxsize=1024)
+def parse_duration(value):
+    """
+    'PT5H30M' -> (330, '5h 30m'). Empty values give (None, '').
+    Forms the regex does not cover keep the old display text and no minutes.
+    """
+    if not value:
+        return None, ''
+    match = _DURATION_RE.fullmatch(value)
+    if not match or not any(match.groups()):
+        return None, value.replace("PT", "").replace("H", "h ").replace("M", "m")
+    hours, minutes = match.groups()
+    display = (f"{hours}h " if hours else "") + (f"{minutes}m" if minutes else "")
+    return int(hours or 0) * 60 + int(minutes or 0), display
+
+
+def display_duration_minutes(text):
+    """Minutes from display text like '12h 30m' (legacy payloads without duration_minutes)."""
+    match = _DISPLAY_DURATION_RE.fullmatch((text or '').strip())
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes = match.groups()
+    return int(hours or 0) * 60 + int(minutes or 0)
+
+
+@dataclass(slots=True, frozen=True)
+class Bags(_DictAccess):
+    quantity: int = 0
+    weight: int | None = None
+    type: str | None = None
+
+    def to_dict(self):
+        return {"quantity": self.quantity, "weight": self.weight, "type": self.type}
+
+
+_shared_bags = {}
+
+
+@dataclass(slots=True)
+class Fare(_DictAccess):
+    fare_type: str
+    price: float
+    base: float | None
+    taxes: float | None
+    currency: str
+    seat: str
+    bags: Bags
+    flexibility: str
+
+    def to_dict(self):
+        return {
+            "fare_type": self.fare_type,
+            "price": self.price,
+            "base": self.base,
+            "taxes": self.taxes,
+            "currency": self.currency,
+            "seat": self.seat,
+            "bags": self.bags.to_dict(),
+            "flexibility": self.flexibility,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        bags = data.get("bags") or {}
+        return cls(
+            data.get("fare_type", "Standard"),
+            float(data.get("price") or 0),
+            data.get("base"),
+            data.get("taxes"),
+            data.get("currency", ""),
+            data.get("seat", "Not included"),
+            _bags((bags.get("quantity", 0), bags.get("weight"), bags.get("type"))),
+            data.get("flexibility", "Non-refundable"),
+        )
+
+
+@dataclass(slots=True)
+class Segment(_DictAccess):
+    origin: str | None
+    destination: str | None
+    departure: str | None
+    arrival: str | None
+    duration: str
+    duration_minutes: int | None = None
+    departs: Moment = _NO_MOMENT
+    arrives: Moment = _NO_MOMENT
+
+    def to_dict(self):
+        return {
+            "origin": self.origin,
+            "destination": self.destination,
+            "departure": self.departure,
+            "arrival": self.arrival,
+            "duration": self.duration,
+            "duration_minutes": self.duration_minutes,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        duration = data.get("duration") or ""
+        minutes = data.get("duration_minutes")
+        return cls(
+            data.get("origin"),
+            data.get("destination"),
+            data.get("departure"),
+            data.get("arrival"),
+            duration,
+            minutes if minutes is not None else display_duration_minutes(duration),
+            parse_moment(data.get("departure")),
+            parse_moment(data.get("arrival")),
+        )
+
+
+@dataclass(slots=True)
+class Offer(_DictAccess):
+    offer_id: str
+    airline_name: str
+    airline_logo: str
+    origin: str
+    destination: str
+    departure: str
+    arrival: str
+    duration: str
+    stops_text: str
+    segments: list
+    date: str
+    stops: int = 0
+    duration_minutes: int | None = None
+    fares_by_cabin: dict = field(default_factory=dict)
+    min_price: float | None = None
+    currency: str | None = None
+    departs: Moment = _NO_MOMENT
+    arrives: Moment = _NO_MOMENT
+    airline_code: str = ""
+
+    def add_fare(self, cabin, fare):
+        """Attach a fare to `cabin`, keeping min_price/currency current."""
+        fares = self.fares_by_cabin.get(cabin)
+        if fares is None:
+            fares = self.fares_by_cabin[cabin] = []
+        fares.append(fare)
+        if self.min_price is None or fare.price < self.min_price:
+            self.min_price = fare.price
+            self.currency = fare.currency
+
+    def to_dict(self):
+        return {
+            "offer_id": self.offer_id,
+            "airline_name": self.airline_name,
+            "airline_logo": self.airline_logo,
+            "origin": self.origin,
+            "destination": self.destination,
+            "departure": self.departure,
+            "arrival": self.arrival,
+            "duration": self.duration,
+            "stops_text": self.stops_text,
+            "segments": [seg.to_dict() for seg in self.segments],
+            "date": self.date,
+            "stops": self.stops,
+            "duration_minutes": self.duration_minutes,
+            "fares_by_cabin": {
+                cabin: [fare.to_dict() for fare in fares]
+                for cabin, fares in self.fares_by_cabin.items()
+            },
+            "min_price": self.min_price,
+            "currency": self.currency,
+            "airline_code": self.airline_code,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an Offer from its to_dict() shape (older payloads may lack newer keys)."""
+        segments = [Segment.from_dict(seg) for seg in data.get("segments") or []]
+        duration = data.get("duration") or ""
+        minutes = data.get("duration_minutes")
+        offer = cls(
+            offer_id=str(data.get("offer_id") or ""),
+            airline_name=data.get("airline_name", ""),
+            airline_logo=data.get("airline_logo", ""),
+            origin=data.get("origin", ""),
+            destination=data.get("destination", ""),
+            departure=data.get("departure", ""),
+            arrival=data.get("arrival", ""),
+            duration=duration,
+            stops_text=data.get("stops_text", ""),
+            segments=segments,
+            date=data.get("date", ""),
+            stops=data.get("stops", max(len(segments) - 1, 0)),
+            duration_minutes=minutes if minutes is not None else display_duration_minutes(duration),
+            departs=parse_moment(data.get("departure")),
+            arrives=parse_moment(data.get("arrival")),
+            airline_code=data.get("airline_code", ""),
+        )
+        for cabin, fares in (data.get("fares_by_cabin") or {}).items():
+            for fare in fares or []:
+                offer.add_fare(cabin, Fare.from_dict(fare))
+        return offer
+
+
+def _bags(key):
+    bags = _shared_bags.get(key)
+    if bags is None:
+        bags = _shared_bags[key] = Bags(*key)
+    return bags
+
+
+def _new_offer(flight_id, raw, searched_date, airlines):
+    validating_codes = raw.get("validatingAirlineCodes") or []
+    airline_code = validating_codes[0] if validating_codes else ""
+    airline_info = airlines.get(airline_code, {"name": airline_code or "Unknown", "logo": ""})
+
+    itineraries = raw.get("itineraries") or []
+    first_itin = itineraries[0] if itineraries else {}
+    segments = first_itin.get("segments", [])
+    if not segments:
+        return None
+
+    stops = len(segments) - 1
+    stops_text = "Non-stop" if stops == 0 else f"{stops} stop{'s' if stops > 1 else ''}"
+
+    segment_list = []
+    for seg in segments:
+        dep = seg.get("departure", {})
+        arr = seg.get("arrival", {})
+        seg_minutes, seg_duration = parse_duration(seg.get("duration", ""))
+        segment_list.append(Segment(
+            origin=dep.get("iataCode"),
+            destination=arr.get("iataCode"),
+            departure=dep.get("at"),
+            arrival=arr.get("at"),
+            duration=seg_duration,
+            duration_minutes=seg_minutes,
+            departs=parse_moment(dep.get("at")),
+            arrives=parse_moment(arr.get("at")),
+        ))
+
+    first, last = segment_list[0], segment_list[-1]
+    minutes, duration = parse_duration(first_itin.get("duration", ""))
+    return Offer(
+        offer_id=flight_id,
+        airline_name=airline_info.get("name", ""),
+        airline_logo=airline_info.get("logo", ""),
+        origin=first.origin or "",
+        destination=last.destination or "",
+        departure=first.departure or "",
+        arrival=last.arrival or "",
+        duration=duration,
+        stops_text=stops_text,
+        segments=segment_list,
+        date=searched_date,
+        stops=stops,
+        duration_minutes=minutes,
+        departs=first.departs,
+        arrives=last.arrives,
+        airline_code=airline_code,
+    )
+
+
+class OfferMerger:
+    """
+    Incremental merge of raw offers into Offers, one cabin search at a time.
+    Used directly by the streaming search, which publishes each cabin as it lands.
+    """
+
+    def __init__(self, searched_date, airlines):
+        self.searched_date = searched_date
+        self.airlines = airlines
+        self._merged = {}
+
+    def add(self, raw_offers):
+        """Merge a batch of raw offers; returns the Offers it created or changed."""
+        merged = self._merged
+        touched = {}
+        for raw in raw_offers:
+            flight_id = raw.get("id")
+            if not flight_id:
+                continue
+
+            offer = merged.get(flight_id)
+            if offer is None:
+                offer = _new_offer(flight_id, raw, self.searched_date, self.airlines)
+                if offer is None:
+                    continue
+                merged[flight_id] = offer
+            touched[flight_id] = offer
+
+            for tp in raw.get("travelerPricings", []):
+                price_info = tp.get("price", {}) or {}
+                price_total = price_info.get("total", 0)
+                price_base = price_info.get("base")
+                price = float(price_total or 0)
+                base = float(price_base) if price_base is not None else None
+                taxes = (float(price_total) - base) if price_base is not None else None
+                currency = price_info.get("currency", "")
+                flexibility = "Refundable" if tp.get("refundability") == "REFUNDABLE" else "Non-refundable"
+                seen = set()
+                for fd in tp.get("fareDetailsBySegment", []):
+                    bags_info = fd.get("includedCheckedBags") or {}
+                    key = (
+                        fd.get("cabin", "ECONOMY"),
+                        fd.get("fareBasis", "Standard"),
+                        "Included" if fd.get("seat") else "Not included",
+                        (bags_info.get("quantity", 0), bags_info.get("weight"), bags_info.get("type")),
+                    )
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    cabin, fare_type, seat, bags_key = key
+                    offer.add_fare(cabin, Fare(fare_type, price, base, taxes, currency, seat, _bags(bags_key), flexibility))
+
+        return list(touched.values())
+
+    def offers(self):
+        """All merged Offers in first-seen order."""
+        return list(self._merged.values())
+
+
+def merge_offers(raw_offers, searched_date, airlines):
+    """
+    Normalize raw Amadeus offers from one or more cabin searches into Offers.
+    Offers with the same id are merged; each cabin's fares go into fares_by_cabin.
+
+    Args:
+        raw_offers: Iterable of raw Amadeus flight-offer dicts
+        searched_date: YYYY-MM-DD date the offers were searched for
+        airlines: Airline code -> {"name", "logo"} reference data
+
+    Returns:
+        List of Offer objects in first-seen order
+    """
+    merger = OfferMerger(searched_date, airlines)
+    merger.add(raw_offers)
+    return merger.offers()
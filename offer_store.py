@@ -0,0 +1,219 @@
+"""
+Server-Side Offer Store
+=======================
+Expiring storage for normalized search results, addressed by short random
+tokens that pages carry in forms instead of the data itself.
+
+- search_results: whole result sets (e.g. the return leg of a round trip that
+  /search already fetched, so /select_return can render it without new calls)
+- offer references "<set token>:<offer_id>" name one offer inside a stored set;
+  the booking pages post these instead of full outbound/return JSON payloads
+
+Every result set is kept twice: in a bounded in-process LRU (TokenStore) that
+serves the worker which ran the search, and as one zlib-compressed JSON row in
+the OfferResultSet table, so any gunicorn worker or host sharing the database
+resolves the same token. A worker that misses locally loads the row once and
+caches it. Expired rows are pruned every OFFER_STORE_PRUNE_EVERY writes.
+Outside an application context (scripts, benchmarks) only the in-process copy
+is used.
+
+Tokens are valid for OFFER_STORE_TTL_SECONDS after the search; after that
+the booking pages send the user back to search again.
+
+Settings (environment):
+- OFFER_STORE_TTL_SECONDS     lifetime of a stored entry (default 1800)
+- OFFER_STORE_MAX_ENTRIES     LRU bound per store (default 2000)
+- OFFER_STORE_PRUNE_EVERY     shared writes between deletes of expired rows (default 200)
+
+Metrics (perf_metrics): search_results.hits / .misses / .expired / .evictions
+(in-process), search_results.shared_hits / .shared_misses / .shared_errors.
+"""
+
+import itertools
+import json
+import os
+import secrets
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import has_app_context
+from sqlalchemy import delete, insert, select
+
+import perf_metrics
+from models import db, OfferResultSet
+from offer_model import Offer
+
+
+class TokenStore:
+    """Thread-safe LRU map from random tokens to values with a fixed TTL."""
+
+    def __init__(self, name, ttl=1800.0, max_entries=2000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # token -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def put(self, value, token=None):
+        """Store `value` (under `token`, by default a new one) and return the token that addresses it."""
+        token = token or secrets.token_urlsafe(9)
+        with self._lock:
+            self._entries[token] = (time.monotonic() + self.ttl, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                perf_metrics.incr(f'{self.name}.evictions')
+            perf_metrics.set_gauge(f'{self.name}.entries', len(self._entries))
+        return token
+
+    def get(self, token):
+        """Return the value for `token`, or None if unknown or expired."""
+        if not token:
+            return None
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                perf_metrics.incr(f'{self.name}.misses')
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[token]
+                perf_metrics.incr(f'{self.name}.expired')
+                return None
+            self._entries.move_to_end(token)
+            perf_metrics.incr(f'{self.name}.hits')
+            return entry[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+OFFER_STORE_TTL_SECONDS = float(os.getenv('OFFER_STORE_TTL_SECONDS', 1800))
+OFFER_STORE_MAX_ENTRIES = int(os.getenv('OFFER_STORE_MAX_ENTRIES', 2000))
+OFFER_STORE_PRUNE_EVERY = int(os.getenv('OFFER_STORE_PRUNE_EVERY', 200))
+
+search_results = TokenStore('search_results', OFFER_STORE_TTL_SECONDS, OFFER_STORE_MAX_ENTRIES)
+
+_sets = OfferResultSet.__table__
+_shared_writes = itertools.count(1)
+
+
+def _result_set(origin, destination, date, flights):
+    return {
+        'origin': origin,
+        'destination': destination,
+        'date': date,
+        'flights': flights,
+        'by_id': {str(f.get('offer_id')): f for f in flights},
+    }
+
+
+def _save_shared(token, stored):
+    """Write (or rewrite) the shared copy of a result set; failures only cost the fallback."""
+    if not has_app_context():
+        return
+    payload = zlib.compress(json.dumps({
+        'origin': stored['origin'],
+        'destination': stored['destination'],
+        'date': stored['date'],
+        'flights': [f.to_dict() if hasattr(f, 'to_dict') else f for f in stored['flights']],
+    }, separators=(',', ':')).encode('utf-8'))
+    now = datetime.utcnow()
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(delete(_sets).where(_sets.c.token == token))
+            conn.execute(insert(_sets).values(
+                token=token, expires_at=now + timedelta(seconds=OFFER_STORE_TTL_SECONDS), payload=payload))
+            if next(_shared_writes) % OFFER_STORE_PRUNE_EVERY == 0:
+                conn.execute(delete(_sets).where(_sets.c.expires_at < now))
+    except Exception as e:
+        perf_metrics.incr('search_results.shared_errors')
+        print(f"⚠️ Shared result set {token} not saved: {e}")
+
+
+def _load_shared(token):
+    """The shared copy of an unexpired result set, or None."""
+    if not has_app_context():
+        return None
+    try:
+        with db.engine.connect() as conn:
+            payload = conn.execute(select(_sets.c.payload).where(
+                _sets.c.token == token, _sets.c.expires_at >= datetime.utcnow())).scalar()
+    except Exception as e:
+        perf_metrics.incr('search_results.shared_errors')
+        print(f"⚠️ Shared result set {token} not loaded: {e}")
+        return None
+    if payload is None:
+        perf_metrics.incr('search_results.shared_misses')
+        return None
+    perf_metrics.incr('search_results.shared_hits')
+    data = json.loads(zlib.decompress(payload))
+    return _result_set(data['origin'], data['destination'], data['date'],
+                       [Offer.from_dict(f) for f in data['flights']])
+
+
+def get_result_set(token):
+    """The result set stored under `token` (this process first, then the shared copy), or None."""
+    if not token:
+        return None
+    stored = search_results.get(token)
+    if stored is None:
+        stored = _load_shared(token)
+        if stored is not None:
+            search_results.put(stored, token)
+    return stored
+
+
+def store_result_set(origin, destination, date, flights):
+    """
+    Keep a normalized result set server-side and return its token.
+    Individual offers in the set are addressed as "<token>:<offer_id>".
+    """
+    stored = _result_set(origin, destination, date, flights)
+    token = search_results.put(stored)
+    _save_shared(token, stored)
+    return token
+
+
+def extend_result_set(set_token, offers):
+    """
+    Add or replace offers in a stored result set (the streaming search fills its
+    set cabin by cabin). Returns False when the set has expired.
+    """
+    stored = get_result_set(set_token)
+    if not stored:
+        return False
+    by_id = stored['by_id']
+    replaced = False
+    for offer in offers:
+        offer_id = str(offer.get('offer_id'))
+        if offer_id in by_id:
+            replaced = True
+        else:
+            stored['flights'].append(offer)
+        by_id[offer_id] = offer
+    if replaced:
+        stored['flights'][:] = [by_id[str(f.get('offer_id'))] for f in stored['flights']]
+    _save_shared(set_token, stored)
+    return True
+
+
+def offer_ref(set_token, offer_id):
+    """Reference to one offer inside a stored result set."""
+    return f"{set_token}:{offer_id}"
+
+
+def resolve_offer(ref):
+    """Return the offer dict for an "<token>:<offer_id>" reference, or None."""
+    set_token, _, offer_id = (ref or '').partition(':')
+    stored = get_result_set(set_token)
+    if not stored:
+        return None
+    return stored['by_id'].get(offer_id)
+
+
+def remember_offer(flight):
+    """Store a single offer (e.g. one posted as legacy JSON) and return its reference."""
+    token = store_result_set(flight.get('origin'), flight.get('destination'), flight.get('date'), [flight])
+    return offer_ref(token, flight.get('offer_id'))
@@ -0,0 +1,80 @@
+"""
+Performance Metrics
+===================
+Thread-safe, in-process counters, gauges and timings shared by the web app,
+the admin dashboard and the Budget Buy monitor.
+
+Metrics are kept per process (each gunicorn worker has its own copy) and are
+exposed to admins through /admin/api/performance.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_timings = {}
+
+
+def incr(name, amount=1):
+    """Increase counter `name` by `amount`."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def set_gauge(name, value):
+    """Set gauge `name` to the latest observed `value`."""
+    with _lock:
+        _gauges[name] = value
+
+
+def record_timing(name, seconds):
+    """Record one duration sample (in seconds) for timing `name`."""
+    with _lock:
+        stats = _timings.get(name)
+        if stats is None:
+            stats = _timings[name] = {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0}
+        stats['count'] += 1
+        stats['total'] += seconds
+        stats['last'] = seconds
+        if seconds > stats['max']:
+            stats['max'] = seconds
+
+
+@contextmanager
+def timed(name):
+    """Context manager that records the wall time of its block under `name`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - started)
+
+
+def snapshot():
+    """Return a JSON-friendly copy of all metrics (timings in milliseconds)."""
+    with _lock:
+        timings = {}
+        for name, stats in _timings.items():
+            count = stats['count']
+            timings[name] = {
+                'count': count,
+                'avg_ms': round(stats['total'] / count * 1000, 2) if count else 0.0,
+                'max_ms': round(stats['max'] * 1000, 2),
+                'last_ms': round(stats['last'] * 1000, 2),
+            }
+        return {
+            'counters': dict(_counters),
+            'gauges': dict(_gauges),
+            'timings': timings,
+        }
+
+
+def reset():
+    """Clear all metrics (used by benchmarks and the admin dashboard)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timings.clear()
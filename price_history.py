@@ -0,0 +1,264 @@
+"""
+Price History
+=============
+Time series of observed fares, fed by every logged-in search (this replaces
+the old one-Search-row-per-offer logging).
+
+- PriceObservation        raw rows: cheapest fare per route, departure day,
+                          carrier and cabin for one search, in integer cents
+- PriceObservationDaily   daily rollup of raw rows (min/max/sum/samples per
+                          observation day), kept much longer than raw rows
+
+Writes are multi-row Core inserts (no ORM objects). maintain() downsamples
+raw rows older than PRICE_RAW_RETENTION_DAYS into the daily table and deletes
+them, one observation day per transaction, then drops daily rows older than
+PRICE_DAILY_RETENTION_DAYS. Run it periodically with `flask prices-maintain`.
+Rollups are merged into existing daily rows with INSERT ... ON CONFLICT on
+SQLite/PostgreSQL and with a read-merge-write of that day elsewhere (MySQL).
+
+Functions take a Session or Connection (`conn`) so they can be used from the
+web app (db.session) and from scripts/benchmarks with their own engine.
+
+Settings (environment):
+- PRICE_RAW_RETENTION_DAYS     raw observations kept before rollup (default 30)
+- PRICE_DAILY_RETENTION_DAYS   daily rollups kept (default 730)
+"""
+
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Date, case, delete, func, insert, literal, select, tuple_
+
+from models import PriceObservation, PriceObservationDaily
+
+PRICE_RAW_RETENTION_DAYS = int(os.getenv('PRICE_RAW_RETENTION_DAYS', 30))
+PRICE_DAILY_RETENTION_DAYS = int(os.getenv('PRICE_DAILY_RETENTION_DAYS', 730))
+
+_raw = PriceObservation.__table__
+_daily = PriceObservationDaily.__table__
+
+
+def observations_from_offers(offers, observed_at=None):
+    """
+    Reduce normalized offers to observation rows: the cheapest fare per
+    (route, departure day, carrier, cabin, currency).
+
+    Returns:
+        List of dicts ready for insert_observations()
+    """
+    observed_at = (observed_at or datetime.utcnow()).replace(microsecond=0)
+    cheapest = {}
+    for offer in offers:
+        departs_at = offer.departs.at
+        if departs_at is None:
+            continue
+        day = departs_at.date()
+        carrier = (offer.airline_code or '')[:3]
+        for cabin, fares in offer.fares_by_cabin.items():
+            for fare in fares:
+                cents = round(fare.price * 100)
+                if cents <= 0:
+                    continue
+                key = (offer.origin, offer.destination, day, carrier, cabin, (fare.currency or '')[:3])
+                if key not in cheapest or cents < cheapest[key]:
+                    cheapest[key] = cents
+    return [
+        {
+            'origin': origin,
+            'destination': destination,
+            'departure_day': day,
+            'carrier': carrier,
+            'cabin': cabin,
+            'currency': currency,
+            'price_cents': cents,
+            'observed_at': observed_at,
+        }
+        for (origin, destination, day, carrier, cabin, currency), cents in cheapest.items()
+    ]
+
+
+def insert_observations(conn, rows):
+    """Bulk insert observation rows (one executemany; the caller commits)."""
+    if rows:
+        conn.execute(insert(_raw), rows)
+    return len(rows)
+
+
+# =========================
+# Queries
+# =========================
+def cheapest_by_day(conn, origin, destination, first_day, last_day, cabin='ECONOMY', since=None, currency=None):
+    """
+    Cheapest observed price (cents) per departure day for a route, from raw rows.
+    Prices are only compared within one currency: pass `currency` to restrict
+    the result to it; otherwise a day seen in several currencies reports the
+    currency it was observed in most often.
+
+    Returns:
+        Dict mapping departure date to (price_cents, currency)
+    """
+    samples = func.count()
+    query = (
+        select(_raw.c.departure_day, _raw.c.currency, func.min(_raw.c.price_cents), samples)
+        .where(
+            _raw.c.origin == origin,
+            _raw.c.destination == destination,
+            _raw.c.departure_day.between(first_day, last_day),
+            _raw.c.cabin == cabin,
+        )
+        .group_by(_raw.c.departure_day, _raw.c.currency)
+        .order_by(_raw.c.departure_day, samples.desc(), _raw.c.currency)
+    )
+    if since is not None:
+        query = query.where(_raw.c.observed_at >= since)
+    if currency is not None:
+        query = query.where(_raw.c.currency == currency)
+    cheapest = {}
+    for day, row_currency, cents, _ in conn.execute(query):
+        cheapest.setdefault(day, (cents, row_currency))
+    return cheapest
+
+
+def _as_date(value):
+    """DATE() results come back as date objects or 'YYYY-MM-DD' strings depending on the driver."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def price_trend(conn, origin, destination, departure_day, cabin='ECONOMY'):
+    """
+    How the cheapest price for one departure day moved over time: rollups for
+    older observation days, raw rows for recent ones.
+
+    Returns:
+        List of (observed_day, min_cents) sorted by day
+    """
+    trend = {}
+    rollups = select(_daily.c.observed_day, func.min(_daily.c.min_cents)).where(
+        _daily.c.origin == origin,
+        _daily.c.destination == destination,
+        _daily.c.departure_day == departure_day,
+        _daily.c.cabin == cabin,
+    ).group_by(_daily.c.observed_day)
+    for day, cents in conn.execute(rollups):
+        trend[_as_date(day)] = cents
+
+    observed_day = func.date(_raw.c.observed_at, type_=Date)
+    raw = select(observed_day, func.min(_raw.c.price_cents)).where(
+        _raw.c.origin == origin,
+        _raw.c.destination == destination,
+        _raw.c.departure_day == departure_day,
+        _raw.c.cabin == cabin,
+    ).group_by(observed_day)
+    for day, cents in conn.execute(raw):
+        day = _as_date(day)
+        trend[day] = min(cents, trend.get(day, cents))
+    return sorted(trend.items())
+
+
+# =========================
+# Rollups and retention
+# =========================
+_ROLLUP_KEY = ('origin', 'destination', 'departure_day', 'carrier', 'cabin', 'currency', 'observed_day')
+_ROLLUP_GROUP = [_raw.c[name] for name in _ROLLUP_KEY if name != 'observed_day']
+
+
+def _day_rollup(start, end):
+    """Aggregate raw rows observed in [start, end), which lies within one day, into daily rows."""
+    return (
+        select(*_ROLLUP_GROUP, literal(start.date(), Date).label('observed_day'),
+               func.min(_raw.c.price_cents).label('min_cents'),
+               func.max(_raw.c.price_cents).label('max_cents'),
+               func.sum(_raw.c.price_cents).label('sum_cents'),
+               func.count().label('samples'))
+        .where(_raw.c.observed_at >= start, _raw.c.observed_at < end)
+        .group_by(*_ROLLUP_GROUP)
+    )
+
+
+def _rollup_upsert(conn, rollup):
+    """INSERT ... SELECT ... ON CONFLICT DO UPDATE merging into uq_price_daily, None where unsupported."""
+    dialect = conn.dialect if hasattr(conn, 'dialect') else conn.get_bind().dialect  # Connection or Session
+    if dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    stmt = dialect_insert(_daily).from_select(list(rollup.selected_columns.keys()), rollup)
+    new = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[_daily.c[name] for name in _ROLLUP_KEY],
+        set_={
+            'min_cents': case((new.min_cents < _daily.c.min_cents, new.min_cents), else_=_daily.c.min_cents),
+            'max_cents': case((new.max_cents > _daily.c.max_cents, new.max_cents), else_=_daily.c.max_cents),
+            'sum_cents': _daily.c.sum_cents + new.sum_cents,
+            'samples': _daily.c.samples + new.samples,
+        },
+    )
+
+
+def _merge_rollup(conn, rollup):
+    """Portable fallback: merge the day's aggregates into existing daily rows in Python."""
+    rows = [dict(row) for row in conn.execute(rollup).mappings()]
+    if not rows:
+        return
+    keys = [tuple(row[name] for name in _ROLLUP_KEY) for row in rows]
+    key_columns = tuple_(*(_daily.c[name] for name in _ROLLUP_KEY))
+    existing = {
+        tuple(row[name] for name in _ROLLUP_KEY): row
+        for row in conn.execute(select(_daily).where(key_columns.in_(keys))).mappings()
+    }
+    for key, row in zip(keys, rows):
+        old = existing.get(key)
+        if old is not None:
+            row['min_cents'] = min(row['min_cents'], old['min_cents'])
+            row['max_cents'] = max(row['max_cents'], old['max_cents'])
+            row['sum_cents'] += old['sum_cents']
+            row['samples'] += old['samples']
+    if existing:
+        conn.execute(delete(_daily).where(key_columns.in_(list(existing))))
+    conn.execute(insert(_daily), rows)
+
+
+def rollup_before(conn, cutoff):
+    """
+    Fold raw observations older than `cutoff` into daily rollups and delete them.
+    Works one observation day per transaction so long backlogs never hold a
+    single huge write lock.
+
+    Returns:
+        Number of raw rows rolled up
+    """
+    oldest = conn.execute(select(func.min(_raw.c.observed_at))).scalar()
+    if oldest is None:
+        return 0
+    rolled = 0
+    start = datetime.combine(oldest.date(), datetime.min.time())
+    while start < cutoff:
+        end = min(start + timedelta(days=1), cutoff)
+        rollup = _day_rollup(start, end)
+        upsert = _rollup_upsert(conn, rollup)
+        if upsert is None:
+            _merge_rollup(conn, rollup)
+        else:
+            conn.execute(upsert)
+        result = conn.execute(delete(_raw).where(_raw.c.observed_at >= start, _raw.c.observed_at < end))
+        conn.commit()
+        rolled += result.rowcount or 0
+        start = end
+    return rolled
+
+
+def maintain(conn, now=None):
+    """Apply the rollup and retention policy; returns counts for logging."""
+    now = now or datetime.utcnow()
+    rolled = rollup_before(conn, now - timedelta(days=PRICE_RAW_RETENTION_DAYS))
+    expired = conn.execute(
+        delete(_daily).where(_daily.c.observed_day < (now - timedelta(days=PRICE_DAILY_RETENTION_DAYS)).date())
+    )
+    conn.commit()
+    return {'rolled_up': rolled, 'expired_rollups': expired.rowcount or 0}
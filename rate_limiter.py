@@ -0,0 +1,59 @@
+"""
+Rate Limiter
+============
+Token bucket that keeps concurrent callers within an upstream quota
+(e.g. Amadeus transactions per second).
+
+The bucket holds up to `burst` tokens and refills at `rate` tokens per
+second. acquire() takes one token, sleeping until one is available; waiting
+callers are served in arrival order, so a worker pool of any size never
+exceeds the configured rate.
+
+Metrics (perf_metrics, prefixed with the bucket name):
+- <name>.acquired        counter, tokens handed out
+- <name>.throttle_waits  counter, acquisitions that had to wait
+- <name>.throttle_wait   timing of those waits
+"""
+
+import threading
+import time
+
+import perf_metrics
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=1, name='rate_limiter'):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.name = name
+        self.waits = 0  # acquisitions that had to wait, since creation
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token now, or reserve the next one; returns seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            # A negative balance is a queue of reservations, paid back by the refill
+            self.waits += 1
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """Block until a token is available; returns the seconds spent waiting."""
+        wait = self._reserve()
+        perf_metrics.incr(f'{self.name}.acquired')
+        if wait > 0:
+            perf_metrics.incr(f'{self.name}.throttle_waits')
+            time.sleep(wait)
+            perf_metrics.record_timing(f'{self.name}.throttle_wait', wait)
+        return wait
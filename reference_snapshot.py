@@ -0,0 +1,172 @@
+"""
+Reference Data Snapshot
+=======================
+Compiles airlines.json and airports.json (ICAO-keyed, converted to IATA)
+into one versioned binary file. Web workers and scripts load the snapshot
+instead of re-parsing and converting the JSON in every process.
+
+File layout:
+    MAGIC (8 bytes) | header length (uint32) | header (JSON) | payload (marshal)
+
+The header records the format version, the marshal version, a fingerprint
+(size + mtime) of each source file, row counts and a content hash
+(`data_version`). The payload holds the lookup dicts exactly as the app uses
+them: AIRLINES keyed by airline id, AIRPORTS keyed by IATA code. The file is
+mapped with mmap and unmarshalled straight from the mapping.
+
+load_snapshot() returns None when the file is missing, was built by another
+format/marshal version or is older than its sources. Callers then fall back
+to the JSON files; run the build again after updating reference data:
+
+    python reference_snapshot.py build [--json-dir json-files] [--out PATH]
+    python reference_snapshot.py info  [--out PATH]
+
+Settings (environment):
+- REFERENCE_SNAPSHOT   snapshot path (default instance/reference.snap)
+"""
+
+import argparse
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+import time
+from datetime import datetime
+
+MAGIC = b"SKYREF\x00\x01"
+FORMAT_VERSION = 1
+SOURCES = ("airlines.json", "airports.json")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_JSON_DIR = os.path.join(BASE_DIR, "json-files")
+SNAPSHOT_PATH = os.getenv("REFERENCE_SNAPSHOT", os.path.join(BASE_DIR, "instance", "reference.snap"))
+
+
+def parse_reference_json(json_dir):
+    """Parse the JSON sources into (airlines, airports) dicts; a missing file gives an empty dict."""
+    airlines, airports = {}, {}
+    airlines_path = os.path.join(json_dir, "airlines.json")
+    if os.path.exists(airlines_path):
+        with open(airlines_path, "r", encoding="utf-8") as f:
+            airlines = {item["id"]: item for item in json.load(f)}
+
+    airports_path = os.path.join(json_dir, "airports.json")
+    if os.path.exists(airports_path):
+        with open(airports_path, encoding="utf-8") as f:
+            for icao, info in json.load(f).items():
+                iata = info.get("iata")
+                if iata:  # Only include airports with IATA codes
+                    airports[iata] = {
+                        "city": info.get("city") or "",
+                        "name": info.get("name") or "",
+                        "country": info.get("country") or ""
+                    }
+    return airlines, airports
+
+
+def source_fingerprints(json_dir):
+    """(size, mtime_ns) per source file, or None for missing files."""
+    fingerprints = {}
+    for name in SOURCES:
+        try:
+            st = os.stat(os.path.join(json_dir, name))
+            fingerprints[name] = [st.st_size, st.st_mtime_ns]
+        except FileNotFoundError:
+            fingerprints[name] = None
+    return fingerprints
+
+
+def build_snapshot(json_dir=DEFAULT_JSON_DIR, out_path=SNAPSHOT_PATH):
+    """Compile the JSON sources into a snapshot at `out_path`; returns its header."""
+    airlines, airports = parse_reference_json(json_dir)
+    payload = marshal.dumps({"airlines": airlines, "airports": airports})
+    header = {
+        "format": FORMAT_VERSION,
+        "marshal": marshal.version,
+        "built_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "sources": source_fingerprints(json_dir),
+        "counts": {"airlines": len(airlines), "airports": len(airports)},
+        "data_version": hashlib.sha256(payload).hexdigest()[:16],
+    }
+    header_bytes = json.dumps(header, sort_keys=True).encode("utf-8")
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(payload)
+    os.replace(tmp_path, out_path)  # workers never see a half-written file
+    return header
+
+
+def _read_header(mm):
+    if mm[:len(MAGIC)] != MAGIC:
+        return None, 0
+    (header_len,) = struct.unpack_from("<I", mm, len(MAGIC))
+    start = len(MAGIC) + 4
+    return json.loads(bytes(mm[start:start + header_len])), start + header_len
+
+
+def read_header(path=SNAPSHOT_PATH):
+    """Header of the snapshot at `path`, or None if it is missing or not a snapshot."""
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _read_header(mm)[0]
+    except (OSError, ValueError):
+        return None
+
+
+def load_snapshot(path=SNAPSHOT_PATH, json_dir=DEFAULT_JSON_DIR):
+    """
+    Load reference data from the snapshot.
+
+    Returns:
+        (airlines, airports, header), or None if the snapshot is missing,
+        incompatible or older than the JSON sources
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        header, offset = _read_header(mm)
+        if (header is None or header.get("format") != FORMAT_VERSION
+                or header.get("marshal") != marshal.version):
+            print(f"⚠️ Reference snapshot {path} has an incompatible format; rebuild it")
+            return None
+        if header.get("sources") != source_fingerprints(json_dir):
+            print(f"⚠️ Reference snapshot {path} is older than {json_dir}; rebuild it")
+            return None
+        with memoryview(mm)[offset:] as view:
+            data = marshal.loads(view)
+    return data["airlines"], data["airports"], header
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the reference data snapshot")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--json-dir", default=DEFAULT_JSON_DIR)
+    parser.add_argument("--out", default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        header = build_snapshot(args.json_dir, args.out)
+        print(f"✅ Built {args.out} ({os.path.getsize(args.out) / 1024:.0f} KiB) in "
+              f"{(time.perf_counter() - started) * 1000:.0f} ms")
+    else:
+        header = read_header(args.out)
+        if header is None:
+            print(f"❌ No snapshot at {args.out}")
+            sys.exit(1)
+    print(f"   data_version {header['data_version']}, built {header['built_at']}, "
+          f"{header['counts']['airlines']} airlines, {header['counts']['airports']} airports")
+
+
+if __name__ == '__main__':
+    main()
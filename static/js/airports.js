@@ -0,0 +1,100 @@
+/* =========================================================================
+    AIRPORT DATASET (client-side autocomplete)
+    -------------------------------------------------------------------------
+    Downloads the versioned airport dataset once (/api/airports/dataset/<v>.json,
+    cached by the browser for a year), fills window.AIRPORTS in place and
+    answers autocomplete locally:
+      window.AirportData.ready          Promise, resolves with window.AIRPORTS
+      window.AirportData.loaded()       true once the dataset is available
+      window.AirportData.search(q, n)   same shape as /api/airports/search
+    Pages fall back to /api/airports/search until the dataset has loaded.
+    Local lookups are reported once per page (sendBeacon) so the requests
+    saved show up in the admin performance metrics.
+    ========================================================================= */
+(function () {
+    const script = document.currentScript;
+    const url = script ? script.dataset.url : '';
+    const airports = window.AIRPORTS = window.AIRPORTS || {};
+    let entries = [];      // rank order, as served
+    let byCode = {};
+    let localLookups = 0;
+
+    function words(text) {
+        return (text || '').toLowerCase().split(/[^\p{L}\p{N}]+/u).filter(Boolean);
+    }
+
+    function display(a) {
+        const country = a.country ? `, ${a.country}` : '';
+        // Example: "Lagos, Nigeria - Murtala Muhammed Intl (LOS)"
+        return `${a.city || a.iata}${country} - ${a.name || ''} (${a.iata})`.trim();
+    }
+
+    const ready = (url ? fetch(url, { credentials: 'same-origin' }) : Promise.reject(new Error('no dataset url')))
+        .then(r => r.ok ? r.json() : Promise.reject(new Error(`HTTP ${r.status}`)))
+        .then(data => {
+            const col = {};
+            data.fields.forEach((field, i) => { col[field] = i; });
+            entries = data.rows.map(row => {
+                const a = {
+                    iata: row[col.iata],
+                    city: row[col.city] || '',
+                    name: row[col.name] || '',
+                    country: row[col.country] || '',
+                };
+                airports[a.iata] = { city: a.city, name: a.name, country: a.country };
+                a.display = display(a);
+                a.words = words(`${a.iata} ${a.city} ${a.name}`);
+                a.text = `${a.iata} ${a.city} ${a.name}`.toLowerCase();
+                byCode[a.iata] = a;
+                return a;
+            });
+            console.log('✈️ Loaded', entries.length, 'airports (dataset', data.version + ')');
+            document.dispatchEvent(new CustomEvent('airports:ready', { detail: { count: entries.length } }));
+            return airports;
+        });
+    ready.catch(err => console.warn('⚠️ Airport dataset unavailable, using server search:', err));
+
+    /**
+     * Exact IATA code first, then airports where every query word prefixes a
+     * word of code/city/name, then substring matches; rank order within each.
+     */
+    function search(keyword, limit) {
+        limit = limit || 20;
+        const q = (keyword || '').trim().toLowerCase();
+        const queryWords = words(q);
+        if (!queryWords.length) return [];
+        localLookups++;
+
+        const results = [];
+        const picked = new Set();
+        const add = a => {
+            if (!picked.has(a.iata)) { picked.add(a.iata); results.push(a); }
+            return results.length >= limit;
+        };
+        const exact = byCode[q.toUpperCase()];
+        if (exact && add(exact)) return results;
+
+        for (const a of entries) {
+            if (queryWords.every(w => a.words.some(x => x.startsWith(w))) && add(a)) return results;
+        }
+        if (q.length >= 3) {
+            for (const a of entries) {
+                if (a.text.includes(q) && add(a)) break;
+            }
+        }
+        return results;
+    }
+
+    window.addEventListener('pagehide', () => {
+        if (localLookups && navigator.sendBeacon) {
+            navigator.sendBeacon('/api/airports/dataset/usage', JSON.stringify({ local_lookups: localLookups }));
+            localLookups = 0;
+        }
+    });
+
+    window.AirportData = {
+        ready: ready,
+        loaded: () => entries.length > 0,
+        search: search,
+    };
+})();
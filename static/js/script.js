@@ -377,6 +377,7 @@ document.addEventListener("DOMContentLoaded", () => {
                         add('origin', origin);
                         add('destination', destination);
                         add('return_date', returnDate);
+                        add('return_key', container?.dataset.returnKey || '');
                         document.body.appendChild(form);
                         form.submit();
                         return;
@@ -490,22 +491,10 @@ document.addEventListener("DOMContentLoaded", () => {
     9) BASIC AIRPORT AUTOCOMPLETE (LEGACY)
     ========================================================================= */
 
-let airports = [];
-if (typeof AIRPORTS !== 'undefined') {
-  airports = Object.entries(AIRPORTS).map(([iata, info]) => {
-      return {
-          iata,
-          city: info.city,
-          name: info.name,
-          label: `${info.city} - ${info.name} (${iata})`
-      };
-  });
-}
-
 function setupAutocomplete(inputId, hiddenId) {
     const input = document.getElementById(inputId);
     const hidden = document.getElementById(hiddenId);
-    if (!input || !hidden || airports.length === 0) return;
+    if (!input || !hidden || !window.AirportData) return;
 
     const list = document.createElement('div');
     list.className = 'autocomplete-items';
@@ -522,11 +511,9 @@ function setupAutocomplete(inputId, hiddenId) {
         list.innerHTML = '';
         if (!val) return;
 
-        const matches = airports.filter(a =>
-            a.iata.toLowerCase().includes(val) ||
-            a.city.toLowerCase().includes(val) ||
-            a.name.toLowerCase().includes(val)
-        ).slice(0, 10); // limit 10 suggestions
+        if (!window.AirportData.loaded()) return;
+        const matches = window.AirportData.search(val, 10) // limit 10 suggestions
+            .map(a => ({ ...a, label: `${a.city} - ${a.name} (${a.iata})` }));
 
         matches.forEach(a => {
             const item = document.createElement('div');
@@ -545,7 +532,7 @@ function setupAutocomplete(inputId, hiddenId) {
     });
 }
 
-// Initialize for both inputs (only if AIRPORTS present)
+// Initialize for both inputs (only if the airport dataset loader is present)
 setupAutocomplete('origin', 'origin_code');
 setupAutocomplete('destination', 'destination_code');
 
@@ -701,59 +688,17 @@ setupAutocomplete('destination', 'destination_code');
     ========================================================================= */
 
 (function() {
-    // Load airports data from global AIRPORTS object
-    const airportsData = typeof AIRPORTS !== 'undefined' ? AIRPORTS : (window.AIRPORTS || {});
-    const airportsList = Object.entries(airportsData).map(([iata, info]) => ({
-        iata: iata,
-        name: info.name || '',
-        city: info.city || '',
-        country: info.country || '',
-        state: info.state || ''
-    }));
-
-    console.log('🔍 Airport Autocomplete initialized with', airportsList.length, 'airports');
-    if (airportsList.length === 0) {
-        console.warn('⚠️ No airports data loaded! AIRPORTS object:', airportsData);
-    }
-
     /**
      * Search airports by keyword (city, name, or code)
+     * Ranked local search over the airport dataset (static/js/airports.js);
+     * empty until the dataset has loaded.
      * @param {string} keyword - Search term
      * @returns {Array} - Matching airports
      */
     function searchAirports(keyword) {
         if (!keyword || keyword.length < 2) return [];
-        
-        const searchTerm = keyword.toLowerCase().trim();
-        
-        // Search across IATA code, city, and airport name
-        const matches = airportsList.filter(airport => {
-            const iataMatch = airport.iata.toLowerCase().includes(searchTerm);
-            const cityMatch = airport.city.toLowerCase().includes(searchTerm);
-            const nameMatch = airport.name.toLowerCase().includes(searchTerm);
-            
-            return iataMatch || cityMatch || nameMatch;
-        });
-        
-        // Prioritize exact matches and major airports
-        return matches
-            .sort((a, b) => {
-                // Exact IATA code match gets highest priority
-                const aExactCode = a.iata.toLowerCase() === searchTerm;
-                const bExactCode = b.iata.toLowerCase() === searchTerm;
-                if (aExactCode && !bExactCode) return -1;
-                if (!aExactCode && bExactCode) return 1;
-                
-                // Exact city match gets second priority
-                const aExactCity = a.city.toLowerCase() === searchTerm;
-                const bExactCity = b.city.toLowerCase() === searchTerm;
-                if (aExactCity && !bExactCity) return -1;
-                if (!aExactCity && bExactCity) return 1;
-                
-                // Otherwise sort alphabetically by city
-                return a.city.localeCompare(b.city);
-            })
-            .slice(0, 8); // Limit to 8 results
+        if (!window.AirportData || !window.AirportData.loaded()) return [];
+        return window.AirportData.search(keyword, 8); // Limit to 8 results
     }
 
     /**
@@ -0,0 +1,154 @@
+"""
+Test Monitor Leases
+===================
+Checks that budget_monitor.process_request() only writes a request while it
+still holds the lease and the request is still active: a request cancelled
+by its user mid-check stays cancelled, and a worker whose lease expired
+cannot write a request that another worker has since booked back to pending
+(or book it a second time).
+
+Runs against a scratch SQLite database with the synthetic flight provider.
+
+    python test_monitor_leases.py
+
+Also collected by pytest.
+"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+_SCRATCH = tempfile.TemporaryDirectory(prefix="monitor-leases-")
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_SCRATCH.name, 'leases.db')
+os.environ['FLIGHT_PROVIDER'] = 'synthetic'
+
+from sqlalchemy import update
+
+import budget_monitor
+from app import app, db
+from models import BudgetBuyRequest, Ticket, User
+from monitor_leases import LEASE_DURATION, WORKER_ID, claim_due, transition
+
+OTHER_WORKER = 'other-host:1'
+
+
+def _offer(total):
+    return {
+        'price': {'total': f"{total:.2f}", 'currency': 'USD'},
+        'itineraries': [{'duration': 'PT5H', 'segments': [{
+            'carrierCode': 'AA', 'number': '100', 'numberOfStops': 0,
+            'departure': {'iataCode': 'JFK', 'at': '2030-01-10T08:00:00'},
+            'arrival': {'iataCode': 'LAX', 'at': '2030-01-10T13:00:00'},
+        }]}],
+    }
+
+
+def _new_request(mode='alert_only'):
+    """A due request claimed by this worker; returns its id."""
+    db.create_all()
+    user = User.query.filter_by(email='leases@example.com').first()
+    if user is None:
+        user = User(name='Lease Test', email='leases@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+    request = BudgetBuyRequest(
+        user_id=user.user_id, origin='JFK', destination='LAX',
+        departure_date=datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=60),
+        min_budget=100, max_budget=300, mode=mode, status='pending',
+    )
+    db.session.add(request)
+    db.session.commit()
+    request_id = request.request_id
+    db.session.execute(update(BudgetBuyRequest).values(lease_owner=None, lease_expires_at=None))
+    db.session.commit()
+    assert request_id in claim_due(db.session)
+    return request_id
+
+
+def _take_over(request_id, to_status):
+    """Expire this worker's lease, let another worker claim the request and move it to `to_status`."""
+    later = datetime.utcnow() + LEASE_DURATION + timedelta(seconds=1)
+    assert request_id in claim_due(db.session, now=later, owner=OTHER_WORKER)
+    assert transition(db.session, request_id, 'price_found', now=later, owner=OTHER_WORKER)
+    assert transition(db.session, request_id, to_status, from_statuses=('price_found',), now=later,
+                      owner=OTHER_WORKER, booked_price=250.0)
+
+
+def test_cancelled_request_stays_cancelled():
+    with app.app_context():
+        request_id = _new_request()
+        request = db.session.get(BudgetBuyRequest, request_id)
+        # The user cancels while the monitor is about to check the request
+        db.session.execute(update(BudgetBuyRequest).where(BudgetBuyRequest.request_id == request_id)
+                           .values(status='cancelled'))
+        db.session.commit()
+
+        budget_monitor.process_request(request, [_offer(900)])
+
+        db.session.expire_all()
+        request = db.session.get(BudgetBuyRequest, request_id)
+        assert request.status == 'cancelled'
+        assert request.next_check_at is None
+
+
+def test_lost_lease_cannot_overwrite_booked():
+    with app.app_context():
+        request_id = _new_request()
+        request = db.session.get(BudgetBuyRequest, request_id)
+        _take_over(request_id, 'booked')
+
+        budget_monitor.process_request(request, [_offer(900)])
+
+        db.session.expire_all()
+        request = db.session.get(BudgetBuyRequest, request_id)
+        assert request.status == 'booked'
+        assert request.lease_owner == OTHER_WORKER
+        assert request.booked_price == 250.0
+
+
+def test_lost_lease_cannot_book_twice():
+    with app.app_context():
+        request_id = _new_request(mode='auto_book')
+        request = db.session.get(BudgetBuyRequest, request_id)
+        tickets = Ticket.query.count()
+        _take_over(request_id, 'booked')
+
+        budget_monitor.process_request(request, [_offer(200)])
+
+        db.session.expire_all()
+        request = db.session.get(BudgetBuyRequest, request_id)
+        assert request.status == 'booked'
+        assert request.booked_price == 250.0
+        assert Ticket.query.count() == tickets
+
+
+def test_leased_request_is_rescheduled():
+    with app.app_context():
+        request_id = _new_request()
+        request = db.session.get(BudgetBuyRequest, request_id)
+
+        budget_monitor.process_request(request, [_offer(900)])
+
+        db.session.expire_all()
+        request = db.session.get(BudgetBuyRequest, request_id)
+        assert request.status == 'pending'
+        assert request.last_price == 900.0
+        assert request.next_check_at is not None and request.last_checked_at is not None
+        assert request.lease_owner == WORKER_ID
+
+
+def main():
+    """Run the lease checks"""
+    print("=" * 60)
+    print("SKYVELA - MONITOR LEASE CHECK")
+    print("=" * 60)
+    tests = [test_cancelled_request_stays_cancelled, test_lost_lease_cannot_overwrite_booked,
+             test_lost_lease_cannot_book_twice, test_leased_request_is_rescheduled]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+Test Query Plans
+================
+Runs EXPLAIN QUERY PLAN on the app's hot queries and fails when one of them
+falls back to a full table scan (or a temporary sort where an index should
+provide the order).
+
+- hot_queries()    statements mirrored from the routes that build them inline
+                   (admin pages, budget pages, context processor)
+- module_queries() the exact SQL issued by the query functions in
+                   monitor_leases.py and price_history.py, captured while
+                   they run against the scratch database
+
+By default the schema is built from models.py in a scratch SQLite file, which
+checks the declared indexes. Pass --db to check a real database instead, e.g.
+after running migrate_indexes.py. Only its schema is copied into the scratch
+file: plans then depend on the indexes alone, not on the current row counts
+(on a nearly empty database SQLite rightly prefers scanning a tiny table).
+
+    python test_query_plans.py
+    python test_query_plans.py --db instance/flight.db
+
+Also collected by pytest (test_hot_queries_use_indexes).
+"""
+
+import os
+import re
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, desc, event, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+import monitor_leases
+import price_history
+from models import (
+    db, BudgetBuyRequest, Booking, Payment, APILog, FlightOffer
+)
+
+ACTIVE = ['pending', 'searching', 'price_found']
+NOW = datetime(2026, 1, 1)
+
+
+def hot_queries():
+    """(name, statement, order_from_index) for each hot query path."""
+    return [
+        ("context processor: user's active request count",
+         select(func.count()).select_from(BudgetBuyRequest).where(
+             BudgetBuyRequest.user_id == 1, BudgetBuyRequest.status.in_(ACTIVE)), False),
+        ("budget pages: user's requests",
+         select(BudgetBuyRequest).where(
+             BudgetBuyRequest.user_id == 1, BudgetBuyRequest.status != 'cancelled'), False),
+        ("admin metrics: bookings per day",
+         select(func.count()).select_from(Booking).where(
+             Booking.created_at >= NOW, Booking.created_at < NOW + timedelta(days=1)), False),
+        ("admin metrics: pending bookings",
+         select(func.count()).select_from(Booking).where(Booking.status == 'pending'), False),
+        ("admin metrics: recent bookings",
+         select(Booking).order_by(desc(Booking.created_at)).limit(10), True),
+        ("admin bookings: filtered by status",
+         select(Booking).where(Booking.status == 'confirmed').order_by(desc(Booking.created_at)).limit(20), True),
+        ("admin metrics: revenue",
+         select(func.sum(Payment.amount)).where(Payment.status == 'completed'), False),
+        ("admin users: user's completed payments",
+         select(func.sum(Payment.amount)).where(Payment.user_id == 1, Payment.status == 'completed'), False),
+        ("admin logs: by type",
+         select(APILog).where(APILog.log_type == 'flight_search').order_by(desc(APILog.created_at)).limit(100), True),
+        ("admin logs: all types",
+         select(APILog).order_by(desc(APILog.created_at)).limit(100), True),
+        ("booking details: logs for a booking",
+         select(APILog).where(APILog.booking_id == 1), False),
+        ("offers by route and departure",
+         select(FlightOffer).where(
+             FlightOffer.origin == 'JFK', FlightOffer.destination == 'LAX',
+             FlightOffer.departure.between(NOW, NOW + timedelta(days=7))), False),
+    ]
+
+
+def module_calls():
+    """(name, call(session), order_from_index) for the query functions used directly."""
+    day = NOW.date()
+    return [
+        ("budget monitor: claim due requests",
+         lambda session: monitor_leases.claim_due(session, now=NOW, owner='plans', limit=50), False),
+        ("budget monitor: renew leases",
+         lambda session: monitor_leases.renew(session, [1, 2, 3], now=NOW, owner='plans'), False),
+        ("budget monitor: transition a request",
+         lambda session: monitor_leases.transition(session, 1, 'price_found', now=NOW, owner='plans'), False),
+        ("check now: claim one request",
+         lambda session: monitor_leases.claim(session, 1, 'web:plans', now=NOW), False),
+        ("price history: route range",
+         lambda session: price_history.cheapest_by_day(session, 'JFK', 'LAX', day, day + timedelta(days=30)), False),
+        ("scheduler: route price trend",
+         lambda session: price_history.price_trend(session, 'JFK', 'LAX', day), False),
+    ]
+
+
+def module_queries(engine):
+    """
+    (name, sql, params, order_from_index) for every statement the functions in
+    module_calls() execute against `engine`; a function that fails (e.g. on an
+    unmigrated database) is returned as (name, error, None, order_from_index).
+    """
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            captured.append((statement, parameters))
+
+    queries = []
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        for name, call, order_from_index in module_calls():
+            del captured[:]
+            with Session(engine) as session:
+                try:
+                    call(session)
+                except OperationalError as e:
+                    queries.append((name, e, None, order_from_index))
+                    continue
+            for number, (sql, params) in enumerate(captured, 1):
+                label = f"{name} ({number})" if len(captured) > 1 else name
+                queries.append((label, sql, params, order_from_index))
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    return queries
+
+
+def explain_sql(conn, sql, params=()):
+    """EXPLAIN QUERY PLAN detail lines for raw SQL."""
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, tuple(params)).all()
+    return [row[-1] for row in rows]
+
+
+def explain(conn, statement):
+    """EXPLAIN QUERY PLAN detail lines for a SQLAlchemy statement."""
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup or ())
+    params = tuple(p.isoformat(" ") if isinstance(p, datetime) else p for p in params)
+    return explain_sql(conn, compiled.string, params)
+
+
+def plan_problems(plan, order_from_index):
+    """Full table scans (SCAN <table> without an index) and unwanted temp sorts in a plan."""
+    problems = [line for line in plan if re.match(r"^SCAN (TABLE )?\w+$", line)]
+    if order_from_index:
+        problems += [line for line in plan if "USE TEMP B-TREE FOR ORDER BY" in line]
+    return problems
+
+
+def check_query_plans(engine):
+    """Explain every hot query; returns the number of failing queries"""
+    print("🔍 Checking query plans...")
+    failures = 0
+    queries = [(name, statement, None, order) for name, statement, order in hot_queries()]
+    queries += module_queries(engine)
+    with engine.connect() as conn:
+        for name, statement, params, order_from_index in queries:
+            try:
+                if isinstance(statement, OperationalError):
+                    raise statement
+                if isinstance(statement, str):
+                    plan = explain_sql(conn, statement, params)
+                else:
+                    plan = explain(conn, statement)
+            except OperationalError as e:
+                failures += 1
+                print(f"  ❌ {name}: {e.orig}")
+                continue
+            problems = plan_problems(plan, order_from_index)
+            if problems:
+                failures += 1
+                print(f"  ❌ {name}: {'; '.join(problems)}")
+            else:
+                print(f"  ✅ {name}: {'; '.join(plan)}")
+    return failures
+
+
+@contextmanager
+def scratch_engine(create_schema=True):
+    """Fresh SQLite database, by default with the schema (and indexes) from models.py; removed on exit"""
+    with tempfile.TemporaryDirectory(prefix="query-plans-") as directory:
+        engine = create_engine("sqlite:///" + os.path.join(directory, "plans.db"))
+        try:
+            if create_schema:
+                db.metadata.create_all(engine)
+            yield engine
+        finally:
+            engine.dispose()
+
+
+@contextmanager
+def schema_copy_engine(path):
+    """Scratch SQLite database with the tables and indexes of the database at `path`; removed on exit"""
+    source = create_engine("sqlite:///" + os.path.abspath(path))
+    with source.connect() as conn:
+        ddl = [row[0] for row in conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY type DESC")]  # tables before indexes
+    source.dispose()
+    with scratch_engine(create_schema=False) as engine:
+        with engine.begin() as conn:
+            for statement in ddl:
+                conn.exec_driver_sql(statement)
+        yield engine
+
+
+def test_hot_queries_use_indexes():
+    with scratch_engine() as engine:
+        assert check_query_plans(engine) == 0
+
+
+def main():
+    """Run the query plan checks"""
+    print("=" * 60)
+    print("SKYVELA - HOT QUERY PLAN CHECK")
+    print("=" * 60)
+
+    if "--db" in sys.argv:
+        path = sys.argv[sys.argv.index("--db") + 1]
+        print(f"Database: {path}\n")
+        scratch = schema_copy_engine(path)
+    else:
+        print("Database: scratch schema from models.py\n")
+        scratch = scratch_engine()
+
+    with scratch as engine:
+        failures = check_query_plans(engine)
+
+    print("\n" + "=" * 60)
+    if failures:
+        print(f"❌ {failures} QUERY PLAN(S) REGRESSED")
+        print("=" * 60)
+        print("\nAdd or fix the index in models.py, then run: python migrate_indexes.py")
+        sys.exit(1)
+    print("✅ ALL HOT QUERIES USE INDEXES!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
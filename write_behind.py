@@ -0,0 +1,155 @@
+"""
+Write-Behind Queue
+==================
+Moves best-effort database writes off the request path. Request handlers
+enqueue plain-data snapshots; one background thread drains the queue and
+hands them to a batch writer in groups, so many requests share one commit.
+
+- Batches are written when BATCH_SIZE items are waiting or FLUSH_INTERVAL
+  seconds after the first item arrived, whichever comes first
+- If the queue is full the caller writes its own item synchronously, so
+  nothing is dropped under overload (it just stops being asynchronous)
+- If a batch fails it is retried item by item, so one bad snapshot does not
+  discard the rest of the batch
+- close() (registered with atexit) drains everything still queued
+
+Metrics (perf_metrics, prefixed with the queue name):
+- <name>.queue_depth    gauge, items waiting after each enqueue/flush
+- <name>.flush          timing per batch write
+- <name>.batch_size     gauge, items in the last batch
+- <name>.enqueued / .written / .errors / .inline_writes   counters
+"""
+
+import atexit
+import queue
+import threading
+import time
+
+import perf_metrics
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """Background group-commit writer for snapshots produced by request handlers."""
+
+    def __init__(self, name, write_batch, app, batch_size=100, flush_interval=0.5, max_queue=10000):
+        """
+        Args:
+            write_batch: callable(list_of_items) that writes and commits them;
+                         called inside an application context
+            app: Flask app whose context the writer thread runs in
+        """
+        self.name = name
+        self.write_batch = write_batch
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+    def submit(self, item):
+        """Queue `item` for the background writer (written inline if the queue is full or closed)."""
+        if self._closed:
+            self._write_inline([item])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            perf_metrics.incr(f'{self.name}.inline_writes')
+            self._write_inline([item])
+            return
+        perf_metrics.incr(f'{self.name}.enqueued')
+        perf_metrics.set_gauge(f'{self.name}.queue_depth', self._queue.qsize())
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written (or `timeout` passes)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=10.0):
+        """Stop accepting background work and drain the queue."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        # Anything still queued (writer never started or timed out) is written here
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftovers.append(item)
+            self._queue.task_done()
+        if leftovers:
+            self._write_inline(leftovers)
+
+    # Writer thread -----------------------------------------------------------
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'{self.name}-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+            batch = [item]
+            first_at = time.monotonic()
+            while len(batch) < self.batch_size:
+                remaining = self.flush_interval - (time.monotonic() - first_at)
+                try:
+                    item = self._queue.get(timeout=max(0.0, remaining)) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+            perf_metrics.set_gauge(f'{self.name}.queue_depth', self._queue.qsize())
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        with self.app.app_context():
+            try:
+                self.write_batch(batch)
+                perf_metrics.incr(f'{self.name}.written', len(batch))
+            except Exception as e:
+                print(f"⚠️ {self.name}: batch of {len(batch)} failed ({e}); retrying one by one")
+                for item in batch:
+                    try:
+                        self.write_batch([item])
+                        perf_metrics.incr(f'{self.name}.written')
+                    except Exception as item_error:
+                        perf_metrics.incr(f'{self.name}.errors')
+                        print(f"❌ {self.name}: could not write item: {item_error}")
+        perf_metrics.record_timing(f'{self.name}.flush', time.perf_counter() - started)
+        perf_metrics.set_gauge(f'{self.name}.batch_size', len(batch))
+
+    def _write_inline(self, items):
+        self._write(items)